@@ -3,12 +3,40 @@ tests to run and debug your minimax and alphabeta agents locally.  The test
 cases used by the project assistant are not public.
 """
 
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import tempfile
+import time
+import timeit
 import unittest
+import warnings
 
 import isolation
 import game_agent
+import analysis_server
+import benchmark
+import competition_agent
+import endgame
+import leaf_eval
+import move_cache
+import opening_book
+import result_store
+import sample_players
+import search_board
+import selfplay
+import tablebase
+import tournament
+import transposition
+import tune
 
+from functools import partial
 from importlib import reload
+from unittest import mock
 
 
 class IsolationTest(unittest.TestCase):
@@ -21,5 +49,936 @@ class IsolationTest(unittest.TestCase):
         self.game = isolation.Board(self.player1, self.player2)
 
 
+class SearchBoardTest(unittest.TestCase):
+    """Unit tests for the in-place search board"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+        self.game = isolation.Board(self.player1, self.player2)
+        self.game.apply_move((2, 3))
+        self.game.apply_move((0, 5))
+
+    def test_matches_board(self):
+        board = search_board.SearchBoard.from_board(self.game)
+        for player in (self.player1, self.player2):
+            self.assertEqual(sorted(board.get_legal_moves(player)),
+                             sorted(self.game.get_legal_moves(player)))
+            self.assertEqual(board.get_player_location(player),
+                             self.game.get_player_location(player))
+        self.assertEqual(board.active_player, self.game.active_player)
+        self.assertEqual(sorted(board.get_blank_spaces()),
+                         sorted(self.game.get_blank_spaces()))
+
+    def test_push_pop_round_trip(self):
+        board = search_board.SearchBoard.from_board(self.game)
+        before = (board.hash(), board.move_count, board.active_player)
+        moves = []
+        while board.get_legal_moves():
+            move = sorted(board.get_legal_moves())[0]
+            forecast = self.game.forecast_move(move)
+            board.push_move(move)
+            self.game = forecast
+            moves.append(move)
+            self.assertEqual(sorted(board.get_legal_moves()),
+                             sorted(self.game.get_legal_moves()))
+            self.assertEqual(board.key, board._compute_key())
+            for player in (self.player1, self.player2):
+                self.assertEqual(board.mobility(player),
+                                 len(self.game.get_legal_moves(player)))
+        for move in reversed(moves):
+            self.assertEqual(board.pop_move(), move)
+            self.assertEqual(board.mobility(board.active_player),
+                             len(board.get_legal_moves()))
+        self.assertEqual((board.hash(), board.move_count,
+                          board.active_player), before)
+
+    def test_in_place_search(self):
+        player = game_agent.AlphaBetaPlayer(in_place=True)
+        opponent = game_agent.AlphaBetaPlayer(in_place=True)
+        game = isolation.Board(player, opponent)
+        game.apply_move((2, 3))
+        game.apply_move((0, 5))
+        deadline = timeit.default_timer() + 0.1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        move = player.get_move(game, time_left)
+        self.assertIn(move, game.get_legal_moves())
+
+
+class TranspositionTest(unittest.TestCase):
+    """Unit tests for the lockless transposition table"""
+
+    def test_store_probe(self):
+        table = transposition.TranspositionTable(1 << 4)
+        key = 0x123456789abcdef0
+        self.assertIsNone(table.probe(key))
+        table.store(key, 5, transposition.LOWER, -3., 17)
+        self.assertEqual(table.probe(key),
+                         (5, transposition.LOWER, 17, -3.))
+        self.assertIsNone(table.probe(key ^ 1 << 60))
+        # cell indices of boards larger than 255 cells
+        table.store(key, 5, transposition.EXACT, 2., 300)
+        self.assertEqual(table.probe(key), (5, transposition.EXACT, 300, 2.))
+
+    def test_torn_entry(self):
+        table = transposition.TranspositionTable(1 << 4)
+        key = 0x0fedcba987654321
+        table.store(key, 5, transposition.EXACT, 1.)
+        # a concurrent writer replaced the data word but not the key word
+        slot = 2 * (key & (table.size - 1))
+        table._words[slot + 1] ^= 1 << 20
+        self.assertIsNone(table.probe(key))
+
+    def test_search_with_table(self):
+        player = game_agent.AlphaBetaPlayer(tt_size=1 << 12)
+        opponent = game_agent.AlphaBetaPlayer()
+        game = isolation.Board(player, opponent)
+        game.apply_move((2, 3))
+        game.apply_move((0, 5))
+        deadline = timeit.default_timer() + 0.1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        move = player.get_move(game, time_left)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(player.tt.hits, 0)
+
+
+class BoardSizeTest(unittest.TestCase):
+    """Unit tests for boards of other sizes than 7x7"""
+
+    def test_center_distances(self):
+        for width, height in [(9, 5), (15, 15)]:
+            game = isolation.Board("a", "b", width, height)
+            game.apply_move((height - 1, 1))
+            game.apply_move((2, width - 1))
+            h, w = height / 2., width / 2.
+            for board in (game, search_board.SearchBoard.from_board(game)):
+                for player, (r, c) in [("a", (height - 1, 1)),
+                                       ("b", (2, width - 1))]:
+                    self.assertEqual(sample_players.center_score(board,
+                                                                 player),
+                                     (h - r)**2 + (w - c)**2)
+                    self.assertEqual(game_agent.custom_score_3(board,
+                                                               player),
+                                     abs(h - r) + abs(w - c))
+
+    def test_tournament_sizes(self):
+        self.assertEqual(tournament.parse_size("15x9"), (15, 9))
+        self.assertEqual(tournament.parse_size("11"), (11, 11))
+        players = [game_agent.AlphaBetaPlayer(score_fn=sample_players.
+                                              improved_score, in_place=True),
+                   sample_players.GreedyPlayer()]
+        agents = [tournament.Agent(player, str(i))
+                  for i, player in enumerate(players)]
+        tasks = tournament.round_tasks(agents[0], agents[1:], 1, players,
+                                       random.Random(0), (15, 15))
+        for task in tasks:
+            self.assertEqual(task.size, (15, 15))
+            result = tournament.play_game(players, task, time_limit=50)
+            self.assertNotEqual(result.termination, "forfeit")
+            self.assertGreater(len(result.telemetry[task.player_1 != 0]), 0)
+
+    def test_size_matrix_without_games(self):
+        cpu_agents = [tournament.Agent(sample_players.RandomPlayer(), "R")]
+        test_agents = [tournament.Agent(sample_players.GreedyPlayer(), "G")]
+        scaling = tournament.play_matches(cpu_agents, test_agents, 0,
+                                          size=(5, 5))
+        self.assertIsNone(scaling[test_agents[0].player]["win_rate"])
+        tournament.print_size_matrix(test_agents, [(5, 5)], [scaling])
+
+
+class NegamaxTest(unittest.TestCase):
+    """Unit tests for principal variation search and aspiration windows"""
+
+    def search(self, game, depth, guess=None, **kwargs):
+        player = game_agent.AlphaBetaPlayer(**kwargs)
+        player.time_left = lambda: 1e9
+        board = search_board.SearchBoard.from_state(
+            player, "opponent", game.get_state(), game.width, game.height)
+        return player.aspiration_search(board, depth, guess)[1]
+
+    def test_scores_match(self):
+        game = search_board.SearchBoard("Player1", "Player2")
+        for move in [(2, 3), (0, 5), (3, 5), (2, 4)]:
+            game.push_move(move)
+        expected = self.search(game, 4, pvs=False, aspiration=0)
+        self.assertEqual(self.search(game, 4), expected)
+        self.assertEqual(self.search(game, 4, expected + 20.), expected)
+        self.assertEqual(self.search(game, 4, expected - 20.), expected)
+
+    def test_selective_search(self):
+        game = search_board.SearchBoard("Player1", "Player2")
+        for move in [(2, 3), (0, 5), (3, 5), (2, 4)]:
+            game.push_move(move)
+        expected = self.search(game, 5)
+        # a margin that no score can beat never prunes
+        self.assertEqual(self.search(game, 5, futility=True,
+                                     futility_margin=float("inf")), expected)
+        for kwargs in ({"lmr": True}, {"futility": True}):
+            player = game_agent.AlphaBetaPlayer(**kwargs)
+            player.time_left = lambda: 1e9
+            board = search_board.SearchBoard.from_state(
+                player, "opponent", game.get_state(), game.width, game.height)
+            move, _ = player.search(board, 5)
+            self.assertIn(move, board.get_legal_moves())
+            self.assertGreater(player.reductions + player.futility_prunes, 0)
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Unit tests for the benchmark positions and perft"""
+
+    def test_perft(self):
+        for moves in benchmark.POSITIONS.values():
+            result = benchmark.run_perft(moves, 3)
+            self.assertGreater(result["nodes"], 0)
+
+    def test_fixed_depth(self):
+        moves = benchmark.POSITIONS["midgame"]
+        for player_cls in benchmark.PLAYERS:
+            result = benchmark.fixed_depth(player_cls, game_agent.custom_score,
+                                           moves, 2)
+            self.assertEqual(len(result["time_to_depth"]), 2)
+            self.assertIn(result["move"],
+                          benchmark.make_board(moves).get_legal_moves())
+
+
+class LazySMPTest(unittest.TestCase):
+    """Unit tests for the lazy SMP helper processes"""
+
+    def test_helper_results(self):
+        player = game_agent.AlphaBetaPlayer(workers=2, book=None,
+                                            endgame=False, tt_size=1 << 16)
+        self.addCleanup(player.close)
+        game = benchmark._seat(player, benchmark.POSITIONS["opening"])
+        deadline = timeit.default_timer() + 0.1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        self.assertIn(player.get_move(game, time_left),
+                      game.get_legal_moves())
+        self.assertGreater(time_left(), 0)
+
+        # the helpers alone search a new position, which only they can have
+        # written to the shared table
+        board = search_board.SearchBoard.from_board(benchmark._seat(
+            player, benchmark.POSITIONS["midgame"]))
+        self.assertIsNone(player.tt.probe(board.key))
+        deadline = timeit.default_timer() + 1.
+        player.time_left = time_left
+        player.completed_depth = 0
+        job = player._start_helpers(board, time_left)
+        time.sleep(0.2)
+        move = player._collect_helpers(job, None, board.get_legal_moves())
+        self.assertIn(move, board.get_legal_moves())
+        self.assertIsNotNone(player.tt.probe(board.key))
+
+    def test_endgame_timeout(self):
+        player = game_agent.AlphaBetaPlayer(workers=1, book=None,
+                                            tt_size=1 << 16)
+        self.addCleanup(player.close)
+
+        def solve_endgame(game):
+            raise game_agent.SearchTimeout()
+
+        player.solve_endgame = solve_endgame
+        game = benchmark._seat(player, benchmark.POSITIONS["opening"])
+        self.assertIn(player.get_move(game, lambda: 1000.),
+                      game.get_legal_moves())
+        self.assertTrue(player.stats.timeout)
+
+
+class PonderTest(unittest.TestCase):
+    """Unit tests for searching on the opponent's time"""
+
+    def test_reuse_pondered_position(self):
+        player = game_agent.AlphaBetaPlayer(ponder=True, book=None,
+                                            tt_size=1 << 16)
+        self.addCleanup(player.close)
+        game = benchmark._seat(player, benchmark.POSITIONS["midgame"])
+        deadline = timeit.default_timer() + 0.1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        move = player.get_move(game, time_left)
+        game.apply_move(move)
+        time.sleep(0.3)
+        game.apply_move(game.get_legal_moves()[0])
+        deadline = timeit.default_timer() + 0.1
+        player.get_move(game, time_left)
+        self.assertGreater(player.ponder_depth, 0)
+        self.assertGreater(time_left(), 0)
+
+    def test_stop_pondering_without_waiting(self):
+        player = game_agent.AlphaBetaPlayer(ponder=True, book=None,
+                                            tt_size=1 << 16)
+        self.addCleanup(player.close)
+        game = benchmark._seat(player, benchmark.POSITIONS["midgame"])
+        children = set(multiprocessing.active_children())
+        deadline = timeit.default_timer() + 0.1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        game.apply_move(player.get_move(game, time_left))
+        ponderer, = set(multiprocessing.active_children()) - children
+        time.sleep(0.2)
+
+        # a pondering process that does not get the CPU cannot report the
+        # end of its job
+        os.kill(ponderer.pid, signal.SIGSTOP)
+        self.addCleanup(os.kill, ponderer.pid, signal.SIGCONT)
+        game.apply_move(game.get_legal_moves()[0])
+        deadline = timeit.default_timer() + 0.15
+        start = timeit.default_timer()
+        player._stop_pondering(search_board.SearchBoard.from_board(game))
+        self.assertLess(timeit.default_timer() - start,
+                        game_agent.HELPER_WAIT / 2)
+
+    def test_ponder_after_timeout(self):
+        player = game_agent.AlphaBetaPlayer(ponder=True, book=None,
+                                            tt_size=1 << 16,
+                                            time_management=False)
+        self.addCleanup(player.close)
+        positions = []
+        player._start_pondering = lambda game, move: positions.append(
+            game.get_state())
+        game = benchmark._seat(player, benchmark.POSITIONS["opening"])
+        deadline = timeit.default_timer() + 0.05
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        player.get_move(game, time_left)
+        self.assertTrue(player.stats.timeout)
+        self.assertEqual(positions, [
+            search_board.SearchBoard.from_board(game).get_state()])
+
+
+class AnalysisServerTest(unittest.TestCase):
+    """Unit tests for the position analysis server"""
+
+    MOVES = [[2, 3], [0, 5], [3, 5], [2, 4]]
+
+    def test_top_moves(self):
+        player = game_agent.AlphaBetaPlayer()
+        state, width, height = analysis_server.parse_position(
+            {"moves": self.MOVES})
+        self.assertEqual(analysis_server.parse_position(
+            {"blocked": self.MOVES, "active": [3, 5], "inactive": [2, 4]}),
+            (state, width, height))
+        board = search_board.SearchBoard.from_state(player, "opponent", state)
+        result = analysis_server.analyze(player, board, max_depth=4, top=3)
+        self.assertEqual(result["depth"], 4)
+        self.assertEqual(len(result["moves"]), 3)
+        for entry in result["moves"]:
+            # the exact score of each move, from a fresh search of its child
+            other = game_agent.AlphaBetaPlayer()
+            other.time_left = lambda: 1e9
+            child = search_board.SearchBoard.from_state("player", other,
+                                                        state)
+            child.push_move(tuple(entry["move"]))
+            self.assertEqual(entry["score"], -other.search(child, 3)[1])
+        scores = [entry["score"] for entry in result["moves"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_illegal_moves(self):
+        # (2, 4) is open but not a knight's move away from (2, 3)
+        with self.assertRaises(ValueError):
+            analysis_server.parse_position({"moves": [[2, 3], [0, 5],
+                                                      [2, 4]]})
+
+    def test_requests(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        path = os.path.join(tempdir.name, "analysis.sock")
+        request = {"id": 1, "moves": self.MOVES, "depth": 5}
+
+        async def session():
+            server = analysis_server.AnalysisServer(tt_size=1 << 16)
+            try:
+                await server.start(path)
+                reader, writer = await asyncio.open_unix_connection(path)
+                responses = []
+                for line in [request, {"id": 2, "moves": [[2, 3], [2, 3]]},
+                             {"id": 3, "moves": self.MOVES, "depth": "x"},
+                             {"id": 4, "moves": [[2, 3], [0, 5], [2, 4]]},
+                             request]:
+                    writer.write((json.dumps(line) + "\n").encode())
+                    responses.append(json.loads(await reader.readline()))
+                writer.close()
+                return responses
+            finally:
+                server.close()
+
+        first, *errors, second = asyncio.run(session())
+        self.assertEqual((first["id"], first["depth"]), (1, 5))
+        for request_id, error in enumerate(errors, 2):
+            self.assertEqual(error["id"], request_id)
+            self.assertIn("error", error)
+        self.assertEqual(second["moves"][0], first["moves"][0])
+        # the second search starts from the table filled by the first
+        self.assertLess(second["nodes"], first["nodes"])
+
+
+class TelemetryTest(unittest.TestCase):
+    """Unit tests for the per-move search records"""
+
+    def test_records(self):
+        for player in (game_agent.MinimaxPlayer(),
+                       game_agent.AlphaBetaPlayer(book=None)):
+            player.telemetry = []
+            game = isolation.Board(player, "Opponent")
+            game.apply_move((2, 3))
+            game.apply_move((0, 5))
+            deadline = timeit.default_timer() + 0.1
+            time_left = lambda: 1000 * (deadline - timeit.default_timer())
+            move = player.get_move(game, time_left)
+            self.assertEqual(len(player.telemetry), 1)
+            record = player.telemetry[0]
+            self.assertEqual(tuple(record["move"]), move)
+            self.assertEqual(record["source"], "search")
+            self.assertIsNotNone(record["score"])
+            self.assertGreater(record["leaves"], 0)
+            self.assertGreater(record["nodes"], record["leaves"])
+            self.assertGreaterEqual(record["depth"], 1)
+            self.assertLessEqual(record["eval_time"] + record["movegen_time"],
+                                 2 * record["time"])
+
+
+class ProfileTest(unittest.TestCase):
+    """Unit tests for the profiling mode of the tournament"""
+
+    def test_profiled_games(self):
+        players = [game_agent.AlphaBetaPlayer(in_place=True),
+                   game_agent.MinimaxPlayer(in_place=True)]
+        log = tournament.Telemetry(["AB", "MM"])
+        for task in [tournament.GameTask(0, 1, ((2, 3), (0, 5)), 1),
+                     tournament.GameTask(1, 0, ((3, 3), (1, 2)), 2)]:
+            result = tournament.play_game(players, task, time_limit=50,
+                                          profile=True)
+            self.assertEqual(len(result.profiles), 2)
+            log.add(task, result)
+        for index, player in enumerate(players):
+            self.assertNotIn("get_move", vars(player))
+            summary = tournament.profile_summary(log.profiles[index], player)
+            self.assertGreater(summary["moves"], 0)
+            self.assertGreater(summary["movegen"], 0)
+            self.assertGreater(summary["score"], 0)
+            self.assertAlmostEqual(summary["movegen"] + summary["score"] +
+                                   summary["search"], summary["total"])
+
+    def test_player_without_moves(self):
+        players = [game_agent.AlphaBetaPlayer(in_place=True),
+                   game_agent.MinimaxPlayer(in_place=True)]
+        log = tournament.Telemetry(["AB", "MM"])
+        # the first player has no legal move from the center of a 3x3
+        # board, so the game ends before the second player moves
+        task = tournament.GameTask(0, 1, ((1, 1), (0, 0)), 1, (3, 3))
+        result = tournament.play_game(players, task, time_limit=50,
+                                      profile=True)
+        self.assertEqual(result.profiles[1], {})
+        log.add(task, result)
+        self.assertEqual(list(log.profiles), [0])
+
+
+class ResultStoreTest(unittest.TestCase):
+    """Unit tests for the persistent tournament result store"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "results.jsonl")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_config_hash(self):
+        player = game_agent.AlphaBetaPlayer()
+        self.assertEqual(result_store.config_hash(player, 150),
+                         result_store.config_hash(
+                             game_agent.AlphaBetaPlayer(), 150))
+        for other in [game_agent.AlphaBetaPlayer(lmr=True),
+                      game_agent.AlphaBetaPlayer(score_fn=partial(
+                          game_agent.custom_score, params=(1., 2.))),
+                      game_agent.MinimaxPlayer()]:
+            self.assertNotEqual(result_store.config_hash(other, 150),
+                                result_store.config_hash(player, 150))
+        self.assertNotEqual(result_store.config_hash(player, 100),
+                            result_store.config_hash(player, 150))
+
+    def test_resume(self):
+        players = [sample_players.RandomPlayer(),
+                   sample_players.GreedyPlayer(),
+                   sample_players.GreedyPlayer(sample_players.center_score)]
+        agents = [tournament.Agent(player, str(i))
+                  for i, player in enumerate(players)]
+        tasks = tournament.round_tasks(agents[0], agents[1:], 3, players,
+                                       random.Random(0))
+        store = result_store.ResultStore(self.path, 150)
+        results = tournament.run_games(tasks, players, store=store)
+        self.assertEqual((len(store), store.hits), (len(tasks), 0))
+
+        store = result_store.ResultStore(self.path, 150)
+        stored = tournament.run_games(tasks, players, store=store)
+        self.assertEqual(store.hits, len(tasks))
+        self.assertEqual([r[:2] for r in stored], [r[:2] for r in results])
+        tournament.tally(tasks, stored, players, dict.fromkeys(players, 0),
+                         tournament.Telemetry(["0", "1", "2"]))
+
+        # only the games of the agent whose heuristic changed are replayed
+        players[2] = sample_players.GreedyPlayer(
+            sample_players.improved_score)
+        store = result_store.ResultStore(self.path, 150)
+        tournament.run_games(tasks, players, store=store)
+        self.assertEqual(store.hits, len(tasks) // 2)
+        self.assertEqual(len(store), len(tasks) * 3 // 2)
+
+
+class SelfPlayTest(unittest.TestCase):
+    """Unit tests for the self-play record files"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = self.tempdir.name
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_resume(self):
+        agents = ["AB_Improved", "AB_Custom"]
+        self.assertEqual(selfplay.run(self.path, 2, agents, time_limit=50,
+                                      chunk_size=1), 2)
+        self.assertEqual(selfplay.run(self.path, 3, agents, time_limit=50,
+                                      chunk_size=1), 1)
+        records = list(selfplay.load_records(self.path))
+        self.assertEqual(sorted(r.game_id for r in records), [0, 1, 2])
+        for record in records:
+            task = selfplay.game_task(record.game_id, len(agents))
+            self.assertEqual(record.players, (agents[task.player_1],
+                                              agents[task.player_2]))
+            self.assertEqual(len(record.moves), len(record.scores))
+            game = isolation.Board("Player1", "Player2")
+            for idx in record.moves:
+                self.assertIn((idx % 7, idx // 7), game.get_legal_moves())
+                game.apply_move((idx % 7, idx // 7))
+            if record.termination == "illegal move":
+                self.assertFalse(game.get_legal_moves())
+                self.assertEqual(record.winner, len(record.moves) % 2 ^ 1)
+        with self.assertRaises(ValueError):
+            selfplay.run(self.path, 3, agents[::-1])
+
+
+class MoveCacheTest(unittest.TestCase):
+    """Unit tests for the cross-game move cache"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "moves.txt")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_bounded_persistent(self):
+        cache = move_cache.MoveCache(self.path, max_entries=2)
+        for i in range(3):
+            cache.put(("agent", "position{}".format(i), "8"), (i, 0), 7)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(("agent", "position0", "8"), 7))
+        cache = move_cache.MoveCache(self.path, max_entries=2)
+        self.assertEqual(cache.get(("agent", "position2", "8"), 7), (2, 0))
+        cache.compact()
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_minimax_reuse(self):
+        moves = benchmark.POSITIONS["midgame"]
+        for _ in range(2):
+            player = game_agent.MinimaxPlayer(
+                move_cache=move_cache.MoveCache(self.path))
+            player.telemetry = []
+            game = benchmark._seat(player, moves)
+            first = player.get_move(game, lambda: 1e4)
+            second = player.get_move(game, lambda: 1e4)
+            self.assertEqual(first, second)
+            self.assertEqual(player.telemetry[1]["source"], "cache")
+        self.assertEqual(player.telemetry[0]["source"], "cache")
+        player = game_agent.MinimaxPlayer(
+            search_depth=2, move_cache=move_cache.MoveCache(self.path))
+        player.get_move(benchmark._seat(player, moves), lambda: 1e4)
+        self.assertEqual(player.move_cache.hits, 0)
+
+
+class TablebaseTest(unittest.TestCase):
+    """Unit tests for the small board endgame tablebase"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "tb.bin")
+        tablebase.build_tablebase(self.path, 4, 4, 4)
+        self.table = tablebase.Tablebase(self.path)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _solve(self, board):
+        values = []
+        for move in board.get_legal_moves():
+            board.push_move(move)
+            values.append(self._solve(board))
+            board.pop_move()
+        wins = [v for v in values if v % 2 == 0]
+        if wins:
+            return min(wins) + 1
+        return max(values) + 1 if values else 0
+
+    def test_matches_search(self):
+        rng = random.Random(0)
+        checked = 0
+        while checked < 200:
+            board = search_board.SearchBoard("Player1", "Player2", 4, 4)
+            while board.move_count < 12 and board.get_legal_moves():
+                board.push_move(rng.choice(board.get_legal_moves()))
+            if board.move_count < 12:
+                continue
+            self.assertEqual(self.table.probe(board), self._solve(board))
+            checked += 1
+
+    def test_agent_probe(self):
+        rng = random.Random(1)
+        player = game_agent.AlphaBetaPlayer(tablebase=self.path, book=None)
+        while True:
+            board = isolation.Board(player, "Opponent", 4, 4)
+            while board.move_count < 12 and board.get_legal_moves():
+                board.apply_move(rng.choice(board.get_legal_moves()))
+            if board.move_count == 12 and board.get_legal_moves():
+                break
+        player.telemetry = []
+        move = player.get_move(board, lambda: 1e9)
+        self.assertEqual(player.telemetry[0]["source"], "tablebase")
+        plies = self.table.probe(search_board.SearchBoard.from_board(
+            board.forecast_move(move)))
+        self.assertEqual(plies + 1,
+                         self.table.probe(search_board.SearchBoard.from_board(
+                             board)))
+
+
+class TuneTest(unittest.TestCase):
+    """Unit tests for the SPSA parameter tuner"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "tune.json")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_checkpoint_resume(self):
+        checkpoint = tune.tune("custom_score_2", self.path, 1, matches=1,
+                               time_limit=50)
+        self.assertEqual(checkpoint["iteration"], 1)
+        checkpoint = tune.tune("custom_score_2", self.path, 2, matches=1,
+                               time_limit=50)
+        self.assertEqual([h["iteration"] for h in checkpoint["history"]],
+                         [1, 2])
+        for value, (lo, hi) in zip(checkpoint["params"],
+                                   tune.TUNABLE["custom_score_2"].bounds):
+            self.assertTrue(lo <= value <= hi)
+        with self.assertRaises(ValueError):
+            tune.tune("custom_score", self.path, 3)
+
+
+class LeafEvalTest(unittest.TestCase):
+    """Unit tests for the batched learned leaf evaluation"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "weights.npz")
+        leaf_eval.initial_model().save(self.path)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_batched_search(self):
+        model = leaf_eval.LeafModel.load(self.path)
+        moves = benchmark.POSITIONS["midgame"]
+        results = []
+        for kwargs in ({"leaf_model": self.path}, {"score_fn": model.score}):
+            player = game_agent.AlphaBetaPlayer(**kwargs)
+            player.time_left = lambda: 1e9
+            board = search_board.SearchBoard.from_board(
+                benchmark._seat(player, moves))
+            results.append(player.search(board, 4))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertAlmostEqual(results[0][1], results[1][1])
+
+
+class SearchTimerTest(unittest.TestCase):
+    """Unit tests for the amortized search timer"""
+
+    def test_fixed_interval(self):
+        calls = []
+        timer = game_agent.SearchTimer(lambda: calls.append(1) or 5., 10.,
+                                       interval=8)
+        for _ in range(7):
+            timer.tick()
+        self.assertEqual(len(calls), 0)
+        with self.assertRaises(game_agent.SearchTimeout):
+            timer.tick()
+        self.assertEqual((timer.nodes, timer.checks), (8, 1))
+
+    def test_calibrated_interval(self):
+        clock = [1000.]
+
+        def time_left():
+            clock[0] -= 0.01 * timer.interval
+            return clock[0]
+
+        timer = game_agent.SearchTimer(time_left, 10.)
+        for _ in range(5000):
+            timer.tick()
+        self.assertLess(timer.checks, 50)
+        self.assertLessEqual(0.01 * timer.interval, timer.margin * 10.)
+
+
+class EndgameTest(unittest.TestCase):
+    """Unit tests for the partitioned endgame solver"""
+
+    def setUp(self):
+        self.player1 = game_agent.AlphaBetaPlayer()
+        self.player2 = game_agent.AlphaBetaPlayer()
+        self.game = isolation.Board(self.player1, self.player2)
+        self.game.apply_move((0, 0))
+        self.game.apply_move((6, 6))
+        open_cells = [(1, 2), (0, 4), (4, 5)]
+        for r, c in self.game.get_blank_spaces():
+            if (r, c) not in open_cells:
+                self.game._board_state[r + c * self.game.height] = 1
+
+    def test_solve_partitioned(self):
+        self.player1.time_left = lambda: 1000.
+        move, value = self.player1.solve_endgame(self.game)
+        self.assertEqual(move, (1, 2))
+        self.assertEqual(value, float("inf"))
+
+    def test_get_move_partitioned(self):
+        self.assertEqual(self.player1.get_move(self.game, lambda: 1000.),
+                         (1, 2))
+
+    def test_knight_fill(self):
+        rng = random.Random(0)
+        for width, height in [(7, 7), (3, 3), (8, 5), (4, 2)]:
+            masks = search_board.board_tables(width, height)[2]
+            for _ in range(50):
+                board = search_board.SearchBoard("a", "b", width, height)
+                for _ in range(rng.randrange(2, width * height)):
+                    moves = board.get_legal_moves()
+                    if not moves:
+                        break
+                    board.push_move(rng.choice(moves))
+                own = board.get_player_index("a")
+                opp = board.get_player_index("b")
+                if own is None or opp is None:
+                    continue
+                regions = endgame.knight_fill(own, opp, board.open_cells,
+                                              width, height)
+                self.assertEqual(regions[:2], (
+                    endgame.flood_fill(own, board.open_cells, masks),
+                    endgame.flood_fill(opp, board.open_cells, masks)))
+                self.assertFalse(regions[2] & regions[3])
+                self.assertFalse((regions[2] | regions[3]) &
+                                 ~(regions[0] | regions[1]))
+                even = search_board.shift_tables(width, height)[2]
+                solver = endgame.LongestPathSolver(width, height)
+                if bin(regions[0]).count("1") <= 12:
+                    self.assertGreaterEqual(
+                        endgame.path_bound(own, regions[0], even),
+                        solver.longest_path(own, regions[0]))
+
+    def test_territory_score(self):
+        # separated: longest paths of at most 2 and 1 moves, one move each
+        board = search_board.SearchBoard.from_board(self.game)
+        for game in (self.game, board):
+            self.assertEqual(game_agent.territory_score(game, self.player1),
+                             1.)
+            self.assertEqual(game_agent.territory_score(game, self.player2),
+                             -1.)
+
+
+class MonteCarloTest(unittest.TestCase):
+    """Unit tests for the MCTS competition agent"""
+
+    def setUp(self):
+        self.player1 = competition_agent.CustomPlayer(timeout=5.)
+        self.player2 = game_agent.AlphaBetaPlayer()
+        self.game = isolation.Board(self.player1, self.player2)
+        self.game.apply_move((2, 3))
+        self.game.apply_move((0, 5))
+
+    def time_left(self, ms=50.):
+        deadline = timeit.default_timer() + ms / 1000.
+        return lambda: 1000 * (deadline - timeit.default_timer())
+
+    def test_tree_reuse(self):
+        move = self.player1.get_move(self.game, self.time_left())
+        self.assertIn(move, self.game.get_legal_moves())
+        self.assertGreater(self.player1.playouts, 0)
+        self.game.apply_move(move)
+        node = next(child for child in self.player1._root.children
+                    if child.move == move)
+        reply = node.children[0].move
+        self.game.apply_move(reply)
+        self.player1.get_move(self.game, self.time_left())
+        self.assertGreater(self.player1._root.visits, self.player1.playouts)
+
+    def test_node_cap(self):
+        self.player1.max_nodes = 20
+        self.player1.get_move(self.game, self.time_left())
+        self.assertLessEqual(self.player1.tree_size, 20)
+
+
+class OpeningBookTest(unittest.TestCase):
+    """Unit tests for the opening book"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        opening_book.build_book(self.path, plies=2, time_limit=5)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_probe_symmetric_positions(self):
+        book = opening_book.OpeningBook(self.path)
+        for first in [(0, 0), (0, 6), (6, 0), (6, 6), (3, 3)]:
+            game = isolation.Board("Player1", "Player2")
+            game.apply_move(first)
+            self.assertIn(book.probe(game), game.get_legal_moves())
+        self.assertEqual((book.hits, book.misses), (5, 0))
+
+    def test_missing_book(self):
+        book = opening_book.OpeningBook(self.path + ".missing")
+        game = isolation.Board("Player1", "Player2")
+        self.assertIsNone(book.probe(game))
+
+
+class ParallelTournamentTest(unittest.TestCase):
+    """Unit tests for playing the tournament games in worker processes"""
+
+    def setUp(self):
+        # agents whose moves only depend on the per-game seed
+        self.cpu_agents = [tournament.Agent(sample_players.RandomPlayer(),
+                                            "Random")]
+        self.test_agents = [
+            tournament.Agent(sample_players.GreedyPlayer(), "Greedy"),
+            tournament.Agent(sample_players.RandomPlayer(), "Random")]
+        self.players = [agent.player for agent in self.cpu_agents +
+                        self.test_agents]
+        self.tasks = tournament.round_tasks(
+            self.cpu_agents[0], self.test_agents, 3, self.players,
+            random.Random(5), (5, 5))
+
+    def make_pool(self, workers):
+        with warnings.catch_warnings():
+            # more workers than CPUs
+            warnings.simplefilter("ignore")
+            pool = tournament.make_pool(self.players, workers)
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.close)
+        return pool
+
+    def outcomes(self, results):
+        return [(result.winner, result.termination) for result in results]
+
+    def test_same_results(self):
+        serial = tournament.run_games(self.tasks, self.players)
+        parallel = tournament.run_games(self.tasks, self.players,
+                                        self.make_pool(3))
+        self.assertEqual(self.outcomes(parallel), self.outcomes(serial))
+
+    def test_aggregate_results(self):
+        results = tournament.run_games(self.tasks, self.players)
+        wins = dict.fromkeys(self.players, 0)
+        tournament.tally(self.tasks, results, self.players, wins)
+        self.assertEqual(sum(wins.values()), len(self.tasks))
+        for workers in (1, 3):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                scaling = tournament.play_matches(
+                    self.cpu_agents, self.test_agents, 3, workers, seed=5,
+                    size=(5, 5))
+            for agent in self.test_agents:
+                self.assertEqual(scaling[agent.player]["win_rate"],
+                                 wins[agent.player] / 6)
+
+    def test_pinning_fallback(self):
+        counter = multiprocessing.Value("i", 0)
+        with mock.patch.object(os, "sched_setaffinity", create=True,
+                               side_effect=OSError(22, "Invalid argument")):
+            tournament._init_worker(self.players, [0], counter)
+            # forked workers inherit the failing call
+            pool = self.make_pool(2)
+            results = tournament.run_games(self.tasks, self.players, pool)
+        self.assertEqual(counter.value, 1)
+        self.assertEqual(self.outcomes(results),
+                         self.outcomes(tournament.run_games(self.tasks,
+                                                            self.players)))
+
+    def test_pinning_unsupported(self):
+        counter = multiprocessing.Value("i", 0)
+        with mock.patch.object(os, "sched_setaffinity", create=True):
+            # removes the attribute until the patch is undone
+            del os.sched_setaffinity
+            tournament._init_worker(self.players, [0], counter)
+        self.assertEqual(counter.value, 0)
+
+
+class RatingTest(unittest.TestCase):
+    """Unit tests for the Elo estimates and the SPRT of the tournament"""
+
+    def setUp(self):
+        class Forfeit:
+            def get_move(self, game, time_left):
+                return None
+
+        self.winner = tournament.Agent(sample_players.GreedyPlayer(), "G")
+        self.loser = tournament.Agent(Forfeit(), "F")
+        # an expected score of .75 against .5 under H0
+        self.sprt = tournament.SPRT(0., 400. * math.log10(3), .05, .05)
+
+    def test_sprt_llr(self):
+        elo1 = self.sprt.elo1
+        self.assertAlmostEqual(tournament.sprt_llr(3, 1, 0., elo1),
+                               3 * math.log(1.5) + math.log(.5))
+        self.assertAlmostEqual(tournament.sprt_llr(4, 1, -elo1, elo1),
+                               3 * math.log(3))
+        self.assertEqual(tournament.sprt_llr(0, 0, 0., elo1), 0)
+        self.assertEqual(tournament.sprt_llr(5, 3, 50., 50.), 0)
+
+    def test_sprt_decision(self):
+        upper, lower = math.log(.95 / .05), math.log(.05 / .95)
+        for llr, decision in [(upper + 1e-9, "H1"), (upper - 1e-9, None),
+                              (0., None), (lower + 1e-9, None),
+                              (lower - 1e-9, "H0")]:
+            self.assertEqual(tournament.sprt_decision(llr, .05, .05),
+                             decision)
+        self.assertEqual(tournament.sprt_decision(2.9, .05, .1), "H1")
+        self.assertEqual(tournament.sprt_decision(-2.3, .05, .1), "H0")
+        self.assertIsNone(tournament.sprt_decision(-2.2, .05, .1))
+
+    def play_sprt(self, cpu_agent, test_agent, max_matches):
+        players = [cpu_agent.player, test_agent.player]
+        win_counts = dict.fromkeys(players, 0)
+        counts, games, decisions = tournament.play_sprt_round(
+            cpu_agent, [test_agent], win_counts, max_matches, players,
+            self.sprt, rng=random.Random(1))
+        return games[test_agent.player], decisions[test_agent.player]
+
+    def test_sprt_early_stop(self):
+        # every win adds log(1.5) and every loss log(.5), so the upper bound
+        # log(19) is crossed after 8 wins and the lower one after 5 losses
+        self.assertEqual(self.play_sprt(self.loser, self.winner, 20),
+                         (8, "H1"))
+        self.assertEqual(self.play_sprt(self.winner, self.loser, 20),
+                         (6, "H0"))
+        self.assertEqual(self.play_sprt(self.loser, self.winner, 2),
+                         (4, None))
+
+    def test_no_games(self):
+        self.assertIsNone(tournament.elo_estimate(0, 0))
+        rating, error = tournament.elo_estimate(5, 10)
+        self.assertAlmostEqual(rating, 0.)
+        self.assertGreater(error, 0.)
+        agents = [tournament.Agent("a", "A"), tournament.Agent("b", "B")]
+        tournament.print_ratings(agents, {"a": 0, "b": 3}, {"a": 0, "b": 4})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,302 @@
+"""Long-running position analysis server for Isolation.
+
+Starting a Python process and a cold search for every query pays the import
+and warm-up cost each time and throws away everything the search learned.
+The analysis server instead keeps a pool of worker processes that share one
+transposition table for as long as the server runs, so every request starts
+from the results of all the searches before it.
+
+The server listens on a local socket (a Unix domain socket with `--socket`,
+otherwise TCP on the loopback interface) and speaks JSON lines: each request
+is one JSON object on one line, and each response is one line echoing the
+request `id`.  Requests are searched concurrently on the pool, so responses
+may arrive in a different order than the requests.
+
+A request gives the position either as blocked cells and player locations
+
+    {"id": 1, "width": 7, "height": 7, "blocked": [[2, 3], [0, 5]],
+     "active": [0, 5], "inactive": [2, 3], "time": 500, "top": 3}
+
+or as the move history of the game, in the format of `isoviz/display.html`
+
+    {"id": 2, "moves": [[2, 3], [0, 5]], "depth": 6}
+
+where `active` and `inactive` are the locations of the player to move and
+its opponent (null for a player that has not moved yet; the locations are
+blocked cells whether listed in `blocked` or not), `time` is the search
+budget in milliseconds, `depth` the largest depth searched, and `top` the
+number of moves returned.  The response lists the best moves, best first,
+with their scores to the player to move from the deepest completed iteration:
+
+    {"id": 1, "depth": 9, "exact": false, "nodes": 182390, "time": 497.1,
+     "moves": [{"move": [1, 3], "score": 2.0}, ...]}
+
+Proven wins and losses are scored "win" and "loss", and `exact` is true if
+the search reached the end of the game on every line.  A request that cannot
+be parsed is answered with {"id": ..., "error": message}.
+
+    python analysis_server.py --socket /tmp/isolation.sock --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from game_agent import (AlphaBetaPlayer, SearchStats, SearchTimeout,
+                        SearchTimer, custom_score, custom_score_2,
+                        custom_score_3, territory_score)
+from sample_players import improved_score
+from search_board import SearchBoard
+from transposition import TranspositionTable
+
+DEFAULT_PORT = 8765
+DEFAULT_TIME = 1000  # milliseconds searched when a request sets no budget
+MAX_TIME = 60000  # longest search of any request, in milliseconds
+DEFAULT_TOP = 3
+
+SCORES = OrderedDict([
+    ("improved_score", improved_score),
+    ("custom_score", custom_score),
+    ("custom_score_2", custom_score_2),
+    ("custom_score_3", custom_score_3),
+    ("territory_score", territory_score),
+])
+
+_worker_player = None
+
+
+def _cell(loc, width, height):
+    r, c = loc
+    if not (0 <= r < height and 0 <= c < width):
+        raise ValueError("cell {} is off the {}x{} board".format(
+            list(loc), width, height))
+    return r + c * height
+
+
+def parse_position(request):
+    """Return (state, width, height) of the position described by a request,
+    where `state` is a `SearchBoard.get_state()` tuple for the player to
+    move.  Raises ValueError if the position is invalid.
+    """
+    width = int(request.get("width", 7))
+    height = int(request.get("height", 7))
+    if "moves" in request:
+        board = SearchBoard("Player1", "Player2", width, height)
+        for move in request["moves"]:
+            move = tuple(move)
+            if move not in board.get_legal_moves():
+                raise ValueError("illegal move {} after {} moves".format(
+                    list(move), board.move_count))
+            board.push_move(move)
+        return board.get_state(), width, height
+    locs = []
+    for side in ("active", "inactive"):
+        loc = request.get(side)
+        locs.append(None if loc is None else _cell(loc, width, height))
+    if locs[0] is not None and locs[0] == locs[1]:
+        raise ValueError("both players are on the same cell")
+    blocked = 0
+    for loc in request.get("blocked", []):
+        blocked |= 1 << _cell(loc, width, height)
+    for loc in locs:
+        if loc is not None:
+            blocked |= 1 << loc
+    return (blocked, locs[0], locs[1]), width, height
+
+
+def analyze(player, board, time_limit=None, max_depth=None, top=DEFAULT_TOP):
+    """Run iterative deepening with `player.search_top()` on `board` until
+    the time limit (in milliseconds) expires, `max_depth` is completed, or
+    the result is exact, and return the response fields as a dict.
+
+    The player to move on `board` must be `player`.
+    """
+    start = time.monotonic()
+    deadline = start + (time_limit if time_limit is not None else
+                        MAX_TIME) / 1000.
+    player.time_left = lambda: 1000 * (deadline - time.monotonic())
+    player.timer = SearchTimer(player.time_left, player.TIMER_THRESHOLD)
+    player.stats = SearchStats()
+    ranking, completed, exact = [], 0, False
+    actions = None
+    try:
+        while max_depth is None or completed < max_depth:
+            player._depth_cutoff = False
+            ranking = player.search_top(board, completed + 1, top, actions)
+            actions = [move for move, _ in ranking]
+            completed += 1
+            if not player._depth_cutoff:
+                exact = True
+                break
+    except SearchTimeout:
+        pass
+    moves = []
+    for move, score in ranking[:top]:
+        if score == float("inf"):
+            score = "win"
+        elif score == float("-inf"):
+            score = "loss"
+        moves.append(OrderedDict([("move", list(move)), ("score", score)]))
+    return OrderedDict([
+        ("depth", completed),
+        ("exact", exact),
+        ("nodes", player.timer.nodes),
+        ("time", 1000 * (time.monotonic() - start)),
+        ("moves", moves),
+    ])
+
+
+def _init_worker(score_name, tt_name, tt_size):
+    """Create the search agent of a worker, attached to the shared table."""
+    global _worker_player
+    _worker_player = AlphaBetaPlayer(score_fn=SCORES[score_name],
+                                     in_place=True, book=None,
+                                     time_management=False)
+    _worker_player.tt = TranspositionTable(tt_size, name=tt_name)
+
+
+def _analyze_request(request):
+    """Answer one request in a worker process."""
+    response = OrderedDict([("id", request.get("id"))])
+    try:
+        state, width, height = parse_position(request)
+        time_limit = request.get("time")
+        max_depth = request.get("depth")
+        if time_limit is None and max_depth is None:
+            time_limit = DEFAULT_TIME
+        if time_limit is not None:
+            time_limit = min(float(time_limit), MAX_TIME)
+        if max_depth is not None:
+            max_depth = int(max_depth)
+        top = int(request.get("top", DEFAULT_TOP))
+    except (ValueError, TypeError, KeyError) as e:
+        response["error"] = str(e)
+        return response
+    # an exception raised here would be lost in the pool, and the client
+    # would never get an answer to the request
+    try:
+        board = SearchBoard.from_state(_worker_player, object(), state,
+                                       width, height)
+        response.update(analyze(_worker_player, board, time_limit, max_depth,
+                                top))
+    except Exception as e:
+        response["error"] = "analysis failed: {!r}".format(e)
+    return response
+
+
+class AnalysisServer:
+    """JSON-lines analysis server backed by a process pool sharing one
+    transposition table.
+
+    Parameters
+    ----------
+    workers : int (optional)
+        Number of worker processes, i.e., of requests searched concurrently
+
+    tt_size : int (optional)
+        Number of entries of the shared transposition table
+
+    score : str (optional)
+        Name in `SCORES` of the evaluation function of the search
+    """
+
+    def __init__(self, workers=1, tt_size=AlphaBetaPlayer.DEFAULT_TT_SIZE,
+                 score="improved_score"):
+        self.requests = 0
+        self.tt = TranspositionTable(tt_size, shared=True)
+        self.pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context(),
+            initializer=_init_worker, initargs=(score, self.tt.name,
+                                                self.tt.size))
+        self._server = None
+
+    async def start(self, path=None, port=DEFAULT_PORT):
+        """Listen on the Unix socket `path`, or on the loopback `port`."""
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._handle,
+                                                      "127.0.0.1", port)
+        return self._server
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        async def answer(request):
+            response = await loop.run_in_executor(self.pool,
+                                                  _analyze_request, request)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as e:
+                writer.write((json.dumps({"id": None, "error": str(e)}) +
+                              "\n").encode())
+                continue
+            self.requests += 1
+            task = asyncio.ensure_future(answer(request))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        writer.close()
+
+    def close(self):
+        """Stop listening, shut the pool down and destroy the shared table.
+        """
+        if self._server is not None:
+            self._server.close()
+        self.pool.shutdown()
+        self.tt.close(unlink=True)
+
+
+async def serve(path=None, port=DEFAULT_PORT, workers=1,
+                tt_size=AlphaBetaPlayer.DEFAULT_TT_SIZE,
+                score="improved_score"):
+    """Run an `AnalysisServer` until the task is cancelled."""
+    server = AnalysisServer(workers, tt_size, score)
+    try:
+        listener = await server.start(path, port)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Isolation position " +
+        "analysis as JSON lines on a local socket.")
+    parser.add_argument('-s', '--socket', default=None,
+                        help="Path of the Unix socket to listen on; " +
+                        "listen on TCP localhost otherwise.")
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help="TCP port to listen on without --socket.")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument('--tt-size', type=int,
+                        default=AlphaBetaPlayer.DEFAULT_TT_SIZE,
+                        help="Number of transposition table entries.")
+    parser.add_argument('--score', choices=list(SCORES),
+                        default="improved_score",
+                        help="Evaluation function of the search.")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.socket, args.port, args.workers, args.tt_size,
+                          args.score))
+    except KeyboardInterrupt:
+        pass
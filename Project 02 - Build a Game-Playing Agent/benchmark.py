@@ -0,0 +1,299 @@
+"""Benchmark the search agents on a fixed set of 7x7 positions.
+
+Three kinds of measurement are made on every position:
+
+  - perft: the number of leaf nodes of the full game tree to a fixed depth,
+    counted with in-place make/unmake on a `SearchBoard` and with
+    `forecast_move()` on an `isolation.Board`.  The two counts must agree,
+    which validates the move generation, and their speeds are compared.
+  - fixed depth: `MinimaxPlayer` and `AlphaBetaPlayer` search to a fixed depth
+    with each score function, reporting the nodes searched, the nodes per
+    second and the time to reach each depth.
+  - fixed time: the agents choose a move with `get_move()` under a time
+    limit, reporting the depth reached and the nodes per second.
+
+The results are written as JSON, so that runs on different commits can be
+compared:
+
+    python benchmark.py -o before.json
+    (change the search code)
+    python benchmark.py -o after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import timeit
+
+from collections import OrderedDict
+
+from isolation import Board
+from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
+                        custom_score_2, custom_score_3, territory_score)
+from sample_players import (null_score, open_move_score, improved_score,
+                            center_score)
+from search_board import SearchBoard
+
+# Move sequences from the empty 7x7 board
+POSITIONS = OrderedDict([
+    ("opening", [(2, 3), (0, 5)]),
+    ("midgame", [(6, 2), (2, 1), (5, 4), (4, 2), (3, 3), (2, 3), (4, 5),
+                 (0, 2), (5, 3), (1, 0), (6, 5), (2, 2), (4, 4), (0, 1),
+                 (5, 2), (2, 0)]),
+    ("near_partition", [(5, 0), (5, 4), (4, 2), (6, 6), (3, 4), (4, 5),
+                        (5, 5), (5, 3), (3, 6), (3, 2), (4, 4), (1, 1),
+                        (2, 5), (0, 3), (0, 4), (2, 4), (1, 6), (0, 5),
+                        (3, 5), (1, 3), (5, 6), (0, 1), (6, 4), (2, 2),
+                        (5, 2), (1, 0), (6, 0), (0, 2), (4, 1), (2, 1),
+                        (6, 2), (0, 0), (4, 3), (1, 2)]),
+])
+
+SCORE_FNS = [custom_score, custom_score_2, custom_score_3, territory_score,
+             null_score, open_move_score, improved_score, center_score]
+
+PLAYERS = [MinimaxPlayer, AlphaBetaPlayer]
+
+# time_left() for searches that are not timed
+_UNLIMITED = 1e12
+
+
+def make_board(moves, player_1="Player1", player_2="Player2"):
+    """Return an `isolation.Board` with `moves` applied in order."""
+    board = Board(player_1, player_2)
+    for move in moves:
+        board.apply_move(move)
+    return board
+
+
+def perft(board, depth):
+    """Count the leaf nodes of the game tree to `depth` plies below `board`
+    with in-place make/unmake of moves on a `SearchBoard`.
+    """
+    if depth == 0:
+        return 1
+    moves = board.get_legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.push_move(move)
+        nodes += perft(board, depth - 1)
+        board.pop_move()
+    return nodes
+
+
+def perft_copy(board, depth):
+    """Count the leaf nodes like `perft()`, copying the board with
+    `forecast_move()` for every move.
+    """
+    if depth == 0:
+        return 1
+    moves = board.get_legal_moves()
+    if depth == 1:
+        return len(moves)
+    return sum(perft_copy(board.forecast_move(move), depth - 1)
+               for move in moves)
+
+
+def run_perft(moves, depth):
+    """Run both perft counts on a position and return the results.
+
+    Raises
+    ------
+    AssertionError
+        If the two node counts disagree
+    """
+    board = make_board(moves)
+    search_board = SearchBoard.from_board(board)
+    start = timeit.default_timer()
+    nodes = perft(search_board, depth)
+    in_place = timeit.default_timer() - start
+    start = timeit.default_timer()
+    copy_nodes = perft_copy(board, depth)
+    copied = timeit.default_timer() - start
+    assert nodes == copy_nodes, "perft mismatch: {} != {}".format(
+        nodes, copy_nodes)
+    return OrderedDict([
+        ("depth", depth),
+        ("nodes", nodes),
+        ("seconds", in_place),
+        ("nodes_per_second", nodes / in_place if in_place else None),
+        ("copy_seconds", copied),
+        ("copy_nodes_per_second", nodes / copied if copied else None),
+    ])
+
+
+def _make_player(player_cls, score_fn):
+    if player_cls is AlphaBetaPlayer:
+        return AlphaBetaPlayer(score_fn=score_fn, in_place=True, book=None)
+    return player_cls(score_fn=score_fn, in_place=True)
+
+
+def _seat(player, moves):
+    """Return the position after `moves` with `player` to move."""
+    opponent = "Opponent"
+    if len(moves) % 2:
+        return make_board(moves, opponent, player)
+    return make_board(moves, player, opponent)
+
+
+def fixed_depth(player_cls, score_fn, moves, depth):
+    """Search a position to `depth` plies and return the results.
+
+    `AlphaBetaPlayer` deepens iteratively as in `get_move()`, so its time to
+    each depth is cumulative; `MinimaxPlayer` searches each depth from
+    scratch, and its time to each depth is the time of that search alone.
+    """
+    player = _make_player(player_cls, score_fn)
+    player.time_left = lambda: _UNLIMITED
+    game = SearchBoard.from_board(_seat(player, moves))
+    times = []
+    nodes = 0
+    score = None
+    start = timeit.default_timer()
+    for d in range(1, depth + 1):
+        if player_cls is AlphaBetaPlayer:
+            move, score = player.aspiration_search(game, d, score)
+            times.append(timeit.default_timer() - start)
+        else:
+            player.timer = None
+            depth_start = timeit.default_timer()
+            move = player.minimax(game, d)
+            times.append(timeit.default_timer() - depth_start)
+            nodes += player.timer.nodes
+    elapsed = timeit.default_timer() - start
+    if player_cls is AlphaBetaPlayer:
+        nodes = player.timer.nodes
+    return OrderedDict([
+        ("depth", depth),
+        ("move", move),
+        ("nodes", nodes),
+        ("seconds", elapsed),
+        ("nodes_per_second", nodes / elapsed if elapsed else None),
+        ("time_to_depth", times),
+    ])
+
+
+def fixed_time(player_cls, score_fn, moves, time_limit):
+    """Choose a move with `get_move()` in `time_limit` milliseconds and
+    return the results.
+    """
+    player = _make_player(player_cls, score_fn)
+    game = _seat(player, moves)
+    start = timeit.default_timer()
+    time_left = lambda: time_limit - 1000 * (timeit.default_timer() - start)
+    move = player.get_move(game, time_left)
+    elapsed = timeit.default_timer() - start
+    if player_cls is AlphaBetaPlayer:
+        depth = player.completed_depth
+    else:
+        depth = player.search_depth if move != (-1, -1) else 0
+    nodes = player.timer.nodes
+    return OrderedDict([
+        ("time_limit", time_limit),
+        ("move", move),
+        ("depth", depth),
+        ("nodes", nodes),
+        ("seconds", elapsed),
+        ("nodes_per_second", nodes / elapsed if elapsed else None),
+    ])
+
+
+def git_commit():
+    """Return the current git commit id, or None outside a repository."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(depth=4, time_limit=150, perft_depth=4):
+    """Run the whole benchmark and return the results as a dict."""
+    results = OrderedDict([
+        ("commit", git_commit()),
+        ("python", platform.python_version()),
+        ("settings", OrderedDict([("depth", depth),
+                                  ("time_limit", time_limit),
+                                  ("perft_depth", perft_depth)])),
+        ("perft", OrderedDict()),
+        ("search", OrderedDict()),
+    ])
+    for name, moves in POSITIONS.items():
+        results["perft"][name] = run_perft(moves, perft_depth)
+    for player_cls in PLAYERS:
+        for score_fn in SCORE_FNS:
+            agent = "{}/{}".format(player_cls.__name__, score_fn.__name__)
+            positions = results["search"][agent] = OrderedDict()
+            for name, moves in POSITIONS.items():
+                positions[name] = OrderedDict([
+                    ("fixed_depth", fixed_depth(player_cls, score_fn, moves,
+                                                depth)),
+                    ("fixed_time", fixed_time(player_cls, score_fn, moves,
+                                              time_limit)),
+                ])
+    return results
+
+
+def _ratio(new, old):
+    if not new or not old:
+        return "{:>6}".format("-")
+    return "{:6.2f}".format(new / old)
+
+
+def print_results(results, baseline=None):
+    """Print a summary table of `results`, with the search speed relative to
+    `baseline` (the results of an earlier run) if one is given.
+    """
+    print("{:<16}{:>12}{:>14}{:>14}".format(
+        "perft", "nodes", "nodes/s", "copy nodes/s"))
+    for name, result in results["perft"].items():
+        print("{:<16}{:>12}{:>14.0f}{:>14.0f}".format(
+            name, result["nodes"], result["nodes_per_second"] or 0,
+            result["copy_nodes_per_second"] or 0))
+    print()
+    header = "{:<34}{:<16}{:>12}{:>12}{:>8}".format(
+        "agent", "position", "nodes/s", "to depth", "depth")
+    if baseline is not None:
+        header += "{:>8}".format("speed")
+    print(header)
+    for agent, positions in results["search"].items():
+        for name, result in positions.items():
+            line = "{:<34}{:<16}{:>12.0f}{:>12.4f}{:>8}".format(
+                agent, name, result["fixed_depth"]["nodes_per_second"] or 0,
+                result["fixed_depth"]["time_to_depth"][-1],
+                result["fixed_time"]["depth"])
+            if baseline is not None:
+                old = baseline["search"].get(agent, {}).get(name)
+                line += "  " + _ratio(
+                    result["fixed_depth"]["nodes_per_second"],
+                    old and old["fixed_depth"]["nodes_per_second"])
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark move " +
+        "generation and the search agents on a fixed set of positions.")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Path of the JSON file to write the results to.")
+    parser.add_argument('-d', '--depth', type=int, default=4,
+                        help="Depth of the fixed-depth searches.")
+    parser.add_argument('-t', '--time', type=int, default=150,
+                        help="Time limit of the fixed-time searches in " +
+                        "milliseconds.")
+    parser.add_argument('-p', '--perft-depth', type=int, default=4,
+                        help="Depth of the perft node counts.")
+    parser.add_argument('--compare', default=None,
+                        help="JSON results of an earlier run to compare " +
+                        "the search speed against.")
+    args = parser.parse_args()
+    results = run(args.depth, args.time, args.perft_depth)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
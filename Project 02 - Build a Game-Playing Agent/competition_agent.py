@@ -4,8 +4,12 @@ champions) in a tournament.
 
          COMPLETING AND SUBMITTING A COMPETITION AGENT IS OPTIONAL
 """
+import math
 import random
 
+from opening_book import default_book
+from search_board import SearchBoard, mobility
+
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
@@ -33,7 +37,35 @@ def custom_score(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    raise NotImplementedError
+    if game.is_loser(player):
+        return float("-inf")
+
+    if game.is_winner(player):
+        return float("inf")
+
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
+    return float(own_moves - opp_moves)
+
+
+class _Node:
+    """Node of the Monte Carlo search tree.
+
+    `wins` counts the playouts won by `player`, the player who made `move` to
+    reach this node, so that each node is scored from the point of view of
+    the player choosing it at the parent.  Nodes hold no reference to their
+    parent, so subtrees dropped when the tree is re-rooted are freed at once
+    without waiting for the cyclic garbage collector.
+    """
+    __slots__ = ("move", "player", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, player, untried):
+        self.move = move
+        self.player = player
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.
 
 
 class CustomPlayer:
@@ -59,12 +91,44 @@ class CustomPlayer:
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    exploration : float (optional)
+        UCT exploration constant
+
+    guided : float (optional)
+        Probability that a playout move is chosen greedily (the move leaving
+        the mover the most replies) instead of uniformly at random
+
+    max_nodes : int (optional)
+        Cap on the number of nodes stored in the search tree; once it is
+        reached, playouts continue without expanding the tree
+
+    book : `opening_book.OpeningBook` (optional)
+        Opening book probed before searching; None disables the book
+
+    tablebase : `tablebase.Tablebase` (optional)
+        Endgame tablebase used to play covered positions exactly and to end
+        playouts as soon as they reach a covered position
     """
 
-    def __init__(self, data=None, timeout=1.):
+    def __init__(self, data=None, timeout=1., exploration=math.sqrt(2),
+                 guided=0., max_nodes=200000, book=default_book,
+                 tablebase=None):
         self.score = custom_score
+        self.book = book
+        self.tablebase = tablebase
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.exploration = exploration
+        self.guided = guided
+        self.max_nodes = max_nodes
+        self.playouts = 0
+        self.playouts_per_second = 0.
+        self.tree_size = 0
+        self.win_rate = None
+        self._root = None
+        self._root_board = None
+        self._last_move = None
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -94,4 +158,145 @@ class CustomPlayer:
             (-1, -1) if there are no available legal moves.
         """
         # OPTIONAL: Finish this function!
-        raise NotImplementedError
+        self.time_left = time_left
+        self.win_rate = None
+        start = time_left()
+
+        board = SearchBoard.from_board(game)
+        legal_moves = board.get_legal_moves()
+        if not legal_moves:
+            return (-1, -1)
+
+        if self.book is not None:
+            move = self.book.probe(board)
+            if move is not None:
+                return move
+
+        if self.tablebase is not None:
+            result = self.tablebase.best_move(board)
+            if result is not None:
+                self.win_rate = float(result[1] % 2)
+                return result[0]
+
+        root = self._reuse_tree(board)
+        if root is None:
+            root = _Node(None, board.inactive_player, legal_moves)
+            self.tree_size = 1
+
+        self.playouts = 0
+        while time_left() > self.TIMER_THRESHOLD:
+            self._run_playout(root, board)
+            self.playouts += 1
+
+        elapsed = start - time_left()
+        self.playouts_per_second = (1000. * self.playouts / elapsed
+                                    if elapsed > 0 else 0.)
+
+        if not root.children:
+            return random.choice(legal_moves)
+        best = max(root.children, key=lambda child: child.visits)
+        self.win_rate = best.wins / best.visits
+        self._root, self._root_board = root, board
+        self._last_move = best.move
+        return best.move
+
+    def _reuse_tree(self, board):
+        """Re-root the tree kept from the previous move at the current
+        position, or return None if the position is not in the tree.
+        """
+        root, previous = self._root, self._root_board
+        self._root = self._root_board = None
+        if root is None or previous.move_count + 2 != board.move_count:
+            return None
+        opponent = board.inactive_player
+        reply = board.get_player_location(opponent)
+        for child in root.children:
+            if child.move != self._last_move:
+                continue
+            for grandchild in child.children:
+                if grandchild.move != reply:
+                    continue
+                previous.push_move(child.move)
+                previous.push_move(grandchild.move)
+                matched = previous.hash() == board.hash()
+                previous.pop_move()
+                previous.pop_move()
+                if not matched:
+                    return None
+                # every visit adds at most one node to the tree
+                self.tree_size = grandchild.visits + 1
+                return grandchild
+        return None
+
+    def _run_playout(self, root, board):
+        """Run one selection, expansion, simulation and backpropagation step
+        from `root`, and restore `board` to the root position afterwards.
+        """
+        node = root
+        path = [root]
+        depth = 0
+
+        # Selection
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            c = self.exploration
+            node = max(node.children, key=lambda child: (
+                child.wins / child.visits +
+                c * math.sqrt(log_visits / child.visits)))
+            board.push_move(node.move)
+            path.append(node)
+            depth += 1
+
+        # Expansion
+        if node.untried and self.tree_size < self.max_nodes:
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            player = board.active_player
+            board.push_move(move)
+            depth += 1
+            child = _Node(move, player, board.get_legal_moves())
+            node.children.append(child)
+            path.append(child)
+            self.tree_size += 1
+
+        # Simulation
+        tablebase = self.tablebase
+        winner = None
+        moves = board.get_legal_moves()
+        while moves:
+            if tablebase is not None:
+                plies = tablebase.probe(board)
+                if plies is not None:
+                    winner = (board.active_player if plies % 2 else
+                              board.inactive_player)
+                    break
+            if self.guided and random.random() < self.guided:
+                move = self._greedy_move(board, moves)
+            else:
+                move = random.choice(moves)
+            board.push_move(move)
+            depth += 1
+            moves = board.get_legal_moves()
+        if winner is None:
+            winner = board.inactive_player
+
+        for _ in range(depth):
+            board.pop_move()
+
+        # Backpropagation
+        for node in path:
+            node.visits += 1
+            if node.player == winner:
+                node.wins += 1
+
+    @staticmethod
+    def _greedy_move(board, moves):
+        """Return the move that leaves the active player the most replies."""
+        player = board.active_player
+        best_move, best_replies = moves[0], -1
+        for move in moves:
+            board.push_move(move)
+            replies = len(board.get_legal_moves(player))
+            board.pop_move()
+            if replies > best_replies:
+                best_move, best_replies = move, replies
+        return best_move
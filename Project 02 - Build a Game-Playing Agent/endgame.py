@@ -0,0 +1,242 @@
+"""Exact endgame play for Isolation once the players are partitioned.
+
+When the cells reachable by the two players no longer overlap, the players can
+never interfere with each other again and the game reduces to two independent
+longest-path problems: each player makes as many moves as the longest knight's
+path through its own region allows, and the player to move loses if its path
+is not strictly longer than its opponent's.
+"""
+from search_board import board_tables, shift_tables
+
+_PAIRED = {}
+
+
+def _bits(mask):
+    """Yield the index of each set bit in `mask`."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def flood_fill(start, open_cells, masks):
+    """Return the bitmask of open cells reachable from cell `start` by any
+    sequence of knight moves through open cells.
+
+    Parameters
+    ----------
+    start : int
+        Cell index where the fill starts (the cell itself is not included)
+
+    open_cells : int
+        Bitmask of the cells that are not blocked
+
+    masks : list
+        Knight-move bitmask for every cell index (see `board_tables()`)
+    """
+    region = 0
+    frontier = masks[start] & open_cells
+    while frontier:
+        region |= frontier
+        reached = 0
+        for idx in _bits(frontier):
+            reached |= masks[idx]
+        frontier = reached & open_cells & ~region
+    return region
+
+
+def _paired_shifts(width, height):
+    """Return the shift tables of `shift_tables()` with every mask repeated
+    in the bits above the board, which hold the second fill of
+    `knight_fill()`.
+    """
+    key = (width, height)
+    if key not in _PAIRED:
+        cells = width * height
+        left, right, _ = shift_tables(width, height)
+        _PAIRED[key] = tuple((shift, mask | mask << cells)
+                             for shift, mask in left + right)
+    return _PAIRED[key]
+
+
+def knight_fill(own_loc, opp_loc, open_cells, width, height):
+    """Flood fill the open cells from both players at once.
+
+    The fills of both players are held in one integer, the opponent's in
+    the bits above the board, and each step moves both frontiers with eight
+    shift-and-mask operations (see `shift_tables()`) instead of one table
+    lookup per frontier cell as in `flood_fill()`.  A mask only keeps the
+    cells whose move lands on the board, so no move crosses from one fill to
+    the other.
+
+    Returns
+    -------
+    (int, int, int, int)
+        The bitmasks of the open cells reachable by each player, and of the
+        territory of each player: the cells it reaches in strictly fewer
+        moves than its opponent
+    """
+    cells = width * height
+    ((a, ma), (b, mb), (c, mc), (d, md),
+     (e, me), (f, mf), (g, mg), (h, mh)) = _paired_shifts(width, height)
+    board = (1 << cells) - 1
+    both_open = open_cells | open_cells << cells
+    front = 1 << own_loc | 1 << (opp_loc + cells)
+    region = own_territory = opp_territory = claimed = 0
+    while front:
+        front = ((front & ma) << a | (front & mb) << b |
+                 (front & mc) << c | (front & md) << d |
+                 (front & me) >> e | (front & mf) >> f |
+                 (front & mg) >> g | (front & mh) >> h) & both_open & ~region
+        region |= front
+        own_new = front & board & ~claimed
+        opp_new = front >> cells & ~claimed
+        own_territory |= own_new & ~opp_new
+        opp_territory |= opp_new & ~own_new
+        claimed |= own_new | opp_new
+    return region & board, region >> cells, own_territory, opp_territory
+
+
+def path_bound(start, region, even):
+    """Return an upper bound on the length of the longest path from cell
+    `start` through the cells of `region`.
+
+    Knight moves alternate between the cells of even and odd row plus column
+    (`even` is the bitmask of the even ones), so a path of `n` moves visits
+    `ceil(n / 2)` cells of the other parity than `start` and `floor(n / 2)`
+    of the same.
+    """
+    same = even if even >> start & 1 else ~even
+    same_count = bin(region & same).count("1")
+    other_count = bin(region & ~same).count("1")
+    return min(2 * other_count, 2 * same_count + 1)
+
+
+def partition(board):
+    """Return the reachable regions of the active and inactive players, or
+    None if the players have not both moved or their regions still touch.
+
+    Parameters
+    ----------
+    board : `SearchBoard`
+        The position to test
+    """
+    own_loc = board.get_player_index(board.active_player)
+    opp_loc = board.get_player_index(board.inactive_player)
+    if own_loc is None or opp_loc is None:
+        return None
+    masks = board_tables(board.width, board.height)[2]
+    open_cells = board.open_cells
+    own_region = flood_fill(own_loc, open_cells, masks)
+    opp_region = flood_fill(opp_loc, open_cells, masks)
+    if own_region & opp_region:
+        return None
+    return own_region, opp_region
+
+
+class LongestPathSolver:
+    """Exact longest knight's path search with memoization.
+
+    Results are memoized by (position, region bitmask), where the region is
+    the set of open cells that can still be reached, so they remain valid from
+    one move to the next of the same game.
+
+    Parameters
+    ----------
+    width, height : int
+        Dimensions of the board
+
+    check : callable (optional)
+        Called every `check_interval` nodes; may raise to abort the search
+        (e.g., `SearchTimeout` when the turn timer is about to expire)
+
+    max_cells : int (optional)
+        Largest region that `solve()` will attempt; the cost of an exact
+        solution grows exponentially with the size of the regions
+
+    max_entries : int (optional)
+        The memo is cleared when it grows past this number of entries
+    """
+
+    def __init__(self, width, height, check=None, check_interval=32,
+                 max_cells=20, max_entries=1000000):
+        self.width = width
+        self.height = height
+        self.max_cells = max_cells
+        self.check = check
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self.nodes = 0
+        self._masks = board_tables(width, height)[2]
+        self._memo = {}
+
+    def longest_path(self, start, region):
+        """Return the length of the longest path from cell `start` through
+        the cells in `region`.
+        """
+        key = (start, region)
+        memo = self._memo
+        if key in memo:
+            return memo[key]
+        self.nodes += 1
+        if self.check is not None and self.nodes % self.check_interval == 0:
+            self.check()
+        best = 0
+        bound = bin(region).count("1")
+        for idx in _bits(self._masks[start] & region):
+            rest = region & ~(1 << idx)
+            length = 1 + self.longest_path(idx, flood_fill(idx, rest,
+                                                           self._masks))
+            if length > best:
+                best = length
+                if best == bound:
+                    break
+        if len(memo) >= self.max_entries:
+            memo.clear()
+        memo[key] = best
+        return best
+
+    def best_move(self, start, region):
+        """Return (length, idx) for the move from `start` that begins the
+        longest path through `region`; idx is None if there is no move.
+        """
+        best_length, best_idx = 0, None
+        for idx in _bits(self._masks[start] & region):
+            rest = region & ~(1 << idx)
+            length = 1 + self.longest_path(idx, flood_fill(idx, rest,
+                                                           self._masks))
+            if length > best_length:
+                best_length, best_idx = length, idx
+        return best_length, best_idx
+
+    def solve(self, board):
+        """Solve a partitioned position exactly.
+
+        Parameters
+        ----------
+        board : `SearchBoard`
+            The position to solve
+
+        Returns
+        -------
+        ((int, int), float) or None
+            The move for the active player and the proven value of the
+            position to that player (+inf for a win, -inf for a loss), or None
+            if the players are not partitioned or a region is too large
+        """
+        regions = partition(board)
+        if regions is None:
+            return None
+        own_region, opp_region = regions
+        if max(bin(own_region).count("1"),
+               bin(opp_region).count("1")) > self.max_cells:
+            return None
+        own_length, idx = self.best_move(
+            board.get_player_index(board.active_player), own_region)
+        opp_length = self.longest_path(
+            board.get_player_index(board.inactive_player), opp_region)
+        move = (-1, -1) if idx is None else board_tables(
+            self.width, self.height)[0][idx]
+        if own_length > opp_length:
+            return move, float("inf")
+        return move, float("-inf")
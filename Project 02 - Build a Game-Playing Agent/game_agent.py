@@ -2,7 +2,23 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import multiprocessing
+import os
+import queue
 import random
+import time
+import timeit
+import warnings
+import weakref
+
+from collections import OrderedDict
+
+from endgame import LongestPathSolver, knight_fill, path_bound
+from opening_book import default_book
+from search_board import (SearchBoard, center_distance, mobility,
+                          shift_tables)
+from transposition import (EXACT, LOWER, UPPER, NO_MOVE,
+                           TranspositionTable)
 
 
 class SearchTimeout(Exception):
@@ -10,7 +26,35 @@ class SearchTimeout(Exception):
     pass
 
 
-def custom_score(game, player):
+# Tunable constants of the custom score functions as parameter vectors; the
+# defaults reproduce the hand-set functions, and `tune.py` fits them by SPSA.
+# Each function takes its vector as the optional `params` argument, e.g.,
+# `functools.partial(custom_score, params=(1.2, 0.9))`.
+
+# Weights of the player's and the opponent's number of legal moves
+CUSTOM_SCORE_PARAMS = (1., 1.)
+CUSTOM_SCORE_2_PARAMS = (1., 1.)
+# Weights of the distance from the center and of the difference of the
+# number of legal moves
+CUSTOM_SCORE_3_PARAMS = (1., 0.)
+# Weights of the difference of territory (of longest path bounds once the
+# players are separated) and of the difference of the number of legal moves
+TERRITORY_SCORE_PARAMS = (1., .5)
+
+# Number of plies the predicted opponent reply is searched ahead of the other
+# replies while pondering
+PONDER_LEAD = 2
+
+# Longest time in seconds waited for the helper processes to report the end
+# of a cancelled job, in case a helper died
+HELPER_WAIT = .1
+
+# Longest time in seconds a move waits for the results of the cancelled
+# pondering job; the iterations it completed are already queued by then
+PONDER_WAIT = .005
+
+
+def custom_score(game, player, params=CUSTOM_SCORE_PARAMS):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
 
@@ -29,6 +73,9 @@ def custom_score(game, player):
         A player instance in the current game (i.e., an object corresponding to
         one of the player objects `game.__player_1__` or `game.__player_2__`.)
 
+    params : tuple (optional)
+        Parameter vector of the function (see `CUSTOM_SCORE_PARAMS`)
+
     Returns
     -------
     float
@@ -42,8 +89,9 @@ def custom_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_weight, opp_weight = params
+    own_moves = own_weight * mobility(game, player)
+    opp_moves = opp_weight * mobility(game, game.get_opponent(player))
 
     # Compare the remaining of moves between palyer and opponent
     if own_moves > opp_moves:
@@ -55,7 +103,7 @@ def custom_score(game, player):
     raise NotImplementedError
 
 
-def custom_score_2(game, player):
+def custom_score_2(game, player, params=CUSTOM_SCORE_2_PARAMS):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
 
@@ -72,6 +120,9 @@ def custom_score_2(game, player):
         A player instance in the current game (i.e., an object corresponding to
         one of the player objects `game.__player_1__` or `game.__player_2__`.)
 
+    params : tuple (optional)
+        Parameter vector of the function (see `CUSTOM_SCORE_2_PARAMS`)
+
     Returns
     -------
     float
@@ -84,19 +135,21 @@ def custom_score_2(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_weight, opp_weight = params
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
 
     # Compare the moves of player and opponent
     if own_moves + opp_moves != 0:
-        return 100 * (own_moves - opp_moves)/(own_moves + opp_moves)
+        return 100 * (own_weight * own_moves - opp_weight * opp_moves)/(
+            own_moves + opp_moves)
     else:
         return 0
 
     raise NotImplementedError
 
 
-def custom_score_3(game, player):
+def custom_score_3(game, player, params=CUSTOM_SCORE_3_PARAMS):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
 
@@ -113,6 +166,9 @@ def custom_score_3(game, player):
         A player instance in the current game (i.e., an object corresponding to
         one of the player objects `game.__player_1__` or `game.__player_2__`.)
 
+    params : tuple (optional)
+        Parameter vector of the function (see `CUSTOM_SCORE_3_PARAMS`)
+
     Returns
     -------
     float
@@ -125,13 +181,291 @@ def custom_score_3(game, player):
     if game.is_winner(player):
         return float("inf")
     # Mahanttan Distance
-    w, h = game.width / 2., game.height / 2.
-    y, x = game.get_player_location(player)
-    return float(abs(h - y) + abs(w - x))
+    distance_weight, mobility_weight = params
+    score = distance_weight * center_distance(game, player)[1]
+    if mobility_weight:
+        score += mobility_weight * (
+            mobility(game, player) -
+            mobility(game, game.get_opponent(player)))
+    return float(score)
 
     raise NotImplementedError
 
 
+def territory_score(game, player, params=TERRITORY_SCORE_PARAMS):
+    """Calculate the heuristic value of a game state from the point of view
+    of the given player from the territory of each player.
+
+    Both players are flood filled at once with bit-parallel knight moves
+    (see `endgame.knight_fill()`).  While the players can still reach
+    common cells, a player's territory is the set of cells it reaches in
+    fewer moves than its opponent; once their regions are separated, it is
+    an upper bound on the longest path through its region (see
+    `endgame.path_bound()`).  Before both players have moved, only the
+    difference of the number of legal moves is scored.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    player : object
+        A player instance in the current game
+
+    params : tuple (optional)
+        Parameter vector of the function (see `TERRITORY_SCORE_PARAMS`)
+
+    Returns
+    -------
+    float
+        The heuristic value of the current game state to the specified player.
+    """
+    if game.is_loser(player):
+        return float("-inf")
+
+    if game.is_winner(player):
+        return float("inf")
+
+    territory_weight, mobility_weight = params
+    opponent = game.get_opponent(player)
+    score = mobility_weight * (mobility(game, player) -
+                               mobility(game, opponent))
+    if not isinstance(game, SearchBoard):
+        game = SearchBoard.from_board(game)
+    own_loc = game.get_player_index(player)
+    opp_loc = game.get_player_index(opponent)
+    if own_loc is None or opp_loc is None:
+        return float(score)
+    own_region, opp_region, own_territory, opp_territory = knight_fill(
+        own_loc, opp_loc, game.open_cells, game.width, game.height)
+    if own_region & opp_region:
+        territory = (bin(own_territory).count("1") -
+                     bin(opp_territory).count("1"))
+    else:
+        even = shift_tables(game.width, game.height)[2]
+        territory = (path_bound(own_loc, own_region, even) -
+                     path_bound(opp_loc, opp_region, even))
+    return float(score + territory_weight * territory)
+
+
+def _make_move(game, move):
+    """Return the successor of `game` after `move` is applied. A `SearchBoard`
+    is updated in place; any other board is copied with `forecast_move()`.
+    """
+    if isinstance(game, SearchBoard):
+        game.push_move(move)
+        return game
+    return game.forecast_move(move)
+
+
+def _unmake_move(game):
+    """Revert the move applied by `_make_move()` on an in-place board."""
+    if isinstance(game, SearchBoard):
+        game.pop_move()
+
+
+class SearchTimer:
+    """Amortized check of the turn timer during search.
+
+    Calling `time_left()` at every node is a measurable share of the search
+    cost, so the search calls `tick()` at every node instead and the timer is
+    only read once every `interval` nodes.  Unless a fixed interval is given,
+    the interval is recalibrated at each check from the measured time per
+    node, so that the time between two checks stays below `margin` times the
+    timeout threshold.
+
+    Parameters
+    ----------
+    time_left : callable
+        A function that returns the number of milliseconds left in the turn
+
+    threshold : float
+        Time remaining (in milliseconds) when search is aborted
+
+    interval : int (optional)
+        Fixed number of nodes between timer checks; None to auto-calibrate
+
+    margin : float (optional)
+        Fraction of `threshold` that may elapse between two timer checks
+    """
+
+    MAX_INTERVAL = 4096
+
+    def __init__(self, time_left, threshold, interval=None, margin=0.25):
+        self.time_left = time_left
+        self.threshold = threshold
+        self.calibrate = interval is None
+        self.interval = 1 if interval is None else interval
+        self.margin = margin
+        self.countdown = self.interval
+        self.checks = 0
+        self._counted = 0
+        self._last_remaining = None
+
+    @property
+    def nodes(self):
+        """Number of nodes counted by `tick()` so far."""
+        return self._counted + self.interval - self.countdown
+
+    def tick(self):
+        """Count one node, and check the timer if the interval has elapsed."""
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.check()
+
+    def check(self):
+        """Read the timer and raise `SearchTimeout` if it is about to expire.
+        """
+        self.checks += 1
+        self._counted += self.interval - self.countdown
+        remaining = self.time_left()
+        if remaining < self.threshold:
+            self.countdown = self.interval
+            raise SearchTimeout()
+        if self.calibrate and self._last_remaining is not None:
+            elapsed = self._last_remaining - remaining
+            if elapsed > 0:
+                target = self.margin * self.threshold * self.interval / elapsed
+                self.interval = int(min(target, 2 * self.interval))
+            else:
+                self.interval *= 2
+            self.interval = max(1, min(self.interval, self.MAX_INTERVAL))
+        self._last_remaining = remaining
+        self.countdown = self.interval
+
+
+class TimeManager:
+    """Decide whether another iterative deepening iteration is worth starting.
+
+    The cost of the next iteration is predicted from the duration of the last
+    completed iteration and the effective branching factor measured between
+    the last two iterations.  If the prediction does not fit in the time that
+    is left, the iteration could not complete and its partial result would be
+    discarded, so the search stops early instead.
+
+    Parameters
+    ----------
+    time_left : callable
+        A function that returns the number of milliseconds left in the turn
+
+    threshold : float
+        Time remaining (in milliseconds) when search is aborted
+    """
+
+    def __init__(self, time_left, threshold):
+        self.time_left = time_left
+        self.threshold = threshold
+        self.iterations = 0
+        self.early_stops = 0
+        self.branching_factor = None
+        self.predicted = None
+        self._start = None
+        self._last_time = None
+        self._last_nodes = None
+
+    def start_iteration(self, nodes):
+        self._start = (self.time_left(), nodes)
+
+    def end_iteration(self, nodes):
+        """Record an iteration that completed with the node counter at
+        `nodes`, and return True if the next iteration is predicted to finish
+        before the timer expires.
+        """
+        remaining = self.time_left()
+        elapsed = self._start[0] - remaining
+        searched = nodes - self._start[1]
+        self.iterations += 1
+        if self._last_nodes:
+            self.branching_factor = max(1., searched / self._last_nodes)
+            self.predicted = elapsed * self.branching_factor
+        self._last_time, self._last_nodes = elapsed, searched
+        if (self.predicted is not None and
+                self.predicted > remaining - self.threshold):
+            self.early_stops += 1
+            return False
+        return True
+
+
+class SearchStats:
+    """Telemetry of the search for one move.
+
+    Node, leaf and cutoff counts are exact; leaves are counted as the nodes
+    that were not expanded, so that the search does no extra work per leaf.
+    The time spent generating moves and evaluating leaves is measured only at
+    the nodes where the search timer is read (see `SearchTimer`) and
+    extrapolated to all nodes, which keeps the cost of collecting the
+    statistics negligible.
+
+    `score` is the search value of the chosen move for the player to move
+    (from the deepest completed iteration, or the proven value of a solved
+    endgame), or None if the move was not searched.
+    """
+
+    def __init__(self):
+        self.start = timeit.default_timer()
+        self.source = "search"
+        self.score = None
+        self.interior = 0
+        self.cutoffs = []
+        self.timeout = False
+        self.movegen_time = 0.
+        self.movegen_samples = 0
+        self.eval_time = 0.
+        self.eval_samples = 0
+
+    def moves(self, game):
+        """Return the legal moves of the active player, timing the call."""
+        start = timeit.default_timer()
+        actions = game.get_legal_moves()
+        self.movegen_time += timeit.default_timer() - start
+        self.movegen_samples += 1
+        return actions
+
+    def evaluate(self, score_fn, game, player):
+        """Return `score_fn(game, player)`, timing the call."""
+        start = timeit.default_timer()
+        value = score_fn(game, player)
+        self.eval_time += timeit.default_timer() - start
+        self.eval_samples += 1
+        return value
+
+    def cutoff(self, ply):
+        """Count a beta cutoff at `ply` plies below the root."""
+        cutoffs = self.cutoffs
+        while len(cutoffs) <= ply:
+            cutoffs.append(0)
+        cutoffs[ply] += 1
+
+    def record(self, move, nodes, depth, branching_factor=None):
+        """Return the statistics of the move as a JSON-serializable dict.
+
+        The effective branching factor is `nodes ** (1 / depth)` unless a
+        measured one (e.g., from `TimeManager`) is given.
+        """
+        if branching_factor is None and depth:
+            branching_factor = nodes ** (1. / depth)
+        movegen = (self.movegen_time / self.movegen_samples * nodes
+                   if self.movegen_samples else 0.)
+        leaves = nodes - self.interior
+        evaluation = (self.eval_time / self.eval_samples * leaves
+                      if self.eval_samples else 0.)
+        return OrderedDict([
+            ("move", list(move)),
+            ("source", self.source),
+            ("score", self.score),
+            ("nodes", nodes),
+            ("leaves", leaves),
+            ("depth", depth),
+            ("cutoffs", self.cutoffs),
+            ("branching_factor", branching_factor),
+            ("time", timeit.default_timer() - self.start),
+            ("movegen_time", movegen),
+            ("eval_time", evaluation),
+            ("timeout", self.timeout),
+        ])
+
+
 class IsolationPlayer:
     """Base class for minimax and alphabeta agents -- this class is never
     constructed or tested directly.
@@ -165,7 +499,38 @@ class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        If True, the search runs on a single `SearchBoard` using in-place
+        make/unmake of moves instead of copying the board at every node.
+
+    timer_interval : int (optional)
+        Number of nodes between checks of the turn timer; None (default)
+        calibrates the interval automatically (see `SearchTimer`)
+
+    move_cache : `move_cache.MoveCache` (optional)
+        Cache of the moves chosen by completed searches, shared across games;
+        a search that times out is not cached
+
+    Attributes
+    ----------
+    stats : `SearchStats`
+        Search statistics of the current (or last) call to `get_move()`
+
+    telemetry : list or None
+        If a list, the `SearchStats.record()` of every move is appended to it
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, timer_interval=None, move_cache=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.in_place = in_place
+        self.timer_interval = timer_interval
+        self.move_cache = move_cache
+        self.timer = None
+        self.stats = SearchStats()
+        self.telemetry = None
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -196,20 +561,40 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        self.timer = SearchTimer(time_left, self.TIMER_THRESHOLD,
+                                 self.timer_interval)
+        self.stats = SearchStats()
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         best_move = (-1, -1)
-
-        try:
-            # The try/except block will automatically catch the exception
-            # raised when the timer is about to expire.
-            return self.minimax(game, self.search_depth)
-
-        except SearchTimeout:
-            pass  # Handle any actions required after timeout as needed
+        depth = 0
+
+        cache_key = None
+        if self.move_cache is not None:
+            cache_key = self.move_cache.key(self, game, time_left())
+        move = None if cache_key is None else self.move_cache.get(
+            cache_key, game.height)
+        if move is not None:
+            self.stats.source = "cache"
+            best_move = move
+        else:
+            try:
+                # The try/except block will automatically catch the
+                # exception raised when the timer is about to expire.
+                best_move = self.minimax(game, self.search_depth)
+                depth = self.search_depth
+
+            except SearchTimeout:
+                self.stats.timeout = True
+
+            if cache_key is not None and not self.stats.timeout:
+                self.move_cache.put(cache_key, best_move, game.height)
 
         # Return the best move from the last completed search iteration
+        if self.telemetry is not None:
+            self.telemetry.append(self.stats.record(
+                best_move, self.timer.nodes, depth))
         return best_move
 
     def minimax(self, game, depth):
@@ -255,37 +640,62 @@ class MinimaxPlayer(IsolationPlayer):
             raise SearchTimeout()
 
         # TODO: finish this function!
+        if self.timer is None or self.timer.time_left is not self.time_left:
+            self.timer = SearchTimer(self.time_left, self.TIMER_THRESHOLD,
+                                     self.timer_interval)
+        if self.in_place and not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
         actions = game.get_legal_moves()
         player_best_move = (0,0)
         v = -float("INF")
         for a in actions:
-            temp_value = self.min_value(game.forecast_move(a), depth-1)
+            temp_value = self.min_value(_make_move(game, a), depth-1)
+            _unmake_move(game)
             if v < temp_value:
                 v = temp_value
                 player_best_move = a
+        self.stats.score = v
         return player_best_move
         raise NotImplementedError
 
     def max_value(self, game, depth):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
-        actions = game.get_legal_moves()
-        if depth <= 0 or not actions:
+        timer = self.timer
+        timer.tick()
+        # nodes where the timer was just read are sampled for timing
+        sample = timer.countdown == timer.interval
+        actions = None
+        if depth > 0:
+            actions = (self.stats.moves(game) if sample else
+                       game.get_legal_moves())
+        if not actions:
+            if sample:
+                return self.stats.evaluate(self.score, game, self)
             return self.score(game, self)
+        self.stats.interior += 1
         v = -float("INF")
         for a in actions:
-            v = max(v, self.min_value(game.forecast_move(a), depth-1))
+            v = max(v, self.min_value(_make_move(game, a), depth-1))
+            _unmake_move(game)
         return v
 
     def min_value(self, game, depth):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
-        actions = game.get_legal_moves()
-        if depth <= 0 or not actions:
+        timer = self.timer
+        timer.tick()
+        # nodes where the timer was just read are sampled for timing
+        sample = timer.countdown == timer.interval
+        actions = None
+        if depth > 0:
+            actions = (self.stats.moves(game) if sample else
+                       game.get_legal_moves())
+        if not actions:
+            if sample:
+                return self.stats.evaluate(self.score, game, self)
             return self.score(game, self)
+        self.stats.interior += 1
         v = float("INF")
         for a in actions:
-            v = min(v, self.max_value(game.forecast_move(a), depth-1))
+            v = min(v, self.max_value(_make_move(game, a), depth-1))
+            _unmake_move(game)
         return v
 
 
@@ -293,7 +703,158 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        If True, the search runs on a single `SearchBoard` using in-place
+        make/unmake of moves instead of copying the board at every node.
+
+    endgame : bool (optional)
+        If True, positions where the players can no longer reach each other
+        are solved exactly as two independent longest-path problems instead
+        of searched.
+
+    timer_interval : int (optional)
+        Number of nodes between checks of the turn timer; None (default)
+        calibrates the interval automatically (see `SearchTimer`)
+
+    time_management : bool (optional)
+        If True, iterative deepening stops early when the next iteration is
+        not predicted to finish in time (see `TimeManager`)
+
+    book : `opening_book.OpeningBook` (optional)
+        Opening book probed before searching; None disables the book
+
+    tt_size : int (optional)
+        Number of transposition table entries; 0 disables the table unless
+        `workers` or `ponder` is set, in which case a default size is used
+
+    workers : int (optional)
+        Number of helper processes for lazy SMP search.  The helpers run the
+        same iterative deepening search with varied move orders and share the
+        transposition table through shared memory, and the move from the
+        deepest iteration completed by any process is played.  Helper
+        processes cannot be started from daemonic processes, such as the
+        workers of a parallel tournament.
+
+    pvs : bool (optional)
+        If True, moves after the first at each node are first searched with
+        a null window (principal variation search)
+
+    aspiration : float (optional)
+        Half-width of the aspiration window centered on the score of the
+        previous iteration of iterative deepening; 0 searches every
+        iteration with a full window
+
+    leaf_model : `leaf_eval.LeafModel` or str (optional)
+        Learned evaluation (or the path of its weights file) used instead of
+        `score_fn` at the leaves.  All the children of a node at depth 1 are
+        scored together with one vectorized call of the model.
+
+    tablebase : `tablebase.Tablebase` or str (optional)
+        Endgame tablebase (or the path of its file) probed at the root and
+        at every node of the search once few enough cells are open; covered
+        positions are played and scored exactly without searching.
+
+    ponder : bool (optional)
+        If True, a background process keeps searching after each move is
+        returned, on the positions after each opponent reply (the reply
+        predicted by the transposition table first), and fills the shared
+        transposition table.  The next call to `get_move()` cancels it, and
+        plays its move if it searched the actual position deeper than the
+        main search.  Like `workers`, pondering needs a non-daemonic process.
+
+    ponder_budget : float (optional)
+        Largest fraction of one CPU used by the pondering process, which also
+        runs at the lowest scheduling priority, so that it only takes CPU
+        time the opponent leaves idle
+
+    lmr : bool (optional)
+        If True, moves after the first `LMR_MOVES` at nodes at least
+        `LMR_DEPTH` plies from the frontier are first searched one ply
+        shallower with a null window (late move reductions), and searched
+        again at full depth if they beat alpha.  The moves after the
+        transposition table move are then ordered by the number of replies
+        they leave the mover, most first.
+
+    futility : bool (optional)
+        If True, a node one ply from the frontier is not expanded when its
+        static score plus `futility_margin` cannot reach alpha (futility
+        pruning)
+
+    futility_margin : float (optional)
+        Largest gain over the static score expected from one move, in the
+        units of `score_fn`
+
+    Attributes
+    ----------
+    stats : `SearchStats`
+        Search statistics of the current (or last) call to `get_move()`
+
+    telemetry : list or None
+        If a list, the `SearchStats.record()` of every move is appended to it
+
+    ponder_depth : int
+        Depth to which the current (or last) root position was searched while
+        pondering, or 0 if it was not
+
+    reductions, reduction_researches, futility_prunes : int
+        Number of late move reductions, of reduced moves searched again at
+        full depth, and of nodes pruned as futile
     """
+    DEFAULT_TT_SIZE = 1 << 20
+    NULL_WINDOW = 1e-6
+    LMR_MOVES = 3
+    LMR_DEPTH = 3
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, endgame=True, timer_interval=None,
+                 time_management=True, book=default_book, tt_size=0,
+                 workers=0, pvs=True, aspiration=5., leaf_model=None,
+                 tablebase=None, ponder=False, ponder_budget=.5, lmr=False,
+                 futility=False, futility_margin=3.):
+        super().__init__(search_depth, score_fn, timeout)
+        self.in_place = in_place
+        self.endgame = endgame
+        self.book = book
+        self.timer_interval = timer_interval
+        self.time_management = time_management
+        self.tt_size = tt_size
+        self.workers = workers
+        self.pvs = pvs
+        self.aspiration = aspiration
+        if isinstance(leaf_model, str):
+            from leaf_eval import LeafModel
+            leaf_model = LeafModel.load(leaf_model)
+        self.leaf_model = leaf_model
+        if isinstance(tablebase, str):
+            from tablebase import Tablebase
+            tablebase = Tablebase(tablebase)
+        self.tablebase = tablebase
+        self.ponder = ponder
+        self.ponder_budget = ponder_budget
+        self.ponder_depth = 0
+        self.lmr = lmr
+        self.futility = futility
+        self.futility_margin = futility_margin
+        self.researches = 0
+        self.aspiration_failures = 0
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.futility_prunes = 0
+        self.timer = None
+        self.time_manager = None
+        self.completed_depth = 0
+        self.stats = SearchStats()
+        self.telemetry = None
+        self.tt = None
+        self._endgame_solver = None
+        self._depth_cutoff = False
+        self._rotation = 0
+        self._root_depth = 0
+        self._helpers = None
+        self._ponder = None
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -326,27 +887,281 @@ class AlphaBetaPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
-
-
+        self.timer = SearchTimer(time_left, self.TIMER_THRESHOLD,
+                                 self.timer_interval)
+        self.time_manager = TimeManager(time_left, self.TIMER_THRESHOLD)
+        self.completed_depth = 0
+        self.stats = SearchStats()
+
+        # daemonic processes cannot start the pondering process; this is
+        # decided per move, as the player may be used in another process
+        ponder = self.ponder and not multiprocessing.current_process().daemon
+        if self.ponder and not ponder:
+            warnings.warn("pondering is disabled in daemonic processes")
+        if self.tt is None and (self.tt_size or self.workers or self.ponder):
+            self.tt = TranspositionTable(self.tt_size or self.DEFAULT_TT_SIZE,
+                                         shared=bool(self.workers or
+                                                     self.ponder))
+        if self._uses_search_board():
+            game = SearchBoard.from_board(game)
+        pondered = self._stop_pondering(game)
 
         # TODO: finish this function!
-        best_move = (-1, -1)
-
-        if not game.get_legal_moves():
-            return best_move
-
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            return self._finish((-1, -1), "none")
+        best_move = legal_moves[0]
+
+        if self.book is not None:
+            move = self.book.probe(game)
+            if move is not None:
+                return self._finish(move, "book")
+
+        if self.tablebase is not None:
+            result = self.tablebase.best_move(game)
+            if result is not None:
+                self.stats.score = (float("inf") if result[1] % 2 else
+                                    float("-inf"))
+                return self._finish(result[0], "tablebase")
+
+        plies = game.move_count
+        job = None
         try:
-            depth = 1
+            if self.endgame:
+                result = self.solve_endgame(game)
+                if result is not None:
+                    self.stats.score = result[1]
+                    return self._finish(result[0], "endgame")
+
+            if self.workers:
+                job = self._start_helpers(game, time_left)
+
+            # Deepen until the timer expires, or until an iteration completes
+            # without reaching the depth limit at any node -- the result is
+            # then exact and searching deeper cannot change it
+            depth, score = 1, None
             while True:
-                best_move = self.alphabeta(game, depth)
+                self._depth_cutoff = False
+                self.time_manager.start_iteration(self.timer.nodes)
+                best_move, score = self.aspiration_search(game, depth, score)
+                self.completed_depth = depth
+                self.stats.score = score
                 depth += 1
-                if best_move == (-1, -1):
+                if best_move == (-1, -1) or not self._depth_cutoff:
+                    break
+                if (self.time_management and
+                        not self.time_manager.end_iteration(self.timer.nodes)):
                     break
         except SearchTimeout:
-            return best_move
+            self.stats.timeout = True
+            # an abandoned search leaves its moves applied to an in-place
+            # board, which pondering starts from
+            while game.move_count > plies:
+                game.pop_move()
+
+        # the endgame solver can time out before the helpers are started
+        if job is not None:
+            best_move = self._collect_helpers(job, best_move, legal_moves)
+        if (pondered is not None and pondered[0] > self.completed_depth and
+                pondered[1] in legal_moves):
+            best_move = pondered[1]
+        if ponder:
+            self._start_pondering(game, best_move)
+        return self._finish(best_move)
+        raise NotImplementedError
 
+    def _finish(self, move, source="search"):
+        """Record the statistics of the move in `telemetry` and return it."""
+        if self.telemetry is not None:
+            self.stats.source = source
+            self.telemetry.append(self.stats.record(
+                move, self.timer.nodes, self.completed_depth,
+                self.time_manager.branching_factor))
+        return move
+
+    def _spawn_helpers(self):
+        """Start the lazy SMP helper processes and the pondering process,
+        which share the transposition table and a cancellation flag.
+        """
+        ctx = multiprocessing.get_context()
+        current = ctx.Value("i", -1, lock=False)
+        results = ctx.Queue()
+        helpers = []
+        for worker_id in range(1, self.workers + 1):
+            jobs = ctx.Queue()
+            process = ctx.Process(target=_lazy_smp_helper, args=(
+                self.score, self.leaf_model, self.TIMER_THRESHOLD,
+                self.tt.name, self.tt.size, jobs, results, current,
+                worker_id), daemon=True)
+            process.start()
+            helpers.append((process, jobs))
+        processes = list(helpers)
+        if self.ponder:
+            jobs = ctx.Queue()
+            ponder_results = ctx.Queue()
+            process = ctx.Process(target=_ponder_helper, args=(
+                self.score, self.leaf_model, self.TIMER_THRESHOLD,
+                self.tt.name, self.tt.size, jobs, ponder_results, current,
+                self.ponder_budget), daemon=True)
+            process.start()
+            processes.append((process, jobs))
+            self._ponder = (jobs, ponder_results, None)
+        self._helpers = (helpers, results, current)
+        self._job = 0
+        self._finalizer = weakref.finalize(self, _stop_helpers, processes,
+                                           self.tt)
+
+    def _start_helpers(self, game, time_left):
+        """Send the lazy SMP helper processes the position to search until
+        the turn deadline.  Returns the job id.
+        """
+        if self._helpers is None:
+            self._spawn_helpers()
+        helpers, results, current = self._helpers
+        self._job += 1
+        current.value = self._job
+        deadline = time.monotonic() + time_left() / 1000.
+        job = (self._job, game.get_state(), game.width, game.height,
+               deadline)
+        for _, jobs in helpers:
+            jobs.put(job)
+        return self._job
+
+    def _collect_helpers(self, job, best_move, legal_moves):
+        """Cancel the helpers' search and return the move from the deepest
+        iteration completed by this process or any helper.
+        """
+        helpers, results, current = self._helpers
+        current.value = -1
+        best_depth = self.completed_depth
+        for depth, move in self._job_results(results, job, len(helpers)):
+            if depth > best_depth and move in legal_moves:
+                best_depth, best_move = depth, move
         return best_move
-        raise NotImplementedError
+
+    def _job_results(self, results, job, count, wait=HELPER_WAIT):
+        """Return the results reported for the cancelled `job` by `count`
+        helper processes, without the job id.
+
+        A result put by a helper can still be in the feeder thread of its
+        queue, so the results are read until every helper has sent its
+        end-of-job marker (a result whose other fields are None), for as
+        long as the move has time left (and at most `wait` seconds).
+        Results left over from earlier jobs are skipped.
+        """
+        collected = []
+        deadline = time.monotonic() + min(wait, (
+            self.time_left() - self.TIMER_THRESHOLD / 2.) / 1000.)
+        while count:
+            try:
+                result = results.get(
+                    timeout=max(0., deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if result[0] != job:
+                continue
+            if result[1] is None:
+                count -= 1
+            else:
+                collected.append(result[1:])
+        return collected
+
+    def _start_pondering(self, game, move):
+        """Send the pondering process the positions after `move` and each
+        opponent reply, the reply predicted by the transposition table first.
+        """
+        if move == (-1, -1):
+            return
+        if self._helpers is None:
+            self._spawn_helpers()
+        current = self._helpers[2]
+        jobs, results, _ = self._ponder
+        game.push_move(move)
+        replies = game.get_legal_moves()
+        entry = self.tt.probe(game.key)
+        if entry is not None and entry[2] != NO_MOVE:
+            predicted = (entry[2] % game.height, entry[2] // game.height)
+            if predicted in replies:
+                replies.remove(predicted)
+                replies.insert(0, predicted)
+        states = []
+        for reply in replies:
+            game.push_move(reply)
+            states.append(game.get_state())
+            game.pop_move()
+        game.pop_move()
+        if not states:
+            return
+        self._job += 1
+        current.value = self._job
+        jobs.put((self._job, states, game.width, game.height))
+        self._ponder = (jobs, results, self._job)
+
+    def _stop_pondering(self, game):
+        """Cancel the pondering process, and return (depth, move) of the
+        deepest iteration it completed on the position of `game`, or None.
+        """
+        self.ponder_depth = 0
+        if self._ponder is None or self._ponder[2] is None:
+            return None
+        jobs, results, job = self._ponder
+        self._helpers[2].value = -1
+        self._ponder = (jobs, results, None)
+        state = game.get_state()
+        best = None
+        # the search of the real position should not wait for the pondering
+        # process to notice the cancellation
+        for result_state, depth, move in self._job_results(results, job, 1,
+                                                           PONDER_WAIT):
+            if result_state == state and (best is None or depth > best[0]):
+                best = (depth, move)
+        if best is not None:
+            self.ponder_depth = best[0]
+        return best
+
+    def close(self):
+        """Stop the lazy SMP helper and pondering processes and release the
+        shared transposition table.
+        """
+        if self._helpers is not None:
+            self._finalizer()
+            self._helpers = None
+            self._ponder = None
+            self.tt = None
+        elif self.tt is not None and self.tt.name is not None:
+            # a shared table whose helpers were never started, e.g., when
+            # pondering was skipped in a daemonic process
+            self.tt.close(unlink=True)
+            self.tt = None
+
+    def solve_endgame(self, game):
+        """Solve the position exactly if the players are partitioned.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            The current game state
+
+        Returns
+        -------
+        ((int, int), float) or None
+            The best move and its proven value (+inf for a win and -inf for
+            a loss) for the active player, or None if the players can still
+            reach each other
+        """
+        if not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        solver = self._endgame_solver
+        if solver is None or (solver.width, solver.height) != (game.width,
+                                                               game.height):
+            solver = LongestPathSolver(game.width, game.height,
+                                       check=self._check_timer)
+            self._endgame_solver = solver
+        return solver.solve(game)
+
+    def _check_timer(self):
+        if self.time_left() < self.TIMER_THRESHOLD:
+            raise SearchTimeout()
 
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
         """Implement depth-limited minimax search with alpha-beta pruning as
@@ -397,44 +1212,415 @@ class AlphaBetaPlayer(IsolationPlayer):
             raise SearchTimeout()
 
         # TODO: finish this function!
-        actions = game.get_legal_moves()
-        player_best_move = (-1,-1)
-        v = -float("INF")
-        for a in actions:
-            temp_value = self.min_value(game.forecast_move(a), depth-1, alpha, beta)
-            if v < temp_value:
-                v = temp_value
-                player_best_move = a
-            if v >= beta:
-                return a
-            alpha = max(alpha, v)
-
-        return player_best_move
+        return self.search(game, depth, alpha, beta)[0]
         raise NotImplementedError
-    def max_value(self, game, depth, alpha, beta):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+
+    def search(self, game, depth, alpha=float("-inf"), beta=float("inf")):
+        """Depth-limited negamax search with alpha-beta pruning and principal
+        variation search.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            The current game state
+
+        depth : int
+            Maximum number of plies to search
+
+        alpha, beta : float
+            Search window, in scores to the active player
+
+        Returns
+        -------
+        ((int, int), float)
+            The best move ((-1, -1) if there are no legal moves) and its score
+            to the active player.  A score <= alpha is only an upper bound,
+            and a score >= beta only a lower bound, on the true value.
+        """
+        if self.timer is None or self.timer.time_left is not self.time_left:
+            self.timer = SearchTimer(self.time_left, self.TIMER_THRESHOLD,
+                                     self.timer_interval)
+        if self._uses_search_board() and not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        color = 1 if game.active_player == self else -1
+        self._root_depth = depth
         actions = game.get_legal_moves()
-        if depth <= 0 or not actions:
-            return self.score(game, self)
-        v = -float("INF")
+        if not actions:
+            return (-1, -1), color * self.score(game, self)
+        move, v = self._search_moves(game, actions, depth, alpha, beta, color)
+        if self.tt is not None:
+            self._store(game, depth, alpha, beta, v, move)
+        return move, v
+
+    def aspiration_search(self, game, depth, guess=None):
+        """Search to `depth` with a window of +/- `aspiration` around `guess`,
+        the score of the previous iteration, and search again with the
+        failing side of the window opened if the score falls outside it.
+
+        Returns (move, score) as `search()` does, with an exact score.
+        """
+        inf = float("inf")
+        if not self.aspiration or guess is None or abs(guess) == inf:
+            return self.search(game, depth)
+        alpha, beta = guess - self.aspiration, guess + self.aspiration
+        while True:
+            move, score = self.search(game, depth, alpha, beta)
+            if score <= alpha and alpha != -inf:
+                alpha = -inf
+            elif score >= beta and beta != inf:
+                beta = inf
+            else:
+                return move, score
+            self.aspiration_failures += 1
+
+    def search_top(self, game, depth, top=1, actions=None):
+        """Depth-limited search that ranks the root moves and scores the best
+        `top` of them exactly (multi-PV search).
+
+        The first `top` moves are searched with a full window; each later
+        move is first tested with a null window against the `top`-th best
+        score so far, and searched again only if it beats it.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            The current game state
+
+        depth : int
+            Maximum number of plies to search
+
+        top : int (optional)
+            Number of moves to score exactly
+
+        actions : list (optional)
+            The legal moves in the order to search them (e.g., the ranking
+            of the previous iteration of iterative deepening)
+
+        Returns
+        -------
+        list
+            (move, score) pairs of every legal move, best first, in scores to
+            the active player.  The first `top` scores are exact; the others
+            are upper bounds.
+        """
+        if self.timer is None or self.timer.time_left is not self.time_left:
+            self.timer = SearchTimer(self.time_left, self.TIMER_THRESHOLD,
+                                     self.timer_interval)
+        if self._uses_search_board() and not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        color = 1 if game.active_player == self else -1
+        self._root_depth = depth
+        if actions is None:
+            actions = self._order_moves(game, game.get_legal_moves())
+        inf = float("inf")
+        ranking = []
         for a in actions:
-            v = max(v, self.min_value(game.forecast_move(a), depth-1, alpha, beta))
+            child = _make_move(game, a)
+            alpha = ranking[top - 1][1] if len(ranking) >= top else -inf
+            if abs(alpha) == inf:
+                score = -self._negamax(child, depth-1, -inf, inf, -color)
+            else:
+                score = -self._negamax(child, depth-1, -alpha-self.NULL_WINDOW,
+                                       -alpha, -color)
+                if score > alpha:
+                    score = -self._negamax(child, depth-1, -inf, -alpha,
+                                           -color)
+            _unmake_move(game)
+            ranking.append((a, score))
+            ranking.sort(key=lambda item: -item[1])
+        if self.tt is not None and ranking:
+            self._store(game, depth, -inf, inf, ranking[0][1], ranking[0][0])
+        return ranking
+
+    def _uses_search_board(self):
+        return (self.in_place or self.tt is not None or
+                self.leaf_model is not None or self.tablebase is not None)
+
+    def _search_frontier(self, game, actions, color):
+        """Score every child of a node at depth 1 with one batched call of
+        the leaf model and return (best move, value to the active player).
+        """
+        timer = self.timer
+        for _ in actions:
+            timer.tick()
+        values = self.leaf_model.score_children(game, actions, self)
+        best_move, v = actions[0], float("-inf")
+        for a, value in zip(actions, values):
+            if abs(value) != float("inf"):
+                self._depth_cutoff = True
+            if color * value > v:
+                v, best_move = color * value, a
+        return best_move, v
+
+    def _order_moves(self, game, actions):
+        """Rotate the moves by the helper's offset (lazy SMP helpers search
+        in varied orders) and try the transposition table move first.
+        """
+        if self._rotation and actions:
+            k = self._rotation % len(actions)
+            actions = actions[k:] + actions[:k]
+        if self.tt is not None:
+            entry = self.tt.probe(game.key)
+            if entry is not None and entry[2] != NO_MOVE:
+                move = (entry[2] % game.height, entry[2] // game.height)
+                if move in actions:
+                    actions.remove(move)
+                    actions.insert(0, move)
+        return actions
+
+    def _probe(self, game, depth, alpha, beta):
+        """Look up the position in the transposition table.
+
+        Returns (value, alpha, beta, move) where value is not None if the
+        stored bound cuts off the search, alpha and beta are narrowed by the
+        stored bound, and move is the stored best move or None.
+        """
+        entry = self.tt.probe(game.key)
+        if entry is None:
+            return None, alpha, beta, None
+        stored_depth, flag, move, score = entry
+        move = None if move == NO_MOVE else (move % game.height,
+                                             move // game.height)
+        if stored_depth >= depth:
+            if abs(score) != float("inf"):
+                # the stored result came from a depth-limited search
+                self._depth_cutoff = True
+            if flag == EXACT:
+                return score, alpha, beta, move
+            elif flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, alpha, beta, move
+        return None, alpha, beta, move
+
+    def _store(self, game, depth, alpha, beta, value, move):
+        """Store a search result, with its bound type relative to the
+        original (alpha, beta) window, in the transposition table.
+        """
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(game.key, depth, flag, value,
+                      move[0] + move[1] * game.height)
+
+    def _negamax(self, game, depth, alpha, beta, color):
+        """Return the negamax value of `game` to the active player, whose
+        score is `color` times the score to this player.
+        """
+        timer = self.timer
+        timer.tick()
+        # nodes where the timer was just read are sampled for timing
+        sample = timer.countdown == timer.interval
+        if self.tablebase is not None:
+            plies = self.tablebase.probe(game)
+            if plies is not None:
+                return float("inf") if plies % 2 else float("-inf")
+        if depth == 1 and self.futility and alpha != float("-inf"):
+            static = color * self.score(game, self)
+            if static + self.futility_margin <= alpha:
+                self.futility_prunes += 1
+                self._depth_cutoff = True
+                return static + self.futility_margin
+        if depth > 0:
+            actions = (self.stats.moves(game) if sample else
+                       game.get_legal_moves())
+        else:
+            # a leaf needs no move list, only whether it is terminal, which
+            # is O(1) on a `SearchBoard`
+            actions = None
+            if mobility(game, game.active_player):
+                self._depth_cutoff = True
+        if not actions:
+            if sample:
+                return color * self.stats.evaluate(self.score, game, self)
+            return color * self.score(game, self)
+        self.stats.interior += 1
+        alpha_orig, beta_orig = alpha, beta
+        if self.tt is not None:
+            value, alpha, beta, _ = self._probe(game, depth, alpha, beta)
+            if value is not None:
+                return value
+        move, v = self._search_moves(game, actions, depth, alpha, beta, color)
+        if self.tt is not None:
+            self._store(game, depth, alpha_orig, beta_orig, v, move)
+        return v
+
+    def _search_moves(self, game, actions, depth, alpha, beta, color):
+        """Search `actions` from `game` with principal variation search and
+        return (best move, fail-soft value to the active player).
+
+        The first move is searched with the full window; the others are
+        first probed with a null window that only tests whether they beat
+        alpha, and searched again with the full window if they do.
+        """
+        if depth == 1 and self.leaf_model is not None:
+            return self._search_frontier(game, actions, color)
+        actions = self._order_moves(game, actions)
+        reduce = self.lmr and depth >= self.LMR_DEPTH
+        if reduce:
+            actions = self._order_late_moves(game, actions)
+        best_move, v = actions[0], float("-inf")
+        for i, a in enumerate(actions):
+            child = _make_move(game, a)
+            score = None
+            if reduce and i >= self.LMR_MOVES and alpha != float("-inf"):
+                self.reductions += 1
+                score = -self._negamax(child, depth-2, -alpha-self.NULL_WINDOW,
+                                       -alpha, -color)
+                if score > alpha:
+                    self.reduction_researches += 1
+                    score = None
+            if score is None and i and self.pvs and alpha != float("-inf"):
+                score = -self._negamax(child, depth-1, -alpha-self.NULL_WINDOW,
+                                       -alpha, -color)
+                if alpha < score < beta:
+                    self.researches += 1
+                    score = -self._negamax(child, depth-1, -beta, -alpha,
+                                           -color)
+            elif score is None:
+                score = -self._negamax(child, depth-1, -beta, -alpha, -color)
+            _unmake_move(game)
+            if score > v:
+                v, best_move = score, a
             if v >= beta:
-                return v
+                self.stats.cutoff(self._root_depth - depth)
+                break
             alpha = max(alpha, v)
-        return v
+        return best_move, v
 
-    def min_value(self, game, depth, alpha, beta):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
-        actions = game.get_legal_moves()
-        if depth <= 0 or not actions:
-            return self.score(game, self)
-        v = float("INF")
-        for a in actions:
-            v = min(v, self.max_value(game.forecast_move(a), depth-1, alpha, beta))
-            if v <= alpha:
-                return v
-            beta = min(beta, v)
-        return v
+    def _order_late_moves(self, game, actions):
+        """Order the moves after the first by the number of replies they
+        leave the mover, most first, so that late move reductions apply to
+        the least promising moves.
+        """
+        player = game.active_player
+        replies = []
+        for a in actions[1:]:
+            replies.append(mobility(_make_move(game, a), player))
+            _unmake_move(game)
+        order = sorted(range(len(replies)), key=lambda i: -replies[i])
+        return actions[:1] + [actions[i + 1] for i in order]
+
+
+def _lazy_smp_helper(score_fn, leaf_model, timeout, tt_name, tt_size, jobs,
+                     results, current, worker_id):
+    """Main loop of a lazy SMP helper process.
+
+    Each job is a position and a deadline; the helper runs iterative
+    deepening on it with the shared transposition table, reports every
+    completed iteration as (job, depth, move), and abandons the job as soon
+    as the main process moves on to another job.  The end of every job is
+    reported as (job, None, None).
+    """
+    player = AlphaBetaPlayer(score_fn=score_fn, timeout=timeout,
+                             in_place=True, endgame=False, book=None,
+                             time_management=False, leaf_model=leaf_model)
+    player.tt = TranspositionTable(tt_size, name=tt_name)
+    player._rotation = worker_id
+    opponent = object()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, state, width, height, deadline = job
+        board = SearchBoard.from_state(player, opponent, state, width, height)
+
+        def time_left():
+            if current.value != job_id:
+                return float("-inf")
+            return 1000 * (deadline - time.monotonic())
+
+        player.time_left = time_left
+        player.timer = SearchTimer(time_left, player.TIMER_THRESHOLD)
+        # odd helpers start one ply deeper to spread the work over depths
+        depth, score = 1 + worker_id % 2, None
+        try:
+            while True:
+                player._depth_cutoff = False
+                move, score = player.aspiration_search(board, depth, score)
+                results.put((job_id, depth, move))
+                if not player._depth_cutoff:
+                    break
+                depth += 1
+        except SearchTimeout:
+            pass
+        results.put((job_id, None, None))
+    player.tt.close()
+
+
+def _ponder_helper(score_fn, leaf_model, timeout, tt_name, tt_size, jobs,
+                   results, current, budget):
+    """Main loop of the pondering process.
+
+    Each job is the list of positions after each opponent reply, the
+    predicted reply first.  The positions are deepened together, the first
+    one `PONDER_LEAD` plies ahead of the others, with the shared
+    transposition table; every completed iteration is reported as (job,
+    position, depth, move), and the job is abandoned as soon as the main
+    process cancels it; its end is reported as (job, None, None, None).
+    The process sleeps as needed to keep its CPU time below `budget` times
+    the elapsed time.
+    """
+    if hasattr(os, "nice"):
+        os.nice(19)
+    player = AlphaBetaPlayer(score_fn=score_fn, timeout=timeout,
+                             in_place=True, endgame=False, book=None,
+                             time_management=False, leaf_model=leaf_model)
+    player.tt = TranspositionTable(tt_size, name=tt_name)
+    opponent = object()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, states, width, height = job
+        start, cpu_start = time.monotonic(), time.process_time()
+
+        def time_left():
+            if current.value != job_id:
+                return float("-inf")
+            excess = ((time.process_time() - cpu_start) / budget -
+                      (time.monotonic() - start))
+            if excess > 0:
+                time.sleep(excess)
+            # no deadline: the timer only serves to cancel the search
+            return 1e9 - 1000 * (time.monotonic() - start)
+
+        player.time_left = time_left
+        player.timer = SearchTimer(time_left, player.TIMER_THRESHOLD)
+        boards = [SearchBoard.from_state(player, opponent, state, width,
+                                         height) for state in states]
+        scores = [None] * len(boards)
+        exact = [False] * len(boards)
+        depth = 1
+        try:
+            while not all(exact):
+                for i, board in enumerate(boards):
+                    if exact[i]:
+                        continue
+                    d = depth + PONDER_LEAD if i == 0 else depth
+                    player._depth_cutoff = False
+                    move, scores[i] = player.aspiration_search(board, d,
+                                                               scores[i])
+                    results.put((job_id, states[i], d, move))
+                    exact[i] = not player._depth_cutoff
+                depth += 1
+        except SearchTimeout:
+            pass
+        results.put((job_id, None, None, None))
+    player.tt.close()
+
+
+def _stop_helpers(helpers, tt):
+    """Stop the lazy SMP helper processes and destroy the shared table."""
+    for _, jobs in helpers:
+        jobs.put(None)
+    for process, _ in helpers:
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+    tt.close(unlink=True)
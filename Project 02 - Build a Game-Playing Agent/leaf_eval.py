@@ -0,0 +1,201 @@
+"""Learned leaf evaluation over board features, scored in batches with NumPy.
+
+A `LeafModel` is a linear model or a small multi-layer perceptron over the
+features in `FEATURES`, computed for a player by `leaf_features()`.  Calling a
+model once per leaf costs a Python call and a NumPy call per leaf, so
+`AlphaBetaPlayer` (with `leaf_model` set) instead scores all the children of
+each frontier node with one call of `LeafModel.score_children()`.
+
+The weights are stored in a `.npz` file holding the feature names and the
+arrays `W0, b0, W1, b1, ...` of each layer; hidden layers use ReLU and the
+last layer has a single output.  To write a linear model with hand-set
+weights as a starting point for fitting:
+
+    python leaf_eval.py --init weights.npz
+"""
+import argparse
+
+import numpy as np
+
+from endgame import flood_fill
+from search_board import SearchBoard, board_tables, center_distances
+
+FEATURES = ["own_moves", "opp_moves", "own_reach", "opp_reach",
+            "own_center", "opp_center", "partitioned", "region_diff"]
+
+# Weights of the linear model written by --init: mobility as in
+# improved_score, plus smaller terms for second-order mobility and the
+# region difference once the players are partitioned
+INITIAL_WEIGHTS = [1., -1., .25, -.25, 0., 0., 0., 1.]
+
+
+def _reach(loc, open_cells, masks):
+    """Return the bitmasks of the open cells one move and up to two moves
+    away from cell `loc` (every open cell for a player that has not moved).
+    """
+    if loc is None:
+        return open_cells, open_cells
+    first = masks[loc] & open_cells
+    second = first
+    legal = first
+    while legal:
+        low = legal & -legal
+        second |= masks[low.bit_length() - 1]
+        legal ^= low
+    return first, second & open_cells
+
+
+def leaf_features(board, player):
+    """Return the feature vector of `board` for `player` as a list.
+
+    The features are the number of legal moves of each player, the number of
+    cells each player can reach in up to two moves, the Manhattan distance
+    of each player from the center (as in `game_agent.custom_score_3`),
+    whether the players are partitioned, and the difference of the sizes of
+    their regions if they are.
+
+    A player that has not moved yet can reach every open cell and is
+    counted as being at the center.
+
+    Parameters
+    ----------
+    board : `SearchBoard`
+        The position to describe
+    """
+    masks = board_tables(board.width, board.height)[2]
+    open_cells = board.open_cells
+    own_loc = board.get_player_index(player)
+    opp_loc = board.get_player_index(board.get_opponent(player))
+    own_moves, own_reach = _reach(own_loc, open_cells, masks)
+    opp_moves, opp_reach = _reach(opp_loc, open_cells, masks)
+    partitioned = 0.
+    region_diff = 0.
+    # players whose two-move reaches overlap cannot be partitioned, which
+    # saves the flood fills at most nodes
+    if own_loc is not None and opp_loc is not None and not (
+            own_reach & opp_reach):
+        own_region = flood_fill(own_loc, open_cells, masks)
+        opp_region = flood_fill(opp_loc, open_cells, masks)
+        if not own_region & opp_region:
+            partitioned = 1.
+            region_diff = float(bin(own_region).count("1") -
+                                bin(opp_region).count("1"))
+    centers = center_distances(board.width, board.height)
+    return [bin(own_moves).count("1"), bin(opp_moves).count("1"),
+            bin(own_reach).count("1"), bin(opp_reach).count("1"),
+            0. if own_loc is None else centers[own_loc][1],
+            0. if opp_loc is None else centers[opp_loc][1],
+            partitioned, region_diff]
+
+
+class LeafModel:
+    """Linear model or multi-layer perceptron scoring feature vectors.
+
+    Parameters
+    ----------
+    layers : list
+        (weights, bias) pairs of each layer, where the weights are an
+        (inputs, outputs) array; the first layer has one input per feature in
+        `FEATURES`, and the last layer has a single output
+    """
+
+    def __init__(self, layers):
+        self.layers = [(np.asarray(w, dtype=float),
+                        np.asarray(b, dtype=float).reshape(-1))
+                       for w, b in layers]
+        if self.layers[0][0].shape[0] != len(FEATURES):
+            raise ValueError("the first layer must have {} inputs".format(
+                len(FEATURES)))
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved by `save()`."""
+        with np.load(path) as data:
+            names = [str(name) for name in data["features"]]
+            if names != FEATURES:
+                raise ValueError("{} was fitted on features {}".format(
+                    path, names))
+            layers = []
+            while "W{}".format(len(layers)) in data:
+                i = len(layers)
+                layers.append((data["W{}".format(i)],
+                               data["b{}".format(i)]))
+        return cls(layers)
+
+    def save(self, path):
+        """Save the feature names and the weights to a `.npz` file."""
+        arrays = {"features": np.array(FEATURES)}
+        for i, (w, b) in enumerate(self.layers):
+            arrays["W{}".format(i)] = w
+            arrays["b{}".format(i)] = b
+        np.savez(path, **arrays)
+
+    def predict(self, features):
+        """Score each row of a feature matrix with one pass of the model."""
+        x = np.asarray(features, dtype=float)
+        last = len(self.layers) - 1
+        for i, (w, b) in enumerate(self.layers):
+            x = x.dot(w) + b
+            if i < last:
+                np.maximum(x, 0., out=x)
+        return x[:, 0]
+
+    def score(self, game, player):
+        """Score a single position; usable as the `score_fn` of any agent.
+        """
+        if game.is_loser(player):
+            return float("-inf")
+        if game.is_winner(player):
+            return float("inf")
+        if not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        return float(self.predict([leaf_features(game, player)])[0])
+
+    def score_children(self, board, moves, player):
+        """Score the position after each move in `moves` for `player` with a
+        single call of the model.
+
+        Parameters
+        ----------
+        board : `SearchBoard`
+            The parent position, restored before returning
+
+        Returns
+        -------
+        list
+            The score of each child; +inf or -inf for children where the
+            player to move has no legal moves
+        """
+        values = []
+        rows = []
+        for move in moves:
+            board.push_move(move)
+            if board.mobility(board.active_player):
+                values.append(None)
+                rows.append(leaf_features(board, player))
+            elif board.active_player == player:
+                values.append(float("-inf"))
+            else:
+                values.append(float("inf"))
+            board.pop_move()
+        if rows:
+            scores = iter(self.predict(rows).tolist())
+            values = [next(scores) if value is None else value
+                      for value in values]
+        return values
+
+
+def initial_model():
+    """Return the linear model with the hand-set `INITIAL_WEIGHTS`."""
+    return LeafModel([(np.array(INITIAL_WEIGHTS).reshape(-1, 1),
+                       np.zeros(1))])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a leaf evaluation " +
+        "model file.")
+    parser.add_argument('--init', required=True,
+                        help="Path of the .npz file to write the initial " +
+                        "linear model to.")
+    args = parser.parse_args()
+    initial_model().save(args.init)
@@ -0,0 +1,158 @@
+"""Cross-game move cache for deterministic agents.
+
+A fixed-depth `MinimaxPlayer` always chooses the same move in the same
+position once its search completes, and the "fair" matches of a tournament
+start every game of a round from the same opening, so the same searches are
+repeated many times.  A `MoveCache` stores the moves of completed searches by
+
+    (agent configuration hash, position, time budget class)
+
+and returns them instead of searching again.  Only agents whose move is a
+function of the position are cached; time-limited iterative deepening agents
+are not.
+
+The cache is bounded, evicting the least recently used entries, and persists
+in an append-only text file: every new entry is appended as one line as soon
+as it is stored, so that the entries of concurrent worker processes are all
+kept, and `compact()` rewrites the file with the most recent entries.
+"""
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+from functools import partial
+
+from search_board import SearchBoard
+
+
+def _callable_id(fn):
+    """Return a description of a score function that is stable across
+    processes, or None if there is none.
+    """
+    if isinstance(fn, partial):
+        base = _callable_id(fn.func)
+        if base is None:
+            return None
+        return [base, repr(fn.args), repr(sorted(fn.keywords.items()))]
+    module = getattr(fn, "__module__", None)
+    name = getattr(fn, "__qualname__", None)
+    if module is None or name is None or "<" in name:
+        # lambdas, closures and bound methods of stateful objects
+        return None
+    return "{}.{}".format(module, name)
+
+
+def config_hash(player):
+    """Return a hash of the class, search depth and score function of
+    `player`, or None if the score function cannot be identified.
+    """
+    score = _callable_id(player.score)
+    if score is None:
+        return None
+    config = [type(player).__name__, player.search_depth, score]
+    return hashlib.sha1(json.dumps(config).encode()).hexdigest()[:16]
+
+
+def budget_class(time_left):
+    """Return the class of a time budget in milliseconds; budgets within a
+    factor of two of each other share a class.
+    """
+    return max(int(time_left), 0).bit_length()
+
+
+def position_key(game):
+    """Return an exact key of the position of `game` for the player to move.
+    """
+    if not isinstance(game, SearchBoard):
+        game = SearchBoard.from_board(game)
+    blocked, own, opp = game.get_state()
+    return "{}x{}:{:x}:{}:{}".format(
+        game.width, game.height, blocked,
+        -1 if own is None else own, -1 if opp is None else opp)
+
+
+class MoveCache:
+    """Bounded least-recently-used move cache persisted to a file.
+
+    Parameters
+    ----------
+    path : str (optional)
+        Path of the cache file; None keeps the cache in memory only
+
+    max_entries : int (optional)
+        Number of entries kept in memory and by `compact()`
+    """
+
+    def __init__(self, path=None, max_entries=1 << 20):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self._entries = self._read()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _read(self):
+        entries = OrderedDict()
+        with open(self.path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 4:
+                    # a line cut short by an interrupted run
+                    continue
+                key = tuple(fields[:3])
+                entries.pop(key, None)
+                entries[key] = int(fields[3])
+                if len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+        return entries
+
+    def key(self, player, game, time_left):
+        """Return the cache key of a move of `player`, or None if the player
+        cannot be cached.
+        """
+        agent = config_hash(player)
+        if agent is None:
+            return None
+        return (agent, position_key(game), str(budget_class(time_left)))
+
+    def get(self, key, height):
+        """Return the cached move for `key`, or None on a miss."""
+        idx = self._entries.get(key)
+        if idx is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return (-1, -1) if idx < 0 else (idx % height, idx // height)
+
+    def put(self, key, move, height):
+        """Store a move, evicting the least recently used entry if the cache
+        is full, and append it to the cache file.
+        """
+        idx = -1 if move == (-1, -1) else move[0] + move[1] * height
+        self._entries[key] = idx
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write("{} {} {} {}\n".format(key[0], key[1], key[2], idx))
+
+    def compact(self):
+        """Rewrite the cache file with its `max_entries` most recent entries,
+        including those appended by other processes, and reload them.
+
+        No other process may write to the cache while it is compacted.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        self._entries = self._read()
+        with open(self.path + ".tmp", "w") as f:
+            for key, idx in self._entries.items():
+                f.write("{} {} {} {}\n".format(key[0], key[1], key[2], idx))
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,235 @@
+"""Opening book for the first plies of Isolation on the 7x7 board.
+
+The book maps every position of the first few plies -- including the random
+opening moves applied by `tournament.play_round()` -- to the move chosen by an
+offline search.  Positions are reduced under the symmetries of the board, so
+only one position of each symmetry class is searched and stored.
+
+The book is a compact binary file that is memory-mapped the first time it is
+probed.  A position is encoded exactly in a 64-bit key (the blocked cells
+bitmask and the cell index of each player), which limits the book to boards of
+at most 52 cells.  To build the default book run, e.g.:
+
+    python opening_book.py --plies 4 --time 2000 --workers 8
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import timeit
+
+from search_board import SearchBoard, board_symmetries, board_tables
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "opening_book.bin")
+
+_MAGIC = b"ISOB"
+_HEADER = struct.Struct("<4sHHHI")
+_KEY = struct.Struct("<Q")
+_LOC_BITS = 6
+_NOT_MOVED = (1 << _LOC_BITS) - 1
+
+
+def _encode(blocked, own_loc, opp_loc, cells):
+    own = _NOT_MOVED if own_loc is None else own_loc
+    opp = _NOT_MOVED if opp_loc is None else opp_loc
+    return blocked | own << cells | opp << (cells + _LOC_BITS)
+
+
+def _transform(blocked, perm):
+    result = 0
+    while blocked:
+        low = blocked & -blocked
+        result |= 1 << perm[low.bit_length() - 1]
+        blocked ^= low
+    return result
+
+
+def canonical_key(board):
+    """Return (key, perm) where key is the smallest key of the position over
+    the board symmetries and perm is the symmetry that produces it.
+    """
+    blocked, own_loc, opp_loc = board.get_state()
+    cells = board.width * board.height
+    best = None
+    for perm in board_symmetries(board.width, board.height):
+        key = _encode(_transform(blocked, perm),
+                      None if own_loc is None else perm[own_loc],
+                      None if opp_loc is None else perm[opp_loc], cells)
+        if best is None or key < best[0]:
+            best = (key, perm)
+    return best
+
+
+def supports(width, height):
+    """Return True if positions on the board fit in a book key."""
+    return width * height + 2 * _LOC_BITS <= 64
+
+
+class OpeningBook:
+    """Read-only opening book loaded lazily from a file.
+
+    The file is opened and memory-mapped on the first call to `probe()`; if
+    it does not exist, every probe misses.
+
+    Parameters
+    ----------
+    path : str (optional)
+        Path of the book file
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._loaded = False
+        self._file = None
+        self._map = None
+        self._size = None
+        self._count = 0
+
+    def __getstate__(self):
+        # memory maps cannot be pickled; workers reopen the file lazily
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+        self.hits, self.misses = state["hits"], state["misses"]
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, width, height, count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError("{} is not an opening book".format(self.path))
+        self._size = (width, height)
+        self._count = count
+
+    def _lookup(self, key):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(self._map, _HEADER.size + 8 * mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and _KEY.unpack_from(
+                self._map, _HEADER.size + 8 * lo)[0] == key:
+            return self._map[_HEADER.size + 8 * self._count + lo]
+        return None
+
+    def probe(self, game):
+        """Return the book move for the active player of `game`, or None if
+        the position is not in the book.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            The current game state
+        """
+        if not self._loaded:
+            self._load()
+        if self._map is None or (game.width, game.height) != self._size:
+            return None
+        if not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        key, perm = canonical_key(game)
+        idx = self._lookup(key)
+        if idx is None:
+            self.misses += 1
+            return None
+        move = board_tables(game.width, game.height)[0][perm.index(idx)]
+        if not game.move_is_legal(move):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return move
+
+
+default_book = OpeningBook()
+
+
+def write_book(path, width, height, entries):
+    """Write a book file from a dict mapping canonical keys to the index of
+    the book move in the canonical orientation.
+    """
+    keys = sorted(entries)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, 1, width, height, len(keys)))
+        f.write(b"".join(_KEY.pack(key) for key in keys))
+        f.write(bytes(entries[key] for key in keys))
+
+
+def opening_positions(width, height, plies):
+    """Return the canonical positions of the first `plies` plies as a dict
+    mapping keys to (state, perm) pairs.
+    """
+    positions = {}
+    frontier = [SearchBoard(0, 1, width, height)]
+    for _ in range(plies):
+        children = {}
+        for board in frontier:
+            key, perm = canonical_key(board)
+            if key in positions:
+                continue
+            positions[key] = (board.get_state(), perm)
+            for move in board.get_legal_moves():
+                child = board.forecast_move(move)
+                children.setdefault(canonical_key(child)[0], child)
+        frontier = list(children.values())
+    return positions
+
+
+def _search_position(args):
+    """Search one book position and return (key, canonical move index)."""
+    key, state, perm, width, height, time_limit = args
+    from game_agent import AlphaBetaPlayer
+    from sample_players import improved_score
+    player = AlphaBetaPlayer(score_fn=improved_score, in_place=True,
+                             book=None)
+    opponent = AlphaBetaPlayer(score_fn=improved_score, book=None)
+    board = SearchBoard.from_state(player, opponent, state, width, height)
+    deadline = timeit.default_timer() + time_limit / 1000.
+    move = player.get_move(board,
+                           lambda: 1000 * (deadline - timeit.default_timer()))
+    return key, perm[move[0] + move[1] * height]
+
+
+def build_book(path=DEFAULT_PATH, plies=4, time_limit=2000, workers=1,
+               width=7, height=7):
+    """Search every canonical position of the first `plies` plies for
+    `time_limit` milliseconds on a pool of `workers` processes and write the
+    resulting book to `path`.
+    """
+    if not supports(width, height):
+        raise ValueError("{}x{} positions do not fit in a book key".format(
+            width, height))
+    positions = opening_positions(width, height, plies)
+    tasks = [(key, state, perm, width, height, time_limit)
+             for key, (state, perm) in positions.items()]
+    with multiprocessing.Pool(workers) as pool:
+        entries = dict(pool.imap_unordered(_search_position, tasks,
+                                           chunksize=4))
+    write_book(path, width, height, entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Isolation " +
+        "opening book by searching every opening position offline.")
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH,
+                        help="Path of the book file to write.")
+    parser.add_argument('-p', '--plies', type=int, default=4,
+                        help="Number of plies covered by the book.")
+    parser.add_argument('-t', '--time', type=int, default=2000,
+                        help="Search time per position in milliseconds.")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of worker processes.")
+    args = parser.parse_args()
+    count = build_book(args.output, args.plies, args.time, args.workers)
+    print("Wrote {} positions to {}".format(count, args.output))
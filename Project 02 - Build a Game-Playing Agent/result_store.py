@@ -0,0 +1,193 @@
+"""Persistent store of tournament game results.
+
+Each game of a tournament is identified by
+
+    (first player hash, second player hash, opening, seed, board size)
+
+which is the (agent, opponent, opening, color, seed, size) of the game with
+the color given by the order of the players.  A player hash covers the class of
+the agent and the code of its methods, the arguments it was constructed
+with, the code of its score function (and of the functions of the same
+module that the score function calls), and the time limit per move.  When a
+heuristic is edited, only the games of the agents using it get a new key.
+
+The results are appended to a text file with one JSON object per line as
+soon as each game finishes, so an interrupted tournament loses only the
+games in progress, and running it again with the same seed plays only the
+games that are not in the store:
+
+    python tournament.py --seed 1 --results results.jsonl
+
+Changes to code that is not hashed (e.g., the board or the helpers of the
+search) are not detected; use a new store after such changes.
+"""
+import hashlib
+import inspect
+import json
+import os
+import types
+
+from collections import OrderedDict
+from functools import partial
+
+# Board size of the records written before the size was part of the key
+_DEFAULT_SIZE = (7, 7)
+
+# Constructor arguments stored by the agents under another attribute name
+_ATTRIBUTES = {"score_fn": "score", "timeout": "TIMER_THRESHOLD"}
+
+
+def _digest_code(code, digest):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _digest_code(const, digest)
+        elif isinstance(const, frozenset):
+            # the order of a set depends on the hash seed of the process
+            digest.update(repr(sorted(const, key=repr)).encode())
+        else:
+            digest.update(repr(const).encode())
+
+
+def _digest_function(fn, digest, seen):
+    """Add the code of `fn`, and of the functions of its module that it
+    calls, to `digest`.
+    """
+    seen.add(fn)
+    _digest_code(fn.__code__, digest)
+    digest.update(repr(fn.__defaults__).encode())
+    for name in fn.__code__.co_names:
+        callee = fn.__globals__.get(name)
+        if (isinstance(callee, types.FunctionType) and callee not in seen and
+                callee.__module__ == fn.__module__):
+            _digest_function(callee, digest, seen)
+
+
+def _describe(value):
+    """Return a JSON-serializable description of a constructor argument."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_describe(item) for item in value]
+    if isinstance(value, partial):
+        return [_describe(value.func), [_describe(arg) for arg in value.args],
+                sorted((k, _describe(v)) for k, v in value.keywords.items())]
+    fn = getattr(value, "__func__", value)
+    if isinstance(fn, types.FunctionType):
+        digest = hashlib.sha1()
+        _digest_function(fn, digest, set())
+        return "{}.{}:{}".format(fn.__module__, fn.__qualname__,
+                                 digest.hexdigest())
+    path = getattr(value, "path", None)
+    if isinstance(path, str):
+        return [type(value).__name__, os.path.basename(path)]
+    return type(value).__name__
+
+
+def player_config(player, time_limit):
+    """Return the configuration of `player` that a game result depends on,
+    as a JSON-serializable dict.
+    """
+    digest = hashlib.sha1()
+    for cls in type(player).__mro__:
+        if cls is object:
+            continue
+        for name, attr in sorted(vars(cls).items()):
+            if isinstance(attr, types.FunctionType):
+                digest.update(name.encode())
+                _digest_code(attr.__code__, digest)
+    config = OrderedDict([("class", type(player).__name__),
+                          ("code", digest.hexdigest()),
+                          ("time_limit", time_limit)])
+    parameters = inspect.signature(type(player).__init__).parameters
+    for name, parameter in parameters.items():
+        if name == "self" or parameter.kind in (parameter.VAR_POSITIONAL,
+                                                parameter.VAR_KEYWORD):
+            continue
+        attribute = _ATTRIBUTES.get(name, name)
+        if hasattr(player, attribute):
+            config[name] = _describe(getattr(player, attribute))
+    return config
+
+
+def config_hash(player, time_limit):
+    """Return the hash of `player_config()`."""
+    config = json.dumps(player_config(player, time_limit))
+    return hashlib.sha1(config.encode()).hexdigest()[:16]
+
+
+class ResultStore:
+    """Append-only store of game results.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON lines file; existing results are loaded
+
+    time_limit : int
+        Time limit per move in milliseconds of the games
+    """
+
+    def __init__(self, path, time_limit):
+        self.path = path
+        self.time_limit = time_limit
+        self.hits = 0
+        self._hashes = {}
+        self._results = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interrupted run
+                        continue
+                    self._results[self._record_key(record)] = (
+                        record["winner"], record["termination"])
+
+    def __len__(self):
+        return len(self._results)
+
+    @staticmethod
+    def _record_key(record):
+        return (record["player_1"], record["player_2"],
+                tuple(tuple(move) for move in record["opening"]),
+                record["seed"], tuple(record.get("size", _DEFAULT_SIZE)))
+
+    def key(self, task, players):
+        """Return the key of the game described by a `tournament.GameTask`
+        between `players`.
+        """
+        hashes = []
+        for index in (task.player_1, task.player_2):
+            player = players[index]
+            if id(player) not in self._hashes:
+                self._hashes[id(player)] = config_hash(player,
+                                                       self.time_limit)
+            hashes.append(self._hashes[id(player)])
+        return (hashes[0], hashes[1],
+                tuple(tuple(move) for move in task.opening), task.seed,
+                tuple(task.size))
+
+    def get(self, key):
+        """Return the stored (winner, termination) of a game, or None."""
+        result = self._results.get(key)
+        if result is not None:
+            self.hits += 1
+        return result
+
+    def put(self, key, winner, termination):
+        """Store the result of a game and append it to the file."""
+        self._results[key] = (winner, termination)
+        record = OrderedDict([
+            ("player_1", key[0]),
+            ("player_2", key[1]),
+            ("opening", [list(move) for move in key[2]]),
+            ("seed", key[3]),
+            ("size", list(key[4])),
+            ("winner", winner),
+            ("termination", termination),
+        ])
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -8,6 +8,8 @@ own agent and example heuristic functions.
 
 from random import randint
 
+from search_board import center_distance, mobility
+
 
 def null_score(game, player):
     """This heuristic presumes no knowledge for non-terminal states, and
@@ -65,7 +67,7 @@ def open_move_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    return float(len(game.get_legal_moves(player)))
+    return float(mobility(game, player))
 
 
 def improved_score(game, player):
@@ -95,8 +97,8 @@ def improved_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
     return float(own_moves - opp_moves)
 
 
@@ -128,9 +130,7 @@ def center_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    w, h = game.width / 2., game.height / 2.
-    y, x = game.get_player_location(player)
-    return float((h - y)**2 + (w - x)**2)
+    return center_distance(game, player)[0]
 
 
 class RandomPlayer():
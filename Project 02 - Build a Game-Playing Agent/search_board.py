@@ -0,0 +1,439 @@
+"""Mutable Isolation board used internally by the search agents.
+
+`isolation.Board.forecast_move()` copies the whole board state for every node
+that is expanded.  `SearchBoard` mirrors the public `isolation.Board` API used
+by the agents and the evaluation functions, and adds `push_move()` and
+`pop_move()` to apply and revert moves in place with an undo stack, so that an
+entire search can run on a single board object.
+
+Cells are indexed the same way as in `isolation.Board`, i.e., the cell at
+(row, col) has index `row + col * height`, and the set of blocked cells is
+kept as a bitmask over those indices.  A 64-bit Zobrist key of the position is
+updated incrementally for use by transposition tables.
+
+The legal moves of both players are also kept incrementally, as a bitmask and
+a count per player, so the terminal tests and the mobility terms of the
+evaluation functions (see `mobility()`) cost O(1) at every node instead of a
+move generation each.
+"""
+import random
+
+_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+               (1, -2), (1, 2), (2, -1), (2, 1)]
+
+_TABLES = {}
+_CENTERS = {}
+_SHIFTS = {}
+_SYMMETRIES = {}
+_ZOBRIST = {}
+
+
+def board_tables(width, height):
+    """Return the precomputed cell and move tables for a board size.
+
+    Parameters
+    ----------
+    width, height : int
+        Dimensions of the board
+
+    Returns
+    -------
+    (list, list, list)
+        `cells[idx]` is the (row, col) coordinate of each cell index,
+        `moves[idx]` is a tuple of the cell indices one knight move away, and
+        `masks[idx]` is the same set of cells as a bitmask
+    """
+    key = (width, height)
+    if key not in _TABLES:
+        cells = [(idx % height, idx // height) for idx in range(width * height)]
+        moves = []
+        for r, c in cells:
+            moves.append(tuple((r + dr) + (c + dc) * height
+                               for dr, dc in _DIRECTIONS
+                               if 0 <= r + dr < height and 0 <= c + dc < width))
+        masks = [sum(1 << idx for idx in targets) for targets in moves]
+        _TABLES[key] = (cells, moves, masks)
+    return _TABLES[key]
+
+
+def shift_tables(width, height):
+    """Return the knight moves of a board size as bit shifts, which move a
+    whole set of cells at once.
+
+    A knight move (dr, dc) adds `dr + dc * height` to a cell index, so it
+    moves every cell of a bitmask with a single shift once the cells whose
+    target is off the board are masked out.
+
+    Returns
+    -------
+    (list, list, int)
+        Four (shift, mask) pairs of the moves that shift left and four of
+        those that shift right (padded with (0, 0) on boards too small for
+        some moves): the cells one move away from the cells of bitmask `s`
+        are the union of `(s & mask) << shift` and of `(s & mask) >> shift`
+        over both lists; and the bitmask of the cells whose row and column
+        sum to an even number (a knight move always changes the parity)
+    """
+    key = (width, height)
+    if key not in _SHIFTS:
+        cells = board_tables(width, height)[0]
+        left, right = [], []
+        for dr, dc in _DIRECTIONS:
+            mask = sum(1 << idx for idx, (r, c) in enumerate(cells)
+                       if 0 <= r + dr < height and 0 <= c + dc < width)
+            shift = dr + dc * height
+            if not mask:
+                continue
+            elif shift > 0:
+                left.append((shift, mask))
+            else:
+                right.append((-shift, mask))
+        left += [(0, 0)] * (4 - len(left))
+        right += [(0, 0)] * (4 - len(right))
+        even = sum(1 << idx for idx, (r, c) in enumerate(cells)
+                   if (r + c) % 2 == 0)
+        _SHIFTS[key] = (left, right, even)
+    return _SHIFTS[key]
+
+
+def zobrist_keys(width, height):
+    """Return the Zobrist keys for a board size.
+
+    The keys are drawn from a generator seeded with the board size, so they
+    are identical in every process.
+
+    Returns
+    -------
+    (list, list, int)
+        A key for each blocked cell, a list of location keys for each of the
+        two player slots, and the key XORed in when the second slot is to move
+    """
+    key = (width, height)
+    if key not in _ZOBRIST:
+        rng = random.Random(width * 1000 + height)
+        cells = width * height
+        _ZOBRIST[key] = ([rng.getrandbits(64) for _ in range(cells)],
+                         [[rng.getrandbits(64) for _ in range(cells)]
+                          for _ in range(2)],
+                         rng.getrandbits(64))
+    return _ZOBRIST[key]
+
+
+def center_distances(width, height):
+    """Return the distance of every cell from the center of a board size.
+
+    The center is (height / 2., width / 2.), as in
+    `sample_players.center_score()`.
+
+    Returns
+    -------
+    list
+        `centers[idx]` is the (squared Euclidean, Manhattan) distance of
+        cell `idx` from the center
+    """
+    key = (width, height)
+    if key not in _CENTERS:
+        h, w = height / 2., width / 2.
+        _CENTERS[key] = [(float((h - r)**2 + (w - c)**2),
+                          float(abs(h - r) + abs(w - c)))
+                         for r, c in board_tables(width, height)[0]]
+    return _CENTERS[key]
+
+
+def board_symmetries(width, height):
+    """Return the symmetries of the board as cell index permutations.
+
+    Square boards have 8 symmetries (rotations and reflections); other boards
+    have 4 (reflections of the rows and columns).  Knight moves are preserved
+    by all of them.
+
+    Returns
+    -------
+    list
+        `perm[idx]` is the index that cell `idx` is mapped to, for each
+        symmetry; the identity comes first
+    """
+    key = (width, height)
+    if key not in _SYMMETRIES:
+        transforms = [lambda r, c: (r, c),
+                      lambda r, c: (height - 1 - r, c),
+                      lambda r, c: (r, width - 1 - c),
+                      lambda r, c: (height - 1 - r, width - 1 - c)]
+        if width == height:
+            transforms += [lambda r, c: (c, r),
+                           lambda r, c: (width - 1 - c, r),
+                           lambda r, c: (c, height - 1 - r),
+                           lambda r, c: (width - 1 - c, height - 1 - r)]
+        cells = board_tables(width, height)[0]
+        _SYMMETRIES[key] = [
+            [r + c * height for r, c in (f(r, c) for r, c in cells)]
+            for f in transforms]
+    return _SYMMETRIES[key]
+
+
+def mobility(game, player):
+    """Return the number of legal moves of `player` in `game`.
+
+    This is O(1) on a `SearchBoard`, and falls back to counting
+    `game.get_legal_moves(player)` on any other board.
+    """
+    if isinstance(game, SearchBoard):
+        return game.mobility(player)
+    return len(game.get_legal_moves(player))
+
+
+def center_distance(game, player):
+    """Return the (squared Euclidean, Manhattan) distance of `player` from
+    the center of `game` (see `center_distances()`).
+
+    This is a table lookup on any board, without the coordinate tuple on a
+    `SearchBoard`.
+    """
+    if isinstance(game, SearchBoard):
+        return game.center_distance(player)
+    r, c = game.get_player_location(player)
+    return center_distances(game.width, game.height)[r + c * game.height]
+
+
+class SearchBoard:
+    """Isolation board that supports in-place make/unmake of moves.
+
+    Parameters
+    ----------
+    player_1, player_2 : object
+        The player objects; `player_1` moves first
+
+    width, height : int (optional)
+        Dimensions of the board
+    """
+
+    NOT_MOVED = None
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._players = (player_1, player_2)
+        self._locs = [None, None]
+        self._active = 0
+        self._blocked = 0
+        self._history = []
+        self._cells, self._moves, self._masks = board_tables(width, height)
+        self._centers = center_distances(width, height)
+        self._cell_keys, self._loc_keys, self._side_key = zobrist_keys(
+            width, height)
+        self.key = 0
+        all_cells = (1 << (width * height)) - 1
+        self._legal = [all_cells, all_cells]
+        self._mobility = [width * height, width * height]
+
+    @classmethod
+    def from_board(cls, game):
+        """Build a `SearchBoard` holding the same position as `game`.
+
+        Only the public `isolation.Board` API is used, so any board object
+        exposing it (including another `SearchBoard`) can be converted.
+        """
+        players = (game.active_player, game.inactive_player)
+        board = cls(players[0], players[1], game.width, game.height)
+        board.move_count = game.move_count
+        board._blocked = (1 << (game.width * game.height)) - 1
+        for r, c in game.get_blank_spaces():
+            board._blocked ^= 1 << (r + c * game.height)
+        for i, player in enumerate(players):
+            loc = game.get_player_location(player)
+            if loc is not None:
+                board._locs[i] = loc[0] + loc[1] * game.height
+        board.key = board._compute_key()
+        board._compute_legal()
+        return board
+
+    @classmethod
+    def from_state(cls, player, opponent, state, width=7, height=7):
+        """Build a `SearchBoard` from a tuple returned by `get_state()`, with
+        `player` to move.
+        """
+        board = cls(player, opponent, width, height)
+        board._blocked, board._locs[0], board._locs[1] = state
+        board.move_count = bin(board._blocked).count("1")
+        board.key = board._compute_key()
+        board._compute_legal()
+        return board
+
+    def _compute_key(self):
+        key = self._side_key if self._active else 0
+        for idx in range(self.width * self.height):
+            if self._blocked >> idx & 1:
+                key ^= self._cell_keys[idx]
+        for slot, loc in enumerate(self._locs):
+            if loc is not None:
+                key ^= self._loc_keys[slot][loc]
+        return key
+
+    def _compute_legal(self):
+        open_cells = self.open_cells
+        for slot, loc in enumerate(self._locs):
+            legal = open_cells if loc is None else self._masks[loc] & open_cells
+            self._legal[slot] = legal
+            self._mobility[slot] = bin(legal).count("1")
+
+    def get_state(self):
+        """Return the position as a (blocked cells bitmask, active player
+        location, inactive player location) tuple of ints; locations are cell
+        indices, or None for a player that has not moved.
+        """
+        return (self._blocked, self._locs[self._active],
+                self._locs[self._active ^ 1])
+
+    @property
+    def active_player(self):
+        return self._players[self._active]
+
+    @property
+    def inactive_player(self):
+        return self._players[self._active ^ 1]
+
+    def _index(self, player):
+        if player == self._players[0]:
+            return 0
+        elif player == self._players[1]:
+            return 1
+        raise RuntimeError("`player` must be an object registered as a " +
+                           "player in the current game.")
+
+    @property
+    def open_cells(self):
+        """Bitmask of the cells that are not blocked."""
+        return ((1 << (self.width * self.height)) - 1) & ~self._blocked
+
+    def get_player_index(self, player):
+        """Return the cell index of `player`, or None if it has not moved."""
+        return self._locs[self._index(player)]
+
+    def mobility(self, player):
+        """Return the number of legal moves of `player` in O(1)."""
+        return self._mobility[self._index(player)]
+
+    def center_distance(self, player):
+        """Return the (squared Euclidean, Manhattan) distance of `player`
+        from the center of the board.
+        """
+        return self._centers[self._locs[self._index(player)]]
+
+    def get_opponent(self, player):
+        return self._players[self._index(player) ^ 1]
+
+    def copy(self):
+        new_board = SearchBoard(self._players[0], self._players[1],
+                                self.width, self.height)
+        new_board.move_count = self.move_count
+        new_board._locs = list(self._locs)
+        new_board._active = self._active
+        new_board._blocked = self._blocked
+        new_board.key = self.key
+        new_board._legal = list(self._legal)
+        new_board._mobility = list(self._mobility)
+        return new_board
+
+    def forecast_move(self, move):
+        new_board = self.copy()
+        new_board.push_move(move)
+        return new_board
+
+    def move_is_legal(self, move):
+        r, c = move
+        return (0 <= r < self.height and 0 <= c < self.width and
+                not self._blocked >> (r + c * self.height) & 1)
+
+    def get_blank_spaces(self):
+        blocked = self._blocked
+        return [cell for idx, cell in enumerate(self._cells)
+                if not blocked >> idx & 1]
+
+    def get_player_location(self, player):
+        idx = self._locs[self._index(player)]
+        if idx is None:
+            return SearchBoard.NOT_MOVED
+        return self._cells[idx]
+
+    def get_legal_moves(self, player=None):
+        if player is None:
+            loc = self._locs[self._active]
+        else:
+            loc = self._locs[self._index(player)]
+        if loc is None:
+            return self.get_blank_spaces()
+        blocked = self._blocked
+        cells = self._cells
+        return [cells[idx] for idx in self._moves[loc]
+                if not blocked >> idx & 1]
+
+    def push_move(self, move):
+        """Apply `move` for the active player in place and record it on the
+        undo stack.
+        """
+        idx = move[0] + move[1] * self.height
+        active = self._active
+        loc_keys = self._loc_keys[active]
+        prev = self._locs[active]
+        key = self.key ^ self._cell_keys[idx] ^ loc_keys[idx] ^ self._side_key
+        if prev is not None:
+            key ^= loc_keys[prev]
+        self.key = key
+        legal = self._legal
+        mobility = self._mobility
+        self._history.append((prev, legal[0], legal[1], mobility[0],
+                              mobility[1]))
+        self._locs[active] = idx
+        bit = 1 << idx
+        blocked = self._blocked | bit
+        self._blocked = blocked
+        own = self._masks[idx] & ~blocked
+        legal[active] = own
+        mobility[active] = bin(own).count("1")
+        other = active ^ 1
+        if legal[other] & bit:
+            legal[other] ^= bit
+            mobility[other] -= 1
+        self._active = other
+        self.move_count += 1
+
+    def pop_move(self):
+        """Revert the most recent `push_move()` and return the reverted move.
+        """
+        active = self._active ^ 1
+        self._active = active
+        self.move_count -= 1
+        idx = self._locs[active]
+        prev, legal_0, legal_1, mobility_0, mobility_1 = self._history.pop()
+        self._legal[0], self._legal[1] = legal_0, legal_1
+        self._mobility[0], self._mobility[1] = mobility_0, mobility_1
+        loc_keys = self._loc_keys[active]
+        key = self.key ^ self._cell_keys[idx] ^ loc_keys[idx] ^ self._side_key
+        if prev is not None:
+            key ^= loc_keys[prev]
+        self.key = key
+        self._blocked &= ~(1 << idx)
+        self._locs[active] = prev
+        return self._cells[idx]
+
+    apply_move = push_move
+
+    def is_winner(self, player):
+        return (player == self.inactive_player and
+                not self._mobility[self._active])
+
+    def is_loser(self, player):
+        return (player == self.active_player and
+                not self._mobility[self._active])
+
+    def utility(self, player):
+        if not self._mobility[self._active]:
+            if player == self.inactive_player:
+                return float("inf")
+            if player == self.active_player:
+                return float("-inf")
+        return 0.
+
+    def hash(self):
+        return self.key
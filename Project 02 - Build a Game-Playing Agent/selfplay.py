@@ -0,0 +1,366 @@
+"""Generate self-play game records for fitting evaluation functions.
+
+The agents of `game_agent.py` and `competition_agent.py` play each other on a
+pool of worker processes, and every finished game is streamed to a chunk of
+compact `.npz` files in an output directory.  Only the games of the current
+chunk are kept in memory, and each chunk is written to a temporary file and
+renamed, so a chunk file on disk is always complete.
+
+Game `i` is fully described by its index: the pairing of agents, the random
+opening and the seed of the game are drawn from the run seed and `i`.  An
+interrupted run is resumed by running the same command again -- the games
+already stored in the directory are skipped and the rest are played:
+
+    python selfplay.py -o records -n 10000 -w 8
+
+Each chunk holds the arrays:
+
+  - `game_id` (games,): index of each game in the run
+  - `players` (games, 2): index in `agents` of the first and second player
+  - `winner` (games,): 0 if the first player won and 1 otherwise
+  - `termination` (games,): index in `TERMINATIONS` of how the game ended
+  - `offsets` (games + 1,): the moves of game `k` are
+    `moves[offsets[k]:offsets[k + 1]]`, and likewise for `scores`
+  - `moves` (plies,): cell index (`row + col * height`) of every move
+  - `scores` (plies,): search value of every move for the player making it,
+    NaN for the random opening and for moves that were not searched (e.g.,
+    book moves); agents report values on different scales, so scores should
+    be interpreted per agent (`win_rate` for MCTS, heuristic units for the
+    alpha-beta agents)
+  - `agents`, `width`, `height`: the agent names and board size
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import timeit
+import warnings
+
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from isolation import Board
+from competition_agent import CustomPlayer
+from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
+                        custom_score_2, custom_score_3, territory_score)
+from sample_players import improved_score
+
+TIME_LIMIT = 150  # number of milliseconds per move
+OPENING_PLIES = 2  # number of random moves at the start of every game
+
+AGENTS = OrderedDict([
+    ("MM_Improved", lambda: MinimaxPlayer(score_fn=improved_score)),
+    ("AB_Improved", lambda: AlphaBetaPlayer(score_fn=improved_score)),
+    ("AB_Custom", lambda: AlphaBetaPlayer(score_fn=custom_score)),
+    ("AB_Custom_2", lambda: AlphaBetaPlayer(score_fn=custom_score_2)),
+    ("AB_Custom_3", lambda: AlphaBetaPlayer(score_fn=custom_score_3)),
+    ("AB_Territory", lambda: AlphaBetaPlayer(score_fn=territory_score,
+                                             in_place=True)),
+    ("MCTS", lambda: CustomPlayer()),
+])
+
+DEFAULT_AGENTS = ["AB_Improved", "AB_Custom", "MCTS"]
+
+# The ways a game can end, as reported by `isolation.Board.play()`; a game
+# ends normally when the player to move has no legal moves left
+TERMINATIONS = ["illegal move", "timeout", "forfeit"]
+
+# A game to play: players are indices into the agent names of the run
+SelfPlayTask = namedtuple("SelfPlayTask", ["game_id", "player_1", "player_2",
+                                           "opening", "seed"])
+
+GameRecord = namedtuple("GameRecord", ["game_id", "players", "moves",
+                                       "scores", "winner", "termination"])
+
+_CHUNK = re.compile(r"chunk-(\d+)\.npz$")
+_CONFIG = "selfplay.json"
+
+_worker_players = None
+_worker_time_limit = None
+
+
+def agent_pairs(num_agents):
+    """Return the (first, second) player pairings of a run, covering both
+    seats of every pair of distinct agents, or the mirror match if there is
+    a single agent.
+    """
+    if num_agents == 1:
+        return [(0, 0)]
+    return [(a, b) for a in range(num_agents) for b in range(num_agents)
+            if a != b]
+
+
+def game_task(game_id, num_agents, seed=0, width=7, height=7):
+    """Return the `SelfPlayTask` of game `game_id` of a run."""
+    rng = random.Random(seed << 32 | game_id)
+    pairs = agent_pairs(num_agents)
+    player_1, player_2 = pairs[game_id % len(pairs)]
+    board = Board("Player1", "Player2", width, height)
+    opening = []
+    for _ in range(OPENING_PLIES):
+        move = rng.choice(board.get_legal_moves())
+        board.apply_move(move)
+        opening.append(move)
+    return SelfPlayTask(game_id, player_1, player_2, tuple(opening),
+                        rng.getrandbits(32))
+
+
+def make_players(agents):
+    """Build two players of each named agent, so that an agent can play
+    itself with separate search state on each side.
+    """
+    return [[AGENTS[name](), AGENTS[name]()] for name in agents]
+
+
+def _search_score(player):
+    """Return the search value of the last move chosen by `player`."""
+    telemetry = getattr(player, "telemetry", None)
+    if telemetry:
+        score = telemetry[-1]["score"]
+    else:
+        score = getattr(player, "win_rate", None)
+    return float("nan") if score is None else score
+
+
+def play_game(players, task, time_limit=TIME_LIMIT, width=7, height=7):
+    """Play the game described by `task` and return its `GameRecord`.
+
+    The game is played as in `isolation.Board.play()`, recording the search
+    value reported by the player after each move.
+    """
+    random.seed(task.seed)
+    player_1 = players[task.player_1][0]
+    player_2 = players[task.player_2][1]
+    seats = (player_1, player_2)
+    for player in seats:
+        if hasattr(player, "telemetry"):
+            player.telemetry = []
+    game = Board(player_1, player_2, width, height)
+    moves = []
+    scores = []
+    for move in task.opening:
+        game.apply_move(move)
+        moves.append(move[0] + move[1] * height)
+        scores.append(float("nan"))
+
+    time_millis = lambda: 1000 * timeit.default_timer()
+    while True:
+        legal_moves = game.get_legal_moves()
+        player = game.active_player
+        move_start = time_millis()
+        time_left = lambda: time_limit - (time_millis() - move_start)
+        move = player.get_move(game.copy(), time_left)
+        if time_left() < 0:
+            termination = "timeout"
+            break
+        if move not in legal_moves:
+            termination = "forfeit" if legal_moves else "illegal move"
+            break
+        game.apply_move(move)
+        moves.append(move[0] + move[1] * height)
+        scores.append(_search_score(player))
+
+    for player in seats:
+        if hasattr(player, "telemetry"):
+            player.telemetry = None
+    return GameRecord(task.game_id, (task.player_1, task.player_2), moves,
+                      scores, int(game.active_player is player_1),
+                      TERMINATIONS.index(termination))
+
+
+def _init_worker(agents, time_limit):
+    global _worker_players, _worker_time_limit
+    _worker_players = make_players(agents)
+    _worker_time_limit = time_limit
+
+
+def _play_worker_game(task):
+    return play_game(_worker_players, task, _worker_time_limit)
+
+
+class RecordWriter:
+    """Buffer game records and write them to numbered `.npz` chunk files.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory; created if it does not exist
+
+    agents : list
+        Names of the agents that the player indices of the records refer to
+
+    chunk_size : int (optional)
+        Number of games per chunk file
+    """
+
+    def __init__(self, directory, agents, chunk_size=256, width=7, height=7):
+        self.directory = directory
+        self.agents = list(agents)
+        self.chunk_size = chunk_size
+        self.width = width
+        self.height = height
+        self.written = 0
+        self._buffer = []
+        os.makedirs(directory, exist_ok=True)
+        chunks = self.chunks()
+        self._next_chunk = 1 + max(
+            [int(_CHUNK.search(path).group(1)) for path in chunks] or [-1])
+
+    def chunks(self):
+        """Return the paths of the chunk files in the directory, in order."""
+        return sorted(os.path.join(self.directory, name)
+                      for name in os.listdir(self.directory)
+                      if _CHUNK.match(name))
+
+    def completed(self):
+        """Return the set of game ids stored in the chunk files."""
+        done = set()
+        for path in self.chunks():
+            with np.load(path) as data:
+                done.update(data["game_id"].tolist())
+        return done
+
+    def add(self, record):
+        """Buffer a `GameRecord`, writing a chunk once the buffer is full."""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records to the next chunk file."""
+        records = self._buffer
+        if not records:
+            return
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(record.moves) for record in records])
+        path = os.path.join(self.directory,
+                            "chunk-{:05d}.npz".format(self._next_chunk))
+        # write under a temporary name, so that an interrupted write never
+        # leaves a partial chunk to be read on resume
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                game_id=np.array([r.game_id for r in records], dtype=np.int64),
+                players=np.array([r.players for r in records], dtype=np.int16),
+                winner=np.array([r.winner for r in records], dtype=np.int8),
+                termination=np.array([r.termination for r in records],
+                                     dtype=np.int8),
+                offsets=offsets,
+                moves=np.array([m for r in records for m in r.moves],
+                               dtype=np.int16),
+                scores=np.array([s for r in records for s in r.scores],
+                                dtype=np.float32),
+                agents=np.array(self.agents),
+                width=self.width, height=self.height)
+        os.replace(path + ".tmp", path)
+        self._next_chunk += 1
+        self.written += len(records)
+        self._buffer = []
+
+    close = flush
+
+
+def _check_config(directory, config):
+    """Store the settings of a run in `directory`, or check that they match
+    those of the run being resumed there.
+    """
+    path = os.path.join(directory, _CONFIG)
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+        if stored != config:
+            raise ValueError(("{} holds records of a run with different " +
+                              "settings: {}").format(directory, stored))
+    else:
+        with open(path, "w") as f:
+            json.dump(config, f, indent=2)
+
+
+def run(directory, num_games, agents=DEFAULT_AGENTS, workers=1, seed=0,
+        time_limit=TIME_LIMIT, chunk_size=256):
+    """Play games 0 to `num_games` - 1 of a run that are not yet stored in
+    `directory`, and return the number of games played.
+
+    Games are written in the order they finish; stopping the run (e.g., with
+    Ctrl-C) writes the games finished so far, and the remaining games are
+    played when the run is resumed with the same settings.
+    """
+    for name in agents:
+        if name not in AGENTS:
+            raise ValueError("unknown agent {!r}; choose from {}".format(
+                name, ", ".join(AGENTS)))
+    writer = RecordWriter(directory, agents, chunk_size)
+    _check_config(directory, OrderedDict([
+        ("agents", list(agents)), ("seed", seed), ("time_limit", time_limit),
+        ("opening_plies", OPENING_PLIES)]))
+    done = writer.completed()
+    tasks = [game_task(i, len(agents), seed) for i in range(num_games)
+             if i not in done]
+    try:
+        if workers > 1:
+            cpus = len(os.sched_getaffinity(0)) if hasattr(
+                os, "sched_getaffinity") else multiprocessing.cpu_count()
+            if workers > cpus:
+                warnings.warn(("{} workers share {} CPUs; concurrent games " +
+                               "will distort move timing.").format(
+                                   workers, cpus))
+            with multiprocessing.Pool(workers, initializer=_init_worker,
+                                      initargs=(agents, time_limit)) as pool:
+                for record in pool.imap_unordered(_play_worker_game, tasks):
+                    writer.add(record)
+        else:
+            players = make_players(agents)
+            for task in tasks:
+                writer.add(play_game(players, task, time_limit))
+    finally:
+        writer.close()
+    return writer.written
+
+
+def load_records(directory):
+    """Yield the `GameRecord` of every game stored in `directory`, with the
+    player indices replaced by agent names.
+    """
+    writer = RecordWriter(directory, [])
+    for path in writer.chunks():
+        with np.load(path) as data:
+            agents = [str(name) for name in data["agents"]]
+            offsets = data["offsets"]
+            moves, scores = data["moves"], data["scores"]
+            for k, game_id in enumerate(data["game_id"].tolist()):
+                lo, hi = offsets[k], offsets[k + 1]
+                yield GameRecord(
+                    game_id, tuple(agents[i] for i in data["players"][k]),
+                    moves[lo:hi].tolist(), scores[lo:hi].tolist(),
+                    int(data["winner"][k]),
+                    TERMINATIONS[data["termination"][k]])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play the search agents " +
+        "against each other and stream the game records to .npz files.")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Directory of the record files; an existing " +
+                        "run in it is resumed.")
+    parser.add_argument('-n', '--games', type=int, default=1000,
+                        help="Total number of games of the run.")
+    parser.add_argument('-a', '--agents', nargs='+', default=DEFAULT_AGENTS,
+                        choices=list(AGENTS),
+                        help="Agents playing each other (a single agent " +
+                        "plays itself).")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help="Seed of the pairings and random openings.")
+    parser.add_argument('-t', '--time', type=int, default=TIME_LIMIT,
+                        help="Time limit per move in milliseconds.")
+    parser.add_argument('-c', '--chunk-size', type=int, default=256,
+                        help="Number of games per chunk file.")
+    args = parser.parse_args()
+    played = run(args.output, args.games, args.agents, args.workers,
+                 args.seed, args.time, args.chunk_size)
+    print("Played {} games; records are in {}".format(played, args.output))
@@ -0,0 +1,319 @@
+"""Endgame tablebase for Isolation on small boards.
+
+The tablebase stores the exact result of every position with at most
+`max_open` open cells where both players have moved: the number of plies left
+in the game under perfect play, where the player to move wins if it is odd
+and loses if it is even (0 means the player to move has no legal moves).
+The winner plays for the shortest game and the loser for the longest.
+
+Every move blocks a cell, so the positions with `k` open cells depend only on
+those with `k - 1`, and the table is built one layer of open cells at a time
+from `k = 0` (retrograde analysis without cycles).  Within a layer the
+positions are split into ranges solved on a process pool.
+
+Positions are indexed by a perfect hash, which is a bijection between the
+positions of a layer and the integers below its size:
+
+    index = (rank(open cells) * b + i) * (b - 1) + j
+
+where `rank` is the colexicographic rank of the set of open cells among the
+sets of `k` cells, `b` is the number of blocked cells, `i` is the rank of the
+location of the player to move among the blocked cells, and `j` the rank of
+the opponent's location among the other blocked cells.  Each position takes
+one byte, and the file is memory-mapped the first time it is probed.
+
+The number of positions grows quickly with the board and the number of open
+cells -- for 5x5 boards, 6.5 million positions with up to 4 open cells and
+87 million with up to 6 -- so tablebases are only practical on small boards:
+
+    python tablebase.py --width 5 --height 5 --max-open 4 --workers 8
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+
+from math import comb
+
+from search_board import SearchBoard, board_tables
+
+_MAGIC = b"ISTB"
+_HEADER = struct.Struct("<4sHHHH")
+
+# Number of positions per task of the generator
+_CHUNK = 1 << 16
+
+
+def default_path(width, height):
+    """Return the default tablebase file of a board size."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "tablebase_{}x{}.bin".format(width, height))
+
+
+def layer_size(cells, k):
+    """Return the number of positions with `k` open cells."""
+    blocked = cells - k
+    return comb(cells, k) * blocked * (blocked - 1)
+
+
+def rank(open_cells):
+    """Return the colexicographic rank of a set of cells given as a bitmask.
+    """
+    r = 0
+    i = 1
+    while open_cells:
+        low = open_cells & -open_cells
+        r += comb(low.bit_length() - 1, i)
+        open_cells ^= low
+        i += 1
+    return r
+
+
+def unrank(r, k, cells):
+    """Return the bitmask of the set of `k` cells with colexicographic rank
+    `r`.
+    """
+    mask = 0
+    c = cells
+    for i in range(k, 0, -1):
+        c -= 1
+        while comb(c, i) > r:
+            c -= 1
+        r -= comb(c, i)
+        mask |= 1 << c
+    return mask
+
+
+def position_index(open_cells, own_loc, opp_loc, cells):
+    """Return (number of open cells, index in that layer) of a position."""
+    k = bin(open_cells).count("1")
+    b = cells - k
+    i = own_loc - bin(open_cells & ((1 << own_loc) - 1)).count("1")
+    j = opp_loc - bin(open_cells & ((1 << opp_loc) - 1)).count("1")
+    if own_loc < opp_loc:
+        j -= 1
+    return k, (rank(open_cells) * b + i) * (b - 1) + j
+
+
+def layer_offsets(cells, max_open):
+    """Return the offset of each layer from the end of the header."""
+    offsets = [0]
+    for k in range(max_open + 1):
+        offsets.append(offsets[-1] + layer_size(cells, k))
+    return offsets
+
+
+class Tablebase:
+    """Read-only tablebase loaded lazily from a file.
+
+    The file is opened and memory-mapped on the first probe; if it does not
+    exist, every probe misses.
+
+    Parameters
+    ----------
+    path : str
+        Path of the tablebase file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self._loaded = False
+        self._file = None
+        self._map = None
+        self.width = self.height = None
+        self.max_open = -1
+        self._offsets = None
+
+    def __getstate__(self):
+        # memory maps cannot be pickled; workers reopen the file lazily
+        return {"path": self.path, "hits": self.hits}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+        self.hits = state["hits"]
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, width, height, max_open = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError("{} is not a tablebase".format(self.path))
+        self.width, self.height, self.max_open = width, height, max_open
+        self._offsets = layer_offsets(width * height, max_open)
+
+    def covers(self, game):
+        """Return True if the position of `game` is in the tablebase."""
+        if not self._loaded:
+            self._load()
+        return (self._map is not None and
+                (game.width, game.height) == (self.width, self.height) and
+                game.width * game.height - game.move_count <= self.max_open and
+                game.move_count >= 2)
+
+    def probe(self, game):
+        """Return the number of plies left under perfect play in `game`
+        (odd if the player to move wins), or None if the position is not in
+        the tablebase.
+
+        Parameters
+        ----------
+        game : `SearchBoard`
+            The current game state; other boards are converted
+        """
+        if not self.covers(game):
+            return None
+        if not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        open_cells, own_loc, opp_loc = game.get_state()
+        open_cells ^= (1 << (self.width * self.height)) - 1
+        k, idx = position_index(open_cells, own_loc, opp_loc,
+                                self.width * self.height)
+        self.hits += 1
+        return self._map[_HEADER.size + self._offsets[k] + idx]
+
+    def best_move(self, game):
+        """Return (move, plies) for the fastest win, or the slowest loss, of
+        the player to move, or None if the position is not covered or the
+        player has no legal moves.
+        """
+        if not self.covers(game):
+            return None
+        if not isinstance(game, SearchBoard):
+            game = SearchBoard.from_board(game)
+        best = None
+        for move in game.get_legal_moves():
+            game.push_move(move)
+            plies = self.probe(game)
+            game.pop_move()
+            # children are scored for the opponent: an even count is a win
+            key = (plies % 2 == 0, -plies if plies % 2 == 0 else plies)
+            if best is None or key > best[0]:
+                best = (key, move, plies + 1)
+        return None if best is None else best[1:]
+
+
+def _solve_range(args):
+    """Solve the positions [start, stop) of layer `k` and return their
+    values as bytes, reading layer `k - 1` from the partial file at `path`.
+    """
+    path, width, height, k, start, stop = args
+    cells = width * height
+    masks = board_tables(width, height)[2]
+    b = cells - k
+    pairs = b * (b - 1)
+    out = bytearray(stop - start)
+    prev = None
+    if k > 0:
+        f = open(path, "rb")
+        prev = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        base = _HEADER.size + layer_offsets(cells, k - 1)[k - 1]
+    pos = start
+    while pos < stop:
+        r, rest = divmod(pos, pairs)
+        open_cells = unrank(r, k, cells)
+        blocked = [idx for idx in range(cells) if not open_cells >> idx & 1]
+        # rank in the layer below, and open cells below each cell, of the
+        # position left after a move to each open cell
+        children = {}
+        for x in range(cells):
+            if open_cells >> x & 1:
+                child = open_cells ^ (1 << x)
+                below = [bin(child & ((1 << c) - 1)).count("1")
+                         for c in range(cells)]
+                children[x] = (rank(child), below)
+        i, j = divmod(rest, b - 1)
+        while i < b and pos < stop:
+            own = blocked[i]
+            legal = masks[own] & open_cells
+            while j < b - 1 and pos < stop:
+                if legal:
+                    opp = blocked[j + (j >= i)]
+                    best = None
+                    moves = legal
+                    while moves:
+                        low = moves & -moves
+                        x = low.bit_length() - 1
+                        moves ^= low
+                        child_rank, below = children[x]
+                        ci = opp - below[opp]
+                        cj = x - below[x] - (opp < x)
+                        plies = prev[base + (child_rank * (b + 1) + ci) * b +
+                                     cj]
+                        if plies % 2 == 0:
+                            # the opponent loses: take the fastest win
+                            if best is None or best % 2 or plies < best:
+                                best = plies
+                        elif best is None or (best % 2 and plies > best):
+                            best = plies
+                    out[pos - start] = best + 1
+                pos += 1
+                j += 1
+            i += 1
+            j = 0
+    if prev is not None:
+        prev.close()
+        f.close()
+    return bytes(out)
+
+
+def build_tablebase(path, width, height, max_open, workers=1):
+    """Solve every position with at most `max_open` open cells on a pool of
+    `workers` processes and write the tablebase to `path`.
+
+    Returns
+    -------
+    int
+        The number of positions stored
+    """
+    cells = width * height
+    if max_open > cells - 2:
+        raise ValueError("at most {} cells can be open on a {}x{} board "
+                         "once both players have moved".format(
+                             cells - 2, width, height))
+    partial = path + ".tmp"
+    with open(partial, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, 1, width, height, max_open))
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        for k in range(max_open + 1):
+            size = layer_size(cells, k)
+            tasks = [(partial, width, height, k, start,
+                      min(start + _CHUNK, size))
+                     for start in range(0, size, _CHUNK)]
+            results = (pool.imap(_solve_range, tasks) if pool is not None
+                       else map(_solve_range, tasks))
+            with open(partial, "ab") as f:
+                for values in results:
+                    f.write(values)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    os.replace(partial, path)
+    return layer_offsets(cells, max_open)[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an Isolation " +
+        "endgame tablebase for a small board by retrograde analysis.")
+    parser.add_argument('--width', type=int, default=5,
+                        help="Width of the board.")
+    parser.add_argument('--height', type=int, default=5,
+                        help="Height of the board.")
+    parser.add_argument('-m', '--max-open', type=int, default=4,
+                        help="Largest number of open cells covered.")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Path of the tablebase file to write.")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of worker processes.")
+    args = parser.parse_args()
+    path = args.output or default_path(args.width, args.height)
+    count = build_tablebase(path, args.width, args.height, args.max_open,
+                            args.workers)
+    print("Wrote {} positions to {}".format(count, path))
@@ -10,21 +10,41 @@ The matches are fair because the board is initialized randomly for both
 players, and the players play each match twice -- once as the first player and
 once as the second player.  Randomizing the openings and switching the player
 order corrects for imbalances due to both starting position and initiative.
+
+The tournament is played on the 7x7 board unless other sizes are given, e.g.,
+`--sizes 5x5 7x7 9x9 15x15`, in which case it is played on each size in turn
+and the win rate, search depth and speed of every test agent are summarized
+by board size at the end.
 """
+import argparse
+import cProfile
 import itertools
+import json
+import math
+import multiprocessing
+import os
+import pstats
 import random
 import warnings
 
 from collections import namedtuple
+from functools import partial
 
 from isolation import Board
 from sample_players import (RandomPlayer, open_move_score,
                             improved_score, center_score)
 from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
                         custom_score_2, custom_score_3)
+from move_cache import MoveCache
+from result_store import ResultStore
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+DEFAULT_SIZE = (7, 7)  # (width, height) of the board
+
+# Modules of the board code, whose functions are counted as move generation
+# (including making and unmaking moves) in profiles
+BOARD_MODULES = ("isolation.py", "search_board.py")
 
 DESCRIPTION = """
 This script evaluates the performance of the custom_score evaluation
@@ -36,53 +56,565 @@ game_agent.py.
 
 Agent = namedtuple("Agent", ["player", "name"])
 
+# Sequential probability ratio test of H0: elo <= elo0 against H1: elo >= elo1
+# for the Elo difference of a test agent over a cpu agent, with type I and
+# type II error rates alpha and beta
+SPRT = namedtuple("SPRT", ["elo0", "elo1", "alpha", "beta"])
+
+# Each game is described by a task (player_1, player_2, opening, seed, size);
+# the players are indices into the list of agents given to the worker
+# processes, and size is the (width, height) of the board
+GameTask = namedtuple("GameTask", ["player_1", "player_2", "opening", "seed",
+                                   "size"], defaults=(DEFAULT_SIZE,))
+
+# The result of a game: winner is 0 if the first player won and 1 otherwise,
+# telemetry holds the per-move search records of each player (see
+# `game_agent.SearchStats`), or None for players that do not keep them, and
+# profiles holds the `cProfile` statistics of the moves of each player, or
+# None if the game was not profiled
+GameResult = namedtuple("GameResult", ["winner", "termination", "telemetry",
+                                       "profiles"])
+
+_worker_players = None
+
+
+def play_game(players, task, time_limit=TIME_LIMIT, profile=False):
+    """Play the game described by `task` and return its `GameResult`.
+
+    The global random number generator is seeded from the task, so a game
+    replays identically (up to search timing) in any process.
+
+    If `profile` is True, every call to `get_move()` runs under a
+    deterministic profiler (`cProfile`).  Profiling slows the agents down,
+    so they search less deeply than in a normal game.
+    """
+    random.seed(task.seed)
+    player_1, player_2 = players[task.player_1], players[task.player_2]
+    for player in (player_1, player_2):
+        if hasattr(player, "telemetry"):
+            player.telemetry = []
+    profilers = None
+    if profile:
+        profilers = [_profile_moves(player) for player in (player_1,
+                                                            player_2)]
+    game = Board(player_1, player_2, *task.size)
+    for move in task.opening:
+        game.apply_move(move)
+    try:
+        winner, _, termination = game.play(time_limit=time_limit)
+    finally:
+        profiles = None
+        if profilers is not None:
+            profiles = []
+            for player, profiler in zip((player_1, player_2), profilers):
+                del player.get_move
+                profiler.create_stats()
+                profiles.append(profiler.stats)
+            profiles = tuple(profiles)
+    telemetry = tuple(getattr(player, "telemetry", None)
+                      for player in (player_1, player_2))
+    for player in (player_1, player_2):
+        if hasattr(player, "telemetry"):
+            player.telemetry = None
+    return GameResult(int(winner is player_2), termination, telemetry,
+                      profiles)
+
+
+def _profile_moves(player):
+    """Run every call to `player.get_move()` under a new profiler, and
+    return the profiler.  Deleting the `get_move` instance attribute
+    restores the method.
+    """
+    profiler = cProfile.Profile()
+    get_move = player.get_move
+
+    def profiled(game, time_left):
+        return profiler.runcall(get_move, game, time_left)
+
+    player.get_move = profiled
+    return profiler
+
+
+def _init_worker(players, cpus, counter):
+    """Store the players in the worker process and pin the worker to its own
+    CPU so that concurrent games do not distort each other's move timing.
+
+    Workers that cannot be pinned run unpinned.
+    """
+    global _worker_players
+    _worker_players = players
+    if cpus and hasattr(os, "sched_setaffinity"):
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        try:
+            os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+        except OSError:
+            # e.g., the CPU went offline or is outside the cpuset of the
+            # worker
+            pass
+
+
+def _play_worker_game(task, profile=False):
+    return play_game(_worker_players, task, profile=profile)
+
+
+def make_pool(players, workers):
+    """Create a process pool whose workers each hold a copy of `players`."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(
+        os, "sched_getaffinity") else []
+    if cpus and workers > len(cpus):
+        warnings.warn(("{} workers share {} CPUs; concurrent games will " +
+                       "distort move timing.").format(workers, len(cpus)))
+    counter = multiprocessing.Value("i", 0)
+    return multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(players, cpus, counter))
+
+
+def round_tasks(cpu_agent, test_agents, num_matches, players, rng,
+                size=DEFAULT_SIZE):
+    """Build the game tasks of one round of "fair" matches on a board of
+    `size` (width, height).
+
+    The random opening of each match and the seed of each game are drawn from
+    `rng`, so the tasks depend only on the state of `rng`.
+    """
+    index = {id(player): i for i, player in enumerate(players)}
+    cpu = index[id(cpu_agent.player)]
+    tasks = []
+    for _ in range(num_matches):
 
-def play_round(cpu_agent, test_agents, win_counts, num_matches):
+        # initialize all games with a random move and response
+        board = Board(cpu_agent.player, test_agents[0].player, *size)
+        opening = []
+        for _ in range(2):
+            move = rng.choice(board.get_legal_moves())
+            board.apply_move(move)
+            opening.append(move)
+
+        for agent in test_agents:
+            test = index[id(agent.player)]
+            for first, second in ((cpu, test), (test, cpu)):
+                tasks.append(GameTask(first, second, tuple(opening),
+                                      rng.getrandbits(32), tuple(size)))
+    return tasks
+
+
+def submit_games(tasks, players, pool=None, profile=False, store=None):
+    """Start the games of `tasks`, in the worker processes if a pool is
+    given, and return one entry per task for `wait_games()`.
+
+    Games found in the `result_store.ResultStore` are not played again (and
+    have no telemetry or profiles), and every game played is added to the
+    store as soon as it finishes.  Without a pool, the games are played
+    before returning.
+    """
+    pending = []
+    for task in tasks:
+        key = None
+        if store is not None:
+            key = store.key(task, players)
+            stored = store.get(key)
+            if stored is not None:
+                pending.append(GameResult(stored[0], stored[1], (None, None),
+                                          None))
+                continue
+        callback = None if key is None else partial(_store_result, store, key)
+        if pool is None:
+            result = play_game(players, task, profile=profile)
+            if callback is not None:
+                callback(result)
+            pending.append(result)
+        else:
+            pending.append(pool.apply_async(_play_worker_game,
+                                            (task, profile),
+                                            callback=callback))
+    return pending
+
+
+def wait_games(pending):
+    """Return the `GameResult` of every game started by `submit_games()`."""
+    return [result if isinstance(result, GameResult) else result.get()
+            for result in pending]
+
+
+def _store_result(store, key, result):
+    store.put(key, result.winner, result.termination)
+
+
+def run_games(tasks, players, pool=None, profile=False, store=None):
+    """Play the games of `tasks`, in the worker processes if a pool is given.
+    """
+    return wait_games(submit_games(tasks, players, pool, profile, store))
+
+
+def play_round(cpu_agent, test_agents, win_counts, num_matches, pool=None,
+               rng=random, log=None):
     """Compare the test agents to the cpu agent in "fair" matches.
 
     "Fair" matches use random starting locations and force the agents to
     play as both first and second player to control for advantages resulting
     from choosing better opening moves or having first initiative to move.
+
+    If a process pool created by `make_pool()` is given, the games are played
+    in the worker processes.
     """
+    players = [cpu_agent.player] + [agent.player for agent in test_agents]
+    tasks = round_tasks(cpu_agent, test_agents, num_matches, players, rng)
+    return tally(tasks, run_games(tasks, players, pool), players, win_counts,
+                 log)
+
+
+def play_sprt_round(cpu_agent, test_agents, win_counts, max_matches, players,
+                    sprt, pool=None, rng=random, workers=1, log=None,
+                    profile=False, store=None, size=DEFAULT_SIZE):
+    """Compare the test agents to the cpu agent in "fair" matches until the
+    SPRT of each comparison is decided, or `max_matches` have been played.
+
+    With a pool, enough matches are played per batch to keep `workers`
+    processes busy.  The openings and seeds of every match are drawn for all
+    test agents and each comparison is updated match by match, ignoring the
+    games of a batch that follow its decision, so the games counted do not
+    depend on the batch size.
+
+    Returns
+    -------
+    ((int, int), dict, dict)
+        The number of timeouts and forfeits, and the number of games played
+        and the SPRT decision ("H0", "H1" or None) of each test agent
+    """
+    index = {id(player): i for i, player in enumerate(players)}
+    cpu = index[id(cpu_agent.player)]
+    games = {agent.player: 0 for agent in test_agents}
+    decisions = {agent.player: None for agent in test_agents}
     timeout_count = 0
     forfeit_count = 0
-    for _ in range(num_matches):
 
-        games = sum([[Board(cpu_agent.player, agent.player),
-                      Board(agent.player, cpu_agent.player)]
-                    for agent in test_agents], [])
+    played = 0
+    while played < max_matches and None in decisions.values():
+        active = [agent for agent in test_agents
+                  if decisions[agent.player] is None]
+        batch = 1 if pool is None else max(1, workers // (2 * len(active)))
+        batch = min(batch, max_matches - played)
+        matches = [round_tasks(cpu_agent, test_agents, 1, players, rng, size)
+                   for _ in range(batch)]
+        tasks = [task for match in matches for task in match
+                 if decisions[players[task.player_1 + task.player_2 - cpu]]
+                 is None]
+        results = dict(zip(map(id, tasks), run_games(tasks, players, pool,
+                                                     profile, store)))
+
+        for match in matches:
+            for agent in test_agents:
+                if decisions[agent.player] is not None:
+                    continue
+                test = index[id(agent.player)]
+                match_tasks = [task for task in match
+                               if test in (task.player_1, task.player_2)]
+                counts = tally(match_tasks,
+                               [results[id(task)] for task in match_tasks],
+                               players, win_counts, log)
+                timeout_count += counts[0]
+                forfeit_count += counts[1]
+                games[agent.player] += len(match_tasks)
+                wins = win_counts[agent.player]
+                llr = sprt_llr(wins, games[agent.player] - wins,
+                               sprt.elo0, sprt.elo1)
+                decisions[agent.player] = sprt_decision(llr, sprt.alpha,
+                                                        sprt.beta)
+        played += batch
+
+    return (timeout_count, forfeit_count), games, decisions
+
+
+def elo(score):
+    """Return the Elo difference corresponding to an expected score."""
+    return -400. * math.log10(1. / score - 1.)
+
+
+def elo_estimate(wins, games, z=1.96):
+    """Return the Elo difference estimated from `wins` out of `games` and
+    the half-width of its confidence interval.
+
+    The interval is computed for the score with the normal approximation
+    and mapped to the Elo scale with the delta method. The score is clamped
+    half a game away from 0 and 1 so that the estimate stays finite.
+    Returns None if no games were played.
+    """
+    if not games:
+        return None
+    score = min(max(wins / games, .5 / games), 1. - .5 / games)
+    stderr = math.sqrt(score * (1. - score) / games)
+    slope = 400. / (math.log(10) * score * (1. - score))
+    return elo(score), z * slope * stderr
 
-        # initialize all games with a random move and response
-        for _ in range(2):
-            move = random.choice(games[0].get_legal_moves())
-            for game in games:
-                game.apply_move(move)
 
-        # play all games and tally the results
-        for game in games:
-            winner, _, termination = game.play(time_limit=TIME_LIMIT)
-            win_counts[winner] += 1
+def sprt_llr(wins, losses, elo0, elo1):
+    """Return the log-likelihood ratio of H1: elo = elo1 against H0: elo = elo0
+    given the game results (Isolation games cannot be drawn).
+    """
+    p0 = 1. / (1. + 10 ** (-elo0 / 400.))
+    p1 = 1. / (1. + 10 ** (-elo1 / 400.))
+    return wins * math.log(p1 / p0) + losses * math.log((1 - p1) / (1 - p0))
 
-            if termination == "timeout":
-                timeout_count += 1
-            elif termination == "forfeit":
-                forfeit_count += 1
+
+def sprt_decision(llr, alpha, beta):
+    """Return "H1" or "H0" once the log-likelihood ratio crosses a Wald
+    bound, or None while the test is undecided.
+    """
+    if llr >= math.log((1 - beta) / alpha):
+        return "H1"
+    if llr <= math.log(beta / (1 - alpha)):
+        return "H0"
+    return None
+
+
+def tally(tasks, results, players, win_counts, log=None):
+    """Add the results of the games to `win_counts` (and to the `Telemetry`
+    log if one is given), and return the number of timeouts and forfeits.
+    """
+    timeout_count = 0
+    forfeit_count = 0
+
+    for task, result in zip(tasks, results):
+        win_counts[players[(task.player_1, task.player_2)[result.winner]]] += 1
+        if log is not None:
+            log.add(task, result)
+
+        if result.termination == "timeout":
+            timeout_count += 1
+        elif result.termination == "forfeit":
+            forfeit_count += 1
 
     return timeout_count, forfeit_count
 
 
+class Telemetry:
+    """Aggregate the per-move search records of every agent, and optionally
+    write them to a JSON lines file with one record per move.
+
+    The profiles of profiled games are merged per agent into `profiles`, a
+    dict mapping player indices to `pstats.Stats`.
+
+    Parameters
+    ----------
+    names : list
+        The name of each player index of the tournament
+
+    path : str (optional)
+        Path of the JSON lines log file
+    """
+
+    FIELDS = ["nodes", "leaves", "depth", "time", "movegen_time",
+              "eval_time"]
+
+    def __init__(self, names, path=None):
+        self.names = names
+        self.games = 0
+        self.totals = {}
+        self.profiles = {}
+        self._file = open(path, "w") if path is not None else None
+
+    def add(self, task, result):
+        """Add the records (and the profiles) of one game."""
+        self.games += 1
+        players = (task.player_1, task.player_2)
+        for seat, stats in enumerate(result.profiles or ()):
+            if not stats:
+                # the player never moved (e.g., its opponent timed out on
+                # the first move), and `pstats` rejects empty statistics
+                continue
+            profile = _Profile(stats)
+            if players[seat] in self.profiles:
+                self.profiles[players[seat]].add(profile)
+            else:
+                self.profiles[players[seat]] = pstats.Stats(profile)
+        for seat, records in enumerate(result.telemetry):
+            for ply, record in enumerate(records or ()):
+                self._count(players[seat], record)
+                if self._file is not None:
+                    line = dict(record, agent=self.names[players[seat]],
+                                opponent=self.names[players[1 - seat]],
+                                seat=seat + 1, seed=task.seed, ply=ply,
+                                size="{}x{}".format(*task.size))
+                    self._file.write(json.dumps(line) + "\n")
+
+    def _count(self, player, record):
+        totals = self.totals.setdefault(player, dict.fromkeys(
+            self.FIELDS + ["moves", "searched", "cached", "timeouts",
+                           "branching_factor"], 0))
+        totals["moves"] += 1
+        totals["cached"] += record["source"] == "cache"
+        if record["source"] != "search":
+            return
+        totals["searched"] += 1
+        totals["timeouts"] += record["timeout"]
+        totals["branching_factor"] += record["branching_factor"] or 0
+        for field in self.FIELDS:
+            totals[field] += record[field]
+
+    def summary(self):
+        """Return per-agent averages over the searched moves, as a dict
+        mapping player indices to dicts.
+        """
+        summaries = {}
+        for player, totals in sorted(self.totals.items()):
+            searched = max(1, totals["searched"])
+            summary = {field: totals[field] / searched
+                       for field in self.FIELDS + ["branching_factor"]}
+            summary["moves"] = totals["moves"]
+            summary["searched"] = totals["searched"]
+            summary["cached"] = totals["cached"]
+            summary["timeouts"] = totals["timeouts"]
+            summary["nodes_per_second"] = (
+                totals["nodes"] / totals["time"] if totals["time"] else 0.)
+            summaries[player] = summary
+        return summaries
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class _Profile:
+    """Profile statistics received from another process, in the form that
+    `pstats.Stats` loads.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _function_key(fn):
+    """Return the `pstats` key (file, line, name) of a Python function, or
+    None if `fn` has no code object.
+    """
+    while isinstance(fn, partial):
+        fn = fn.func
+    code = getattr(getattr(fn, "__func__", fn), "__code__", None)
+    if code is None:
+        return None
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def profile_summary(stats, player):
+    """Split the profiled time of the moves of `player` into move
+    generation, score function and search overhead.
+
+    Score time is the cumulative time of `player.score`, including the board
+    code it calls.  Move generation time is the internal time of the
+    functions of `BOARD_MODULES`, less the time of their calls from the
+    score function and from the functions only the score function calls.
+    The rest is search overhead.
+
+    Parameters
+    ----------
+    stats : `pstats.Stats`
+        The merged profile of the moves of `player`
+
+    Returns
+    -------
+    dict
+        The number of moves, and the total, move generation, score and
+        search time in seconds
+    """
+    entries = stats.stats
+    score_key = _function_key(getattr(player, "score", None))
+    inner = {score_key} if score_key in entries else set()
+    changed = True
+    while changed:
+        changed = False
+        for func, (_, _, _, _, callers) in entries.items():
+            if func not in inner and callers and set(callers) <= inner:
+                inner.add(func)
+                changed = True
+    score = entries[score_key][3] if score_key in entries else 0.
+    movegen = 0.
+    for func, (_, _, tt, _, callers) in entries.items():
+        if os.path.basename(func[0]) in BOARD_MODULES and func not in inner:
+            movegen += tt - sum(edge[2] for caller, edge in callers.items()
+                                if caller in inner)
+    move_key = _function_key(type(player).get_move)
+    return {
+        "moves": entries[move_key][0] if move_key in entries else 0,
+        "total": stats.total_tt,
+        "movegen": movegen,
+        "score": score,
+        "search": max(stats.total_tt - movegen - score, 0.),
+    }
+
+
 def update(total_wins, wins):
     for player in total_wins:
         total_wins[player] += wins[player]
     return total_wins
 
 
-def play_matches(cpu_agents, test_agents, num_matches):
-    """Play matches between the test agent and each cpu_agent individually. """
+def play_matches(cpu_agents, test_agents, num_matches, workers=1, seed=None,
+                 sprt=None, log_path=None, profile_dir=None,
+                 results_path=None, size=DEFAULT_SIZE):
+    """Play matches between the test agent and each cpu_agent individually
+    on a board of `size` (width, height).
+
+    With more than one worker, all games are sent to a pool of worker
+    processes.  The openings and per-game seeds are drawn from a generator
+    seeded with `seed`, so the games played do not depend on the number of
+    workers.
+
+    If an `SPRT` is given, each comparison of a test agent with a cpu agent
+    stops as soon as the test is decided, and `num_matches` is the maximum
+    number of matches of a comparison.
+
+    The search telemetry of the agents is summarized at the end, and every
+    per-move record is written to the JSON lines file `log_path` if given.
+
+    If `profile_dir` is given, the moves of every game are profiled, and the
+    merged profile of each agent is summarized and written to a `pstats`
+    file in that directory.
+
+    If `results_path` is given, the result of every game is kept in a
+    `result_store.ResultStore` there as soon as it finishes, and the games
+    already in the store are counted without being played again, so an
+    interrupted tournament is resumed by running it again with the same
+    `seed`.
+
+    Returns
+    -------
+    dict
+        The win rate ("win_rate") and the average search depth and speed
+        ("depth" and "nodes_per_second", None for agents that keep no
+        telemetry) of each test agent player
+    """
+    rng = random.Random(seed)
+    players = ([agent.player for agent in cpu_agents] +
+               [agent.player for agent in test_agents])
+    log = Telemetry([agent.name for agent in cpu_agents + test_agents],
+                    log_path)
+    pool = make_pool(players, workers) if workers > 1 else None
+    profile = profile_dir is not None
+    store = (ResultStore(results_path, TIME_LIMIT) if results_path is not None
+             else None)
+
+    # draw the tasks of every round up front so that all rounds are
+    # queued on the pool at once
+    rounds = []
+    for agent in cpu_agents if sprt is None else []:
+        tasks = round_tasks(agent, test_agents, num_matches, players, rng,
+                            size)
+        if pool is None:
+            rounds.append((tasks, None))
+        else:
+            rounds.append((tasks, submit_games(tasks, players, pool, profile,
+                                               store)))
+
     total_wins = {agent.player: 0 for agent in test_agents}
+    total_games = {agent.player: 0 for agent in test_agents}
     total_timeouts = 0.
     total_forfeits = 0.
-    total_matches = 2 * num_matches * len(cpu_agents)
+    decisions = []
 
     print("\n{:^9}{:^13}".format("Match #", "Opponent") + ''.join(['{:^13}'.format(x[1].name) for x in enumerate(test_agents)]))
     print("{:^9}{:^13} ".format("", "") +  ' '.join(['{:^5}| {:^5}'.format("Won", "Lost") for x in enumerate(test_agents)]))
@@ -93,12 +625,24 @@ def play_matches(cpu_agents, test_agents, num_matches):
 
         print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
 
-        counts = play_round(agent, test_agents, wins, num_matches)
+        if sprt is None:
+            tasks, pending = rounds[idx]
+            results = (run_games(tasks, players, profile=profile,
+                                 store=store)
+                       if pending is None else wait_games(pending))
+            counts = tally(tasks, results, players, wins, log)
+            games = {key: 2 * num_matches for (key, value) in test_agents}
+        else:
+            counts, games, round_decisions = play_sprt_round(
+                agent, test_agents, wins, num_matches, players, sprt, pool,
+                rng, workers, log, profile, store, size)
+            decisions.append((agent, round_decisions, games))
         total_timeouts += counts[0]
         total_forfeits += counts[1]
         total_wins = update(total_wins, wins)
-        _total = 2 * num_matches
-        round_totals = sum([[wins[agent.player], _total - wins[agent.player]]
+        total_games = update(total_games, games)
+        round_totals = sum([[wins[agent.player],
+                             games[agent.player] - wins[agent.player]]
                             for agent in test_agents], [])
         print(' ' + ' '.join([
             '{:^5}| {:^5}'.format(
@@ -110,10 +654,23 @@ def play_matches(cpu_agents, test_agents, num_matches):
     print('{:^9}{:^13}'.format("", "Win Rate:") +
         ''.join([
             '{:^13}'.format(
-                "{:.1f}%".format(100 * total_wins[x[1].player] / total_matches)
+                "{:.1f}%".format(100 * total_wins[x[1].player] / total_games[x[1].player])
+                if total_games[x[1].player] else "--"
             ) for x in enumerate(test_agents)
     ]))
 
+    print_ratings(test_agents, total_wins, total_games)
+    if sprt is not None:
+        print_sprt(test_agents, decisions, sprt)
+    print_telemetry(cpu_agents, test_agents, log)
+    summaries = log.summary()
+    if store is not None:
+        print("\n{} games were read from the result store {}.".format(
+            store.hits, results_path))
+    if profile:
+        print_profiles(cpu_agents, test_agents, log, profile_dir)
+    log.close()
+
     if total_timeouts:
         print(("\nThere were {} timeouts during the tournament -- make sure " +
                "your agent handles search timeout correctly, and consider " +
@@ -123,35 +680,255 @@ def play_matches(cpu_agents, test_agents, num_matches):
         print(("\nYour ID search forfeited {} games while there were still " +
                "legal moves available to play.\n").format(total_forfeits))
 
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    scaling = {}
+    for index, agent in enumerate(test_agents, len(cpu_agents)):
+        summary = summaries.get(index, {})
+        scaling[agent.player] = {
+            "win_rate": (total_wins[agent.player] / total_games[agent.player]
+                         if total_games[agent.player] else None),
+            "depth": summary.get("depth"),
+            "nodes_per_second": summary.get("nodes_per_second"),
+        }
+    return scaling
+
+
+def print_ratings(test_agents, total_wins, total_games):
+    """Print the Elo rating of each test agent against the pool of cpu agents
+    and its Elo difference from the first test agent, with 95% confidence
+    intervals.
+
+    The test agents play the same openings against the same opponents, so
+    the difference of their performance ratings against the pool estimates
+    their Elo difference.  Agents without games are shown as "--".
+    """
+    estimates = [elo_estimate(total_wins[agent.player],
+                              total_games[agent.player])
+                 for agent in test_agents]
+    print('{:^9}{:^13}'.format("", "Elo:") + ''.join([
+        '{:^13}'.format("--" if estimate is None else
+                        "{:+.0f} +/- {:.0f}".format(*estimate))
+        for estimate in estimates]))
+    base = estimates[0]
+    print('{:^9}{:^13}'.format("", "Elo Diff:") + '{:^13}'.format("--") +
+        ''.join([
+            '{:^13}'.format("--" if base is None or estimate is None else
+                            "{:+.0f} +/- {:.0f}".format(
+                                estimate[0] - base[0],
+                                math.hypot(estimate[1], base[1]))
+            ) for estimate in estimates[1:]
+    ]))
+
+
+def print_telemetry(cpu_agents, test_agents, log):
+    """Print the average search statistics per searched move of every agent
+    that records them.
+    """
+    summaries = log.summary()
+    if not summaries:
+        return
+    print(("\n{:<14}{:<6}{:>7}{:>7}{:>10}{:>8}{:>7}{:>6}{:>7}{:>7}" +
+           "{:>7}").format(
+        "Agent", "Role", "Moves", "Cached", "Nodes", "kN/s", "Depth", "EBF",
+        "Eval", "Movgen", "Abort"))
+    agents = [(agent, "cpu") for agent in cpu_agents] + [
+        (agent, "test") for agent in test_agents]
+    for index, summary in summaries.items():
+        agent, role = agents[index]
+        time = summary["time"] or 1.
+        print(("{:<14}{:<6}{:>7}{:>7}{:>10.0f}{:>8.1f}{:>7.1f}{:>6.2f}" +
+               "{:>6.0f}%{:>6.0f}%{:>7}").format(
+            agent.name, role, summary["moves"], summary["cached"],
+            summary["nodes"],
+            summary["nodes_per_second"] / 1000., summary["depth"],
+            summary["branching_factor"], 100 * summary["eval_time"] / time,
+            100 * summary["movegen_time"] / time, summary["timeouts"]))
+
+
+def print_profiles(cpu_agents, test_agents, log, directory):
+    """Write the merged profile of every agent to a `pstats` file in
+    `directory`, and print how its move time splits between move
+    generation, the score function and the rest of the search.
+    """
+    os.makedirs(directory, exist_ok=True)
+    print(("\n{:<14}{:<6}{:>7}{:>9}{:>8}{:>8}{:>8}  {}").format(
+        "Agent", "Role", "Moves", "ms/move", "Movgen", "Score", "Search",
+        "Profile"))
+    agents = [(agent, "cpu") for agent in cpu_agents] + [
+        (agent, "test") for agent in test_agents]
+    for index, stats in sorted(log.profiles.items()):
+        agent, role = agents[index]
+        path = os.path.join(directory, "{}_{}.prof".format(role, agent.name))
+        stats.dump_stats(path)
+        summary = profile_summary(stats, agent.player)
+        total = summary["total"] or 1.
+        print(("{:<14}{:<6}{:>7}{:>9.1f}{:>7.0f}%{:>7.0f}%{:>7.0f}%" +
+               "  {}").format(
+            agent.name, role, summary["moves"],
+            1000 * summary["total"] / max(1, summary["moves"]),
+            100 * summary["movegen"] / total, 100 * summary["score"] / total,
+            100 * summary["search"] / total, path))
+
+
+def print_sprt(test_agents, decisions, sprt):
+    """Print the SPRT decision and number of games of every comparison."""
+    print("\nSPRT H0: elo <= {} vs H1: elo >= {} (alpha={}, beta={})".format(
+        sprt.elo0, sprt.elo1, sprt.alpha, sprt.beta))
+    for agent, round_decisions, games in decisions:
+        print('{:^9}{:^13}'.format("", agent.name) + ''.join([
+            '{:^13}'.format("{} ({})".format(
+                round_decisions[test.player] or "-", games[test.player]))
+            for test in test_agents]))
+
+
+def print_size_matrix(test_agents, sizes, scaling):
+    """Print the win rate, average search depth and search speed of every
+    test agent on every board size, from the `play_matches()` results in
+    `scaling` (one per size).
+    """
+    print("\n{:^74}".format("*************************"))
+    print("{:^74}".format("Board Size Matrix"))
+    print("{:^74}".format("*************************"))
+    print("\n{:<14}{:<10}".format("Agent", "") + ''.join(
+        '{:>10}'.format("{}x{}".format(*size)) for size in sizes))
+    rows = [("Win Rate", "win_rate", "{:.1f}%", 100.),
+            ("Depth", "depth", "{:.1f}", 1.),
+            ("kN/s", "nodes_per_second", "{:.1f}", .001)]
+    for agent in test_agents:
+        for label, field, fmt, scale in rows:
+            values = [results[agent.player][field] for results in scaling]
+            print("{:<14}{:<10}".format(agent.name, label) + ''.join(
+                '{:>10}'.format("--" if value is None else
+                                fmt.format(scale * value))
+                for value in values))
+
+
+def size_path(path, size):
+    """Return the path of the per-size copy of an output file or directory
+    (e.g., `telemetry_9x9.jsonl` for `telemetry.jsonl`).
+    """
+    root, ext = os.path.splitext(path)
+    return "{}_{}x{}{}".format(root, size[0], size[1], ext)
+
 
-def main():
+def parse_size(text):
+    """Parse a board size given as "WxH" (or "N" for a square board) into a
+    (width, height) tuple.
+    """
+    try:
+        size = tuple(int(part) for part in text.lower().split("x"))
+    except ValueError:
+        size = ()
+    if len(size) == 1:
+        size *= 2
+    if len(size) != 2 or min(size) < 3:
+        raise argparse.ArgumentTypeError(
+            "invalid board size {!r}: expected WxH with W, H >= 3".format(
+                text))
+    return size
+
+
+def main(workers=1, seed=None, num_matches=NUM_MATCHES, sprt=None,
+         log_path=None, move_cache_path=None, profile_dir=None,
+         results_path=None, sizes=(DEFAULT_SIZE,)):
 
     # Define two agents to compare -- these agents will play from the same
     # starting position against the same adversaries in the tournament
     test_agents = [
-        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score), "AB_Custom"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score_2), "AB_Custom_2"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score_3), "AB_Custom_3")
+        Agent(AlphaBetaPlayer(score_fn=improved_score, in_place=True), "AB_Improved"),
+        Agent(AlphaBetaPlayer(score_fn=custom_score, in_place=True), "AB_Custom"),
+        Agent(AlphaBetaPlayer(score_fn=custom_score_2, in_place=True), "AB_Custom_2"),
+        Agent(AlphaBetaPlayer(score_fn=custom_score_3, in_place=True), "AB_Custom_3")
     ]
 
     # Define a collection of agents to compete against the test agents
     cpu_agents = [
         Agent(RandomPlayer(), "Random"),
-        Agent(MinimaxPlayer(score_fn=open_move_score), "MM_Open"),
-        Agent(MinimaxPlayer(score_fn=center_score), "MM_Center"),
-        Agent(MinimaxPlayer(score_fn=improved_score), "MM_Improved"),
-        Agent(AlphaBetaPlayer(score_fn=open_move_score), "AB_Open"),
-        Agent(AlphaBetaPlayer(score_fn=center_score), "AB_Center"),
-        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved")
+        Agent(MinimaxPlayer(score_fn=open_move_score, in_place=True), "MM_Open"),
+        Agent(MinimaxPlayer(score_fn=center_score, in_place=True), "MM_Center"),
+        Agent(MinimaxPlayer(score_fn=improved_score, in_place=True), "MM_Improved"),
+        Agent(AlphaBetaPlayer(score_fn=open_move_score, in_place=True), "AB_Open"),
+        Agent(AlphaBetaPlayer(score_fn=center_score, in_place=True), "AB_Center"),
+        Agent(AlphaBetaPlayer(score_fn=improved_score, in_place=True), "AB_Improved")
     ]
 
+    # Fixed-depth minimax agents choose the same move every time they meet
+    # a position, so their moves can be reused across games and runs
+    if move_cache_path is not None:
+        cache = MoveCache(move_cache_path)
+        cache.compact()
+        for agent in cpu_agents + test_agents:
+            if isinstance(agent.player, MinimaxPlayer):
+                agent.player.move_cache = cache
+
     print(DESCRIPTION)
-    print("{:^74}".format("*************************"))
-    print("{:^74}".format("Playing Matches"))
-    print("{:^74}".format("*************************"))
-    play_matches(cpu_agents, test_agents, NUM_MATCHES)
+    scaling = []
+    for size in sizes:
+        print("{:^74}".format("*************************"))
+        print("{:^74}".format("Playing Matches" if len(sizes) == 1 else
+                              "Playing Matches on {}x{}".format(*size)))
+        print("{:^74}".format("*************************"))
+        # every size writes its own telemetry log and profiles, while the
+        # result store keys the games by board size
+        paths = [path if path is None or len(sizes) == 1 else
+                 size_path(path, size) for path in (log_path, profile_dir)]
+        scaling.append(play_matches(cpu_agents, test_agents, num_matches,
+                                    workers, seed, sprt, paths[0], paths[1],
+                                    results_path, size))
+    if len(sizes) > 1:
+        print_size_matrix(test_agents, sizes, scaling)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Evaluate the custom " +
+        "heuristics in a round-robin tournament against baseline agents.")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Number of worker processes used to play games " +
+                        "in parallel; each worker is pinned to its own CPU.")
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        help="Seed for the openings and per-game random " +
+                        "number generators, for reproducible tournaments.")
+    parser.add_argument('-n', '--matches', type=int, default=NUM_MATCHES,
+                        help="Number of matches against each opponent; the " +
+                        "maximum number of matches in SPRT mode.")
+    parser.add_argument('--sprt', action="store_true",
+                        help="Stop each comparison as soon as a sequential " +
+                        "probability ratio test decides it.")
+    parser.add_argument('--elo0', type=float, default=0.,
+                        help="Elo difference under the SPRT null hypothesis.")
+    parser.add_argument('--elo1', type=float, default=100.,
+                        help="Elo difference under the SPRT alternative.")
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help="SPRT type I error rate.")
+    parser.add_argument('--beta', type=float, default=0.05,
+                        help="SPRT type II error rate.")
+    parser.add_argument('--log', default=None,
+                        help="Path of a JSON lines file to write the search " +
+                        "telemetry of every move to.")
+    parser.add_argument('--move-cache', default=None,
+                        help="Path of a file caching the moves of the " +
+                        "fixed-depth minimax agents across games and runs.")
+    parser.add_argument('--profile', nargs="?", const="profiles",
+                        default=None, metavar="DIR",
+                        help="Profile every move, and write the merged " +
+                        "profile of each agent to a pstats file in DIR " +
+                        "(default: profiles).")
+    parser.add_argument('--results', default=None,
+                        help="Path of a JSON lines file storing the result " +
+                        "of every game; games already stored are not " +
+                        "played again (requires --seed to resume).")
+    parser.add_argument('--sizes', nargs="+", type=parse_size,
+                        default=[DEFAULT_SIZE], metavar="WxH",
+                        help="Board sizes to play the tournament on, e.g. " +
+                        "5x5 7x7 9x9 15x15; with several sizes, a matrix of " +
+                        "the results of each agent by size is printed.")
+    args = parser.parse_args()
+    if args.results is not None and args.seed is None:
+        parser.error("--results requires --seed")
+    sprt = SPRT(args.elo0, args.elo1, args.alpha, args.beta) if (
+        args.sprt) else None
+    main(args.workers, args.seed, args.matches, sprt, args.log,
+         args.move_cache, args.profile, args.results, args.sizes)
@@ -0,0 +1,100 @@
+"""Transposition table for the alpha-beta search agents.
+
+Each entry is two 64-bit words: the packed search result, and the Zobrist key
+of the position XORed with the packed result.  A reader accepts an entry only
+if the two words XOR back to the key it is probing, so a torn entry written
+concurrently by another process is seen as a miss rather than returned as
+corrupt data, and the table can be shared between processes without locks.
+
+The table lives either in a private buffer or in a named
+`multiprocessing.shared_memory` block that other processes can attach to.
+"""
+import struct
+
+EXACT, LOWER, UPPER = 0, 1, 2
+NO_MOVE = 0xFFFF  # cell indices are 16 bits, for boards of up to 65535 cells
+
+_MASK = (1 << 64) - 1
+_FLOAT = struct.Struct("<f")
+_BITS = struct.Struct("<I")
+
+
+def _pack(depth, flag, move, score):
+    bits = _BITS.unpack(_FLOAT.pack(score))[0]
+    return depth | flag << 8 | move << 10 | bits << 26
+
+
+def _unpack(data):
+    score = _FLOAT.unpack(_BITS.pack(data >> 26 & 0xFFFFFFFF))[0]
+    return data & 0xFF, data >> 8 & 0x3, data >> 10 & 0xFFFF, score
+
+
+class TranspositionTable:
+    """Fixed-size, always-replace transposition table.
+
+    Parameters
+    ----------
+    size : int (optional)
+        Number of entries; rounded down to a power of two
+
+    name : str (optional)
+        Name of an existing shared memory block to attach to
+
+    shared : bool (optional)
+        If True (and `name` is None), the table is created in a new shared
+        memory block that other processes can attach to by `name`
+    """
+
+    ENTRY_SIZE = 16
+
+    def __init__(self, size=1 << 18, name=None, shared=False):
+        self.size = 1 << (size.bit_length() - 1)
+        self.hits = 0
+        self.probes = 0
+        self._shm = None
+        if name is not None or shared:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=name is None,
+                size=self.size * self.ENTRY_SIZE)
+            buf = self._shm.buf
+        else:
+            buf = bytearray(self.size * self.ENTRY_SIZE)
+        self.name = None if self._shm is None else self._shm.name
+        self._words = memoryview(buf).cast("Q")
+        self._index_mask = self.size - 1
+
+    def probe(self, key):
+        """Return (depth, flag, move, score) stored for `key`, or None.
+
+        `move` is a cell index, or NO_MOVE if no move was stored.
+        """
+        self.probes += 1
+        slot = 2 * (key & self._index_mask)
+        words = self._words
+        data = words[slot + 1]
+        if words[slot] ^ data != key:
+            return None
+        self.hits += 1
+        return _unpack(data)
+
+    def store(self, key, depth, flag, score, move=NO_MOVE):
+        """Store a search result for `key`, replacing the previous entry."""
+        slot = 2 * (key & self._index_mask)
+        data = _pack(min(depth, 0xFF), flag, move, score)
+        words = self._words
+        words[slot + 1] = data
+        words[slot] = (key ^ data) & _MASK
+
+    def clear(self):
+        self._words.cast("B")[:] = bytes(self.size * self.ENTRY_SIZE)
+
+    def close(self, unlink=False):
+        """Release the table; `unlink` also destroys the shared memory block
+        (only the creating process should do this).
+        """
+        self._words.release()
+        if self._shm is not None:
+            self._shm.close()
+            if unlink:
+                self._shm.unlink()
@@ -0,0 +1,249 @@
+"""Tune the parameter vectors of the custom score functions with SPSA.
+
+Simultaneous perturbation stochastic approximation estimates the gradient of
+the playing strength from games between two agents whose parameters differ
+by a random perturbation of every parameter at once, so each iteration costs
+the same number of games however many parameters are tuned:
+
+  - draw a perturbation `delta` with entries +1 or -1
+  - play "fair" matches (see `tournament.play_round()`) between agents using
+    `params + c_k * delta` and `params - c_k * delta`
+  - move the parameters by `a_k * score / (2 * c_k) * delta`, where `score`
+    is the difference of the two agents' win rates
+
+The gains `a_k` and `c_k` decay with the iteration `k` as recommended by
+Spall.  Parameters are tuned in coordinates normalized to [0, 1] over their
+bounds in `TUNABLE`, so a single pair of gains suits all of them.
+
+The games of an iteration are played in parallel on a process pool; with
+`--perturbations` greater than 1, the gradient is averaged over several
+independent perturbations played in the same batch.  The parameter estimate
+is checkpointed to a JSON file after every iteration, and an existing
+checkpoint is resumed:
+
+    python tune.py custom_score_2 -o custom_score_2.json -i 200 -w 8
+
+The fitted vector can then be set as the default in `game_agent.py` (e.g.,
+`CUSTOM_SCORE_2_PARAMS`).
+"""
+import argparse
+import json
+import os
+import random
+
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+import tournament
+
+from game_agent import (AlphaBetaPlayer, custom_score, custom_score_2,
+                        custom_score_3, territory_score, CUSTOM_SCORE_PARAMS,
+                        CUSTOM_SCORE_2_PARAMS, CUSTOM_SCORE_3_PARAMS,
+                        TERRITORY_SCORE_PARAMS)
+from tournament import Agent, TIME_LIMIT, play_game, round_tasks
+
+# A score function with its parameter names, default vector and the
+# (lower, upper) bounds of each parameter
+Tunable = namedtuple("Tunable", ["score_fn", "names", "default", "bounds"])
+
+TUNABLE = OrderedDict([
+    ("custom_score", Tunable(custom_score, ["own_weight", "opp_weight"],
+                             CUSTOM_SCORE_PARAMS, [(.1, 4.), (.1, 4.)])),
+    ("custom_score_2", Tunable(custom_score_2, ["own_weight", "opp_weight"],
+                               CUSTOM_SCORE_2_PARAMS, [(.1, 4.), (.1, 4.)])),
+    ("custom_score_3", Tunable(custom_score_3,
+                               ["distance_weight", "mobility_weight"],
+                               CUSTOM_SCORE_3_PARAMS, [(-2., 2.), (-2., 2.)])),
+    ("territory_score", Tunable(territory_score,
+                                ["territory_weight", "mobility_weight"],
+                                TERRITORY_SCORE_PARAMS, [(0., 4.), (-2., 2.)])),
+])
+
+# Exponents of the gain sequences recommended by Spall (1998)
+ALPHA = .602
+GAMMA = .101
+
+
+def gains(k, a, c, stability):
+    """Return the step size and perturbation size of iteration `k`."""
+    return a / (k + 1 + stability) ** ALPHA, c / (k + 1) ** GAMMA
+
+
+def to_unit(params, bounds):
+    return [(p - lo) / (hi - lo) for p, (lo, hi) in zip(params, bounds)]
+
+
+def from_unit(x, bounds):
+    return [lo + min(max(v, 0.), 1.) * (hi - lo) for v, (lo, hi) in
+            zip(x, bounds)]
+
+
+def iteration_tasks(k, num_params, matches, perturbations, seed=0):
+    """Draw the perturbations and the game tasks of iteration `k`.
+
+    The draws depend only on `seed` and `k`, so an iteration replays
+    identically when a run is resumed.  Player indices 2j and 2j + 1 of the
+    tasks are the positive and negative side of perturbation j.
+
+    Returns
+    -------
+    (list, list)
+        The perturbation vectors and the `tournament.GameTask` of every game
+    """
+    rng = random.Random(seed << 32 | k)
+    deltas = []
+    tasks = []
+    for j in range(perturbations):
+        deltas.append([rng.choice((-1, 1)) for _ in range(num_params)])
+        plus, minus = Agent("plus", "plus"), Agent("minus", "minus")
+        for task in round_tasks(plus, [minus], matches,
+                                [plus.player, minus.player], rng):
+            tasks.append(task._replace(player_1=task.player_1 + 2 * j,
+                                       player_2=task.player_2 + 2 * j))
+    return deltas, tasks
+
+
+def make_player(name, params):
+    """Return an alpha-beta agent scoring with `params` for function `name`.
+    """
+    score_fn = partial(TUNABLE[name].score_fn, params=tuple(params))
+    return AlphaBetaPlayer(score_fn=score_fn, in_place=True)
+
+
+def _play_task(args):
+    """Play one game between two parameter vectors; return 1 if the agent
+    at the even player index won and 0 otherwise.
+    """
+    name, params, task, time_limit = args
+    players = {task.player_1: make_player(name, params[task.player_1]),
+               task.player_2: make_player(name, params[task.player_2])}
+    result = play_game(players, task, time_limit)
+    return int((task.player_1, task.player_2)[result.winner] % 2 == 0)
+
+
+def load_checkpoint(path, name):
+    """Return the checkpoint stored at `path`, or a new one for function
+    `name` starting from its default parameters.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f, object_pairs_hook=OrderedDict)
+        if checkpoint["function"] != name:
+            raise ValueError("{} is a checkpoint of {}, not {}".format(
+                path, checkpoint["function"], name))
+        return checkpoint
+    tunable = TUNABLE[name]
+    return OrderedDict([
+        ("function", name),
+        ("names", tunable.names),
+        ("iteration", 0),
+        ("params", list(tunable.default)),
+        ("history", []),
+    ])
+
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint through a temporary file, so that an interrupted
+    write never destroys the previous one.
+    """
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def tune(name, path, iterations, matches=4, perturbations=1, workers=1,
+         seed=0, a=.1, c=.1, stability=None, time_limit=TIME_LIMIT):
+    """Run SPSA on score function `name` until `iterations` iterations are
+    checkpointed at `path`, and return the final checkpoint.
+
+    Parameters
+    ----------
+    matches : int (optional)
+        Number of "fair" matches (two games each) per perturbation
+
+    a, c : float (optional)
+        Initial step size and perturbation size in normalized coordinates
+
+    stability : float (optional)
+        Offset of the step size decay; 10% of `iterations` by default
+    """
+    tunable = TUNABLE[name]
+    bounds = tunable.bounds
+    if stability is None:
+        stability = .1 * iterations
+    checkpoint = load_checkpoint(path, name)
+    x = to_unit(checkpoint["params"], bounds)
+    pool = tournament.make_pool([], workers) if workers > 1 else None
+    try:
+        for k in range(checkpoint["iteration"], iterations):
+            a_k, c_k = gains(k, a, c, stability)
+            deltas, tasks = iteration_tasks(k, len(x), matches, perturbations,
+                                            seed)
+            params = []
+            for delta in deltas:
+                for sign in (1, -1):
+                    params.append(from_unit(
+                        [v + sign * c_k * d for v, d in zip(x, delta)],
+                        bounds))
+            jobs = [(name, params, task, time_limit) for task in tasks]
+            wins = (pool.map(_play_task, jobs) if pool is not None else
+                    [_play_task(job) for job in jobs])
+
+            games = 2 * matches
+            scores = [2. * sum(wins[j * games:(j + 1) * games]) / games - 1.
+                      for j in range(perturbations)]
+            for i in range(len(x)):
+                gradient = sum(score * delta[i] for score, delta in
+                               zip(scores, deltas)) / (2 * c_k * perturbations)
+                x[i] = min(max(x[i] + a_k * gradient, 0.), 1.)
+
+            checkpoint["iteration"] = k + 1
+            checkpoint["params"] = from_unit(x, bounds)
+            checkpoint["history"].append(OrderedDict([
+                ("iteration", k + 1),
+                ("params", checkpoint["params"]),
+                ("score", sum(scores) / perturbations),
+                ("games", len(tasks)),
+            ]))
+            save_checkpoint(path, checkpoint)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the parameters of " +
+        "a custom score function with SPSA over self-play matches.")
+    parser.add_argument('function', choices=list(TUNABLE),
+                        help="Score function to tune.")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Path of the JSON checkpoint; an existing " +
+                        "checkpoint is resumed.")
+    parser.add_argument('-i', '--iterations', type=int, default=100,
+                        help="Total number of SPSA iterations.")
+    parser.add_argument('-m', '--matches', type=int, default=4,
+                        help="Number of fair matches per perturbation.")
+    parser.add_argument('-p', '--perturbations', type=int, default=1,
+                        help="Number of perturbations averaged per " +
+                        "iteration.")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Number of worker processes used to play games " +
+                        "in parallel; each worker is pinned to its own CPU.")
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help="Seed for the perturbations and openings.")
+    parser.add_argument('-a', type=float, default=.1,
+                        help="Initial SPSA step size.")
+    parser.add_argument('-c', type=float, default=.1,
+                        help="Initial SPSA perturbation size.")
+    parser.add_argument('-t', '--time', type=int, default=TIME_LIMIT,
+                        help="Time limit per move in milliseconds.")
+    args = parser.parse_args()
+    checkpoint = tune(args.function, args.output, args.iterations,
+                      args.matches, args.perturbations, args.workers,
+                      args.seed, args.a, args.c, time_limit=args.time)
+    print("{} after {} iterations:".format(checkpoint["function"],
+                                           checkpoint["iteration"]))
+    for name, value in zip(checkpoint["names"], checkpoint["params"]):
+        print("  {:<16}{:.4f}".format(name, value))
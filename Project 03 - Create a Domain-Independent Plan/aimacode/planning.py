@@ -64,3 +64,60 @@ class Action:
         # add positive literals
         for clause in self.effect_add:
             kb.tell(self.substitute(clause, args))
+
+
+class STRIPSTask:
+    """
+    Ground planning task compiled to bitsets
+    Fluents are numbered once, in the order given, and a state is an int
+    whose bit i is set if fluent i is true. Each ground Action is compiled to
+    masks of its positive and negative preconditions and of its add and
+    delete effects, so that search only does integer operations:
+    applicable:  state & pre == pre and not state & pre_neg
+    successor:   (state & ~delete) | add
+    goal:        state & goal == goal
+    Example:
+    task = STRIPSTask([expr("Have(Cake)"), expr("Eaten(Cake)")], [eat, bake], [expr("Eaten(Cake)")])
+    task.actions(task.state([expr("Have(Cake)")]))  # [eat]
+    """
+
+    def __init__(self, fluents, actions, goal):
+        self.fluents = list(fluents)
+        self.index = {fluent: i for i, fluent in enumerate(self.fluents)}
+        self.actions_list = list(actions)
+        self.goal = self.state(goal)
+        self.operators = {}
+        self.preconds = []
+        for action in self.actions_list:
+            self.operators[action] = self.compile(action)
+            self.preconds.append(self.operators[action][:2] + (action,))
+
+    def state(self, fluents):
+        """Returns the bitset of the given fluents"""
+        mask = 0
+        for fluent in fluents:
+            if fluent not in self.index:
+                raise ValueError("unknown fluent {}".format(fluent))
+            mask |= 1 << self.index[fluent]
+        return mask
+
+    def compile(self, action):
+        """Returns the (pre, pre_neg, add, delete) masks of a ground action"""
+        return (self.state(action.precond_pos), self.state(action.precond_neg),
+                self.state(action.effect_add), self.state(action.effect_rem))
+
+    def actions(self, state):
+        """Returns the actions applicable in the state, in the task's order"""
+        return [action for pre, pre_neg, action in self.preconds
+                if state & pre == pre and not state & pre_neg]
+
+    def result(self, state, action):
+        """Returns the state that results from applying the action; actions
+        that are not part of the task are compiled on the fly"""
+        operator = self.operators.get(action)
+        if operator is None:
+            operator = self.compile(action)
+        return (state & ~operator[3]) | operator[2]
+
+    def goal_test(self, state):
+        return state & self.goal == self.goal
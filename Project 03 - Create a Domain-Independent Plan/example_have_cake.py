@@ -1,12 +1,11 @@
-from aimacode.logic import PropKB
-from aimacode.planning import Action
+from aimacode.planning import Action, STRIPSTask
 from aimacode.search import (
     Node, breadth_first_search, astar_search, depth_first_graph_search,
     uniform_cost_search, greedy_best_first_graph_search, Problem,
 )
 from aimacode.utils import expr
 from lp_utils import (
-    FluentState, encode_state, decode_state
+    FluentState, encode_state
 )
 from my_planning_graph import PlanningGraph
 from run_search import run_search
@@ -19,6 +18,7 @@ class HaveCakeProblem(Problem):
         self.state_map = initial.pos + initial.neg
         Problem.__init__(self, encode_state(initial, self.state_map), goal=goal)
         self.actions_list = self.get_actions()
+        self.task = STRIPSTask(self.state_map, self.actions_list, goal)
 
     def get_actions(self):
         precond_pos = [expr("Have(Cake)")]
@@ -37,46 +37,14 @@ class HaveCakeProblem(Problem):
                              [effect_add, effect_rem])
         return [eat_action, bake_action]
 
-    def actions(self, state: str) -> list:  # of Action
-        possible_actions = []
-        kb = PropKB()
-        kb.tell(decode_state(state, self.state_map).pos_sentence())
-        for action in self.actions_list:
-            is_possible = True
-            for clause in action.precond_pos:
-                if clause not in kb.clauses:
-                    is_possible = False
-            for clause in action.precond_neg:
-                if clause in kb.clauses:
-                    is_possible = False
-            if is_possible:
-                possible_actions.append(action)
-        return possible_actions
-
-    def result(self, state: str, action: Action):
-        new_state = FluentState([], [])
-        old_state = decode_state(state, self.state_map)
-        for fluent in old_state.pos:
-            if fluent not in action.effect_rem:
-                new_state.pos.append(fluent)
-        for fluent in action.effect_add:
-            if fluent not in new_state.pos:
-                new_state.pos.append(fluent)
-        for fluent in old_state.neg:
-            if fluent not in action.effect_add:
-                new_state.neg.append(fluent)
-        for fluent in action.effect_rem:
-            if fluent not in new_state.neg:
-                new_state.neg.append(fluent)
-        return encode_state(new_state, self.state_map)
-
-    def goal_test(self, state: str) -> bool:
-        kb = PropKB()
-        kb.tell(decode_state(state, self.state_map).pos_sentence())
-        for clause in self.goal:
-            if clause not in kb.clauses:
-                return False
-        return True
+    def actions(self, state: int) -> list:  # of Action
+        return self.task.actions(state)
+
+    def result(self, state: int, action: Action):
+        return self.task.result(state, action)
+
+    def goal_test(self, state: int) -> bool:
+        return self.task.goal_test(state)
 
     def h_1(self, node: Node):
         # note that this is not a true heuristic
@@ -34,35 +34,33 @@ def conjunctive_sentence(pos_list, neg_list):
     return associate('&', clauses)
 
 
-def encode_state(fs: FluentState, fluent_map: list) -> str:
-    """ encode fluents to a string of T/F using mapping
+def encode_state(fs: FluentState, fluent_map: list) -> int:
+    """ encode fluents to a bitset using mapping
 
     :param fs: FluentState object
     :param fluent_map: ordered list of possible fluents for the problem
-    :return: str eg. "TFFTFT" string of mapped positive and negative fluents
+    :return: int with bit i set if fluent_map[i] is a positive fluent of fs
+        e.g. 0b101001 for "TFFTFT"
     """
-    state_tf = []
-    for fluent in fluent_map:
-        if fluent in fs.pos:
-            state_tf.append('T')
-        else:
-            state_tf.append('F')
-    return "".join(state_tf)
+    pos = set(fs.pos)
+    state = 0
+    for idx, fluent in enumerate(fluent_map):
+        if fluent in pos:
+            state |= 1 << idx
+    return state
 
 
-def decode_state(state: str, fluent_map: list) -> FluentState:
-    """ decode string of T/F as fluent per mapping
+def decode_state(state: int, fluent_map: list) -> FluentState:
+    """ decode bitset as fluent per mapping
 
-    :param state: str eg. "TFFTFT" string of mapped positive and negative fluents
+    :param state: int with bit i set if fluent_map[i] is a positive fluent
     :param fluent_map: ordered list of possible fluents for the problem
     :return: fs: FluentState object
-
-    lengths of state string and fluent_map list must be the same
     """
     fs = FluentState([], [])
-    for idx, char in enumerate(state):
-        if char == 'T':
-            fs.pos.append(fluent_map[idx])
+    for idx, fluent in enumerate(fluent_map):
+        if state >> idx & 1:
+            fs.pos.append(fluent)
         else:
-            fs.neg.append(fluent_map[idx])
+            fs.neg.append(fluent)
     return fs
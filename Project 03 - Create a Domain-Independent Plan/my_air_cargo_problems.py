@@ -1,11 +1,10 @@
-from aimacode.logic import PropKB
-from aimacode.planning import Action
+from aimacode.planning import Action, STRIPSTask
 from aimacode.search import (
     Node, Problem,
 )
 from aimacode.utils import expr
 from lp_utils import (
-    FluentState, encode_state, decode_state,
+    FluentState, encode_state,
 )
 from my_planning_graph import PlanningGraph
 
@@ -34,6 +33,8 @@ class AirCargoProblem(Problem):
         self.planes = planes
         self.airports = airports
         self.actions_list = self.get_actions()
+        # fluents numbered as in state_map, actions compiled to bit masks
+        self.task = STRIPSTask(self.state_map, self.actions_list, goal)
 
     def get_actions(self):
         """
@@ -121,28 +122,17 @@ class AirCargoProblem(Problem):
 
         return load_actions() + unload_actions() + fly_actions()
 
-    def actions(self, state: str) -> list:
+    def actions(self, state: int) -> list:
         """ Return the actions that can be executed in the given state.
 
-        :param state: str
-            state represented as T/F string of mapped fluents (state variables)
-            e.g. 'FTTTFF'
+        :param state: int
+            state represented as a bitset of mapped fluents (state variables)
+            e.g. 0b000110
         :return: list of Action objects
         """
-        # TODO implement
-        possible_actions = []
-        # Decode the given state representation
-        current_state = decode_state(state, self.state_map)
-        # Iterate through all the actions
-        for action in self.actions_list:
-            meet_precond_pos = set(action.precond_pos).issubset(current_state.pos)
-            meet_precond_neg = set(action.precond_neg).issubset(current_state.neg)
-            # If current state entails the action's preconditions, the acction is possible
-            if meet_precond_pos and meet_precond_neg:
-                possible_actions.append(action)
-        return possible_actions
-
-    def result(self, state: str, action: Action):
+        return self.task.actions(state)
+
+    def result(self, state: int, action: Action):
         """ Return the state that results from executing the given
         action in the given state. The action must be one of
         self.actions(state).
@@ -151,27 +141,15 @@ class AirCargoProblem(Problem):
         :param action: Action applied
         :return: resulting state after action
         """
-        # TODO implement
-        new_state = FluentState([], [])
-        old_state = decode_state(state, self.state_map)
-        # Get the positive fluents
-        new_state.pos = list(set(old_state.pos).union(action.effect_add) - set(action.effect_rem))
-        # Get the negative fluents
-        new_state.neg = list(set(old_state.neg).union(action.effect_rem) - set(action.effect_add))
-        return encode_state(new_state, self.state_map)
-
-    def goal_test(self, state: str) -> bool:
+        return self.task.result(state, action)
+
+    def goal_test(self, state: int) -> bool:
         """ Test the state to see if goal is reached
 
-        :param state: str representing state
+        :param state: int representing state
         :return: bool
         """
-        kb = PropKB()
-        kb.tell(decode_state(state, self.state_map).pos_sentence())
-        for clause in self.goal:
-            if clause not in kb.clauses:
-                return False
-        return True
+        return self.task.goal_test(state)
 
     def h_1(self, node: Node):
         # note that this is not a true heuristic
@@ -200,30 +178,26 @@ class AirCargoProblem(Problem):
         """
         # TODO implement (see Russell-Norvig Ed-3 10.2.3  or Russell-Norvig Ed-2 11.2)
         count = 0
-        # Decode the current node state
-        current_state = decode_state(node.state, self.state_map)
         # Remove goals have been achieved
-        goals = set(self.goal) - set(current_state.pos)
-        # Get all actions
-        possible_acctions = self.actions_list
-        while len(possible_acctions) > 0 and len(goals) > 0:
+        goals = self.task.goal & ~node.state
+        # Get the add mask of all actions
+        possible_actions = [operator[2] for operator in self.task.operators.values()]
+        while possible_actions and goals:
             # Get the achievable goals for each action
-            actions_goals_achieved = [(action, goals.intersection(action.effect_add)) for action in possible_acctions]
+            actions_goals_achieved = [(add, add & goals) for add in possible_actions]
             # Get just the actions that achieve at least one remaining goal
-            actions_goals_achieved = [x for x in actions_goals_achieved if len(x[1]) > 0]
+            actions_goals_achieved = [x for x in actions_goals_achieved if x[1]]
             # If no action achieve the goal, it means the goal is not achievable
             if not actions_goals_achieved:
                 return float("inf")
-            # Sort the actions by the number of goals it achieves (descending)
-            actions_goals_achieved.sort(key = lambda x :len(x[1]), reverse = True )
-            # Take the action that achives more goals and substract them from the remianing goals
-            best_action, achivements =  actions_goals_achieved[0]
-            goals = goals - achivements
+            # Take the first action that achieves the most goals and subtract them from the remaining goals
+            best = max(range(len(actions_goals_achieved)),
+                       key=lambda i: bin(actions_goals_achieved[i][1]).count("1"))
+            goals &= ~actions_goals_achieved[best][1]
             # Update the list of possible action in order to continue looking
             # for the action achieving more goals given the new list of remaining goals
-            possible_acctions = [x[0] for x in actions_goals_achieved]
-            possible_acctions.remove(best_action)
-            count +=1
+            possible_actions = [x[0] for i, x in enumerate(actions_goals_achieved) if i != best]
+            count += 1
         return count
 
 
@@ -203,10 +203,10 @@ class PlanningGraph():
     graph can be used to reason about
     """
 
-    def __init__(self, problem: Problem, state: str, serial_planning=True):
+    def __init__(self, problem: Problem, state: int, serial_planning=True):
         """
         :param problem: PlanningProblem (or subclass such as AirCargoProblem or HaveCakeProblem)
-        :param state: str (will be in form TFTTFF... representing fluent states)
+        :param state: int (bitset of the fluent states, in the order of problem.state_map)
         :param serial_planning: bool (whether or not to assume that only one action can occur at a time)
         Instance variable calculated:
             fs: FluentState
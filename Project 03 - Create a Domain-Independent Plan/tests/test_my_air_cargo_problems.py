@@ -6,7 +6,7 @@ from aimacode.planning import Action
 from aimacode.utils import expr
 from aimacode.search import Node
 import unittest
-from lp_utils import decode_state
+from lp_utils import FluentState, decode_state, encode_state
 from my_air_cargo_problems import (
     air_cargo_p1, air_cargo_p2, air_cargo_p3,
 )
@@ -17,7 +17,7 @@ class TestAirCargoProb1(unittest.TestCase):
         self.p1 = air_cargo_p1()
 
     def test_ACP1_num_fluents(self):
-        self.assertEqual(len(self.p1.initial), 12)
+        self.assertEqual(len(self.p1.state_map), 12)
 
     def test_ACP1_num_requirements(self):
         self.assertEqual(len(self.p1.goal),2)
@@ -29,7 +29,7 @@ class TestAirCargoProb2(unittest.TestCase):
         self.p2 = air_cargo_p2()
 
     def test_ACP2_num_fluents(self):
-        self.assertEqual(len(self.p2.initial), 27)
+        self.assertEqual(len(self.p2.state_map), 27)
 
     def test_ACP2_num_requirements(self):
         self.assertEqual(len(self.p2.goal),3)
@@ -41,7 +41,7 @@ class TestAirCargoProb3(unittest.TestCase):
         self.p3 = air_cargo_p3()
 
     def test_ACP3_num_fluents(self):
-        self.assertEqual(len(self.p3.initial), 32)
+        self.assertEqual(len(self.p3.state_map), 32)
 
     def test_ACP3_num_requirements(self):
         self.assertEqual(len(self.p3.goal),4)
@@ -76,6 +76,23 @@ class TestAirCargoMethods(unittest.TestCase):
         self.assertTrue(expr('In(C1, P1)') in fs.pos)
         self.assertTrue(expr('At(C1, SFO)') in fs.neg)
 
+    def test_AC_goal_test(self):
+        self.assertFalse(self.p1.goal_test(self.p1.initial))
+        goal = encode_state(FluentState(self.p1.goal, []), self.p1.state_map)
+        self.assertTrue(self.p1.goal_test(self.p1.initial | goal))
+
+    def test_AC_task(self):
+        task = self.p1.task
+        pre, pre_neg, add, delete = task.compile(self.act1)
+        self.assertEqual(pre, task.state([expr('At(C1, SFO)'), expr('At(P1, SFO)')]))
+        self.assertEqual((pre_neg, add, delete),
+                         (0, task.state([expr('In(C1, P1)')]), task.state([expr('At(C1, SFO)')])))
+        self.assertEqual(self.p1.result(self.p1.initial, self.act1),
+                         (self.p1.initial & ~delete) | add)
+        self.assertEqual([str(a) for a in self.p1.actions(self.p1.initial)],
+                         [str(a) for a in self.p1.actions_list
+                          if set(a.precond_pos).issubset(decode_state(self.p1.initial, self.p1.state_map).pos)])
+
     def test_h_ignore_preconditions(self):
         n = Node(self.p1.initial)
         self.assertEqual(self.p1.h_ignore_preconditions(n),2)